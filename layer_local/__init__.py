@@ -0,0 +1,22 @@
+"""
+Local tooling for the Layer projects of this repository: run featuresets against on-disk copies of the
+Olist datasets for local development and CI benchmarks.
+"""
+from .chunked import PartitionedDataset, build_chunked, partition_dataset
+from .columnar import ColumnarFeatureset, write_columnar_featureset
+from .customer_state import update_customer_features
+from .dataset import LocalDataset, LocalDatasetProvider, LocalFeatureset, read_table, write_table
+from .executor import FeaturesetExecutor, build_dag
+from .feature_cache import FeatureCache, feature_cache_key
+from .id_dictionary import IdDictionary, gather_rows
+from .incremental import build_incrementally, materialized_featureset
+from .online_store import OnlineFeatureset, write_online_store
+from .project import load_project
+from .projection import infer_feature_columns, infer_featureset_columns, projected_dataset
+
+__all__ = ['ColumnarFeatureset', 'FeatureCache', 'FeaturesetExecutor', 'IdDictionary', 'LocalDataset',
+           'LocalDatasetProvider', 'LocalFeatureset', 'OnlineFeatureset', 'PartitionedDataset', 'build_chunked',
+           'build_dag', 'build_incrementally', 'feature_cache_key', 'gather_rows', 'infer_feature_columns',
+           'infer_featureset_columns', 'load_project', 'materialized_featureset', 'partition_dataset',
+           'projected_dataset', 'read_table', 'update_customer_features', 'write_columnar_featureset',
+           'write_online_store', 'write_table']
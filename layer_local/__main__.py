@@ -0,0 +1,129 @@
+"""
+Command line entry point: builds the featuresets of a project from local data and prints the time of every feature,
+updates materialized per-order featuresets incrementally, or serves churn scores.
+
+    python -m layer_local build tutorial6 local_data --workers 4 --cache-dir .feature_cache --columnar-dir columnar
+    python -m layer_local build tutorial6 local_data --online-dir online
+    python -m layer_local build tutorials_after/tutorial6_after local_data \
+        --alias order_features_trial=order_features_tutorial6
+    python -m layer_local build tutorial6 local_data --featureset order_features_tutorial6 --partitions 16 \
+        --output-dir materialized
+    python -m layer_local update tutorial6 local_data materialized --featureset order_features_tutorial6 \
+        --online-dir online
+    python -m layer_local serve churn_model.joblib online --featureset order_features_tutorial6 \
+        --featureset order_features_tutorial6_new
+"""
+import argparse
+
+from .chunked import build_chunked
+from .columnar import ColumnarFeatureset, write_columnar_featureset
+from .dataset import LocalDatasetProvider
+from .executor import FeaturesetExecutor
+from .customer_state import update_customer_features
+from .incremental import build_incrementally, materialized_featureset
+from .online_store import OnlineFeatureset, write_online_store
+from .project import load_project
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m layer_local')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help="Build featuresets from local data and report the time of every feature")
+    build.add_argument('project_dir')
+    build.add_argument('data_dir')
+    build.add_argument('--featureset', action='append', help="Featureset to build (default: all of the project)")
+    build.add_argument('--workers', type=int, default=None, help="Number of worker processes")
+    build.add_argument('--alias', action='append', default=[], metavar='NAME=FEATURESET',
+                       help="Read the featureset NAME of Featureset(\"NAME\") annotations from a featureset of the project")
+    build.add_argument('--compact', action='store_true', help="Read the datasets with compact dtypes")
+    build.add_argument('--no-projection', action='store_true', help="Read whole datasets instead of the inferred columns")
+    build.add_argument('--cache-dir', help="Keep feature outputs in this directory and reuse the unchanged ones")
+    build.add_argument('--partitions', type=int, default=None,
+                       help="Build per-order featuresets one hash partition of ORDER_ID at a time, with bounded memory")
+    build.add_argument('--output-dir', help="Directory of the featuresets built in partitions")
+    build.add_argument('--columnar-dir', help="Also write the built featuresets as Parquet files sorted by their key")
+    build.add_argument('--online-dir', help="Also write the built featuresets to the online store in this directory")
+
+    update = commands.add_parser('update', help="Update materialized per-order featuresets for new and changed orders")
+    update.add_argument('project_dir')
+    update.add_argument('data_dir')
+    update.add_argument('materialized_dir')
+    update.add_argument('--featureset', action='append', default=[], help="Per-order featureset to update")
+    update.add_argument('--order-id', action='append', default=[], help="Changed order to recompute")
+    update.add_argument('--watermark', help="Recompute the orders purchased after this time (default: previous update)")
+    update.add_argument('--workers', type=int, default=None, help="Number of worker processes")
+    update.add_argument('--alias', action='append', default=[], metavar='NAME=FEATURESET')
+    update.add_argument('--compact', action='store_true', help="Read the datasets with compact dtypes")
+    update.add_argument('--customer-featureset', action='append', default=[],
+                        help="Per-customer featureset to update from its state of delivered orders")
+    update.add_argument('--online-dir',
+                        help="Also refresh the online store in this directory with the updated featuresets")
+
+    serve = commands.add_parser('serve', help="Serve churn scores of a trained churn pipeline over HTTP")
+    serve.add_argument('model_path', help="Trained churn pipeline, saved with joblib")
+    serve.add_argument('store_dir', help="Directory of the online store (build --online-dir)")
+    serve.add_argument('--columnar', action='store_true',
+                       help="Read the columnar featuresets of STORE_DIR (build --columnar-dir) instead of the online store")
+    serve.add_argument('--featureset', action='append', default=[], help="Featureset to read the features from")
+    serve.add_argument('--feature-model', action='append', default=[], metavar='COLUMN=MODEL_PATH',
+                       help="Model predicting a feature column of the pipeline, like PREDICTED_ORDER_REVIEW_SCORE")
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8080)
+    serve.add_argument('--max-batch-size', type=int, default=64, help="Largest micro-batch of requests")
+    serve.add_argument('--max-wait-ms', type=float, default=2.0,
+                       help="Longest wait for more requests after the first request of a micro-batch")
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        # Imported here, so that the other commands do not need scikit-learn
+        import joblib
+        from .scoring import ChurnScorer, serve as serve_scores
+
+        featureset_class = ColumnarFeatureset if args.columnar else OnlineFeatureset
+        featuresets = [featureset_class(name, args.store_dir) for name in args.featureset]
+        feature_models = {column: joblib.load(path)
+                          for column, path in (model.split('=', 1) for model in args.feature_model)}
+        scorer = ChurnScorer(joblib.load(args.model_path), featuresets, feature_models=feature_models)
+        serve_scores(scorer, args.host, args.port, max_batch_size=args.max_batch_size,
+                     max_wait=args.max_wait_ms / 1000)
+        return
+
+    project = load_project(args.project_dir)
+    datasets = LocalDatasetProvider(project, args.data_dir, compact=args.compact)
+    aliases = dict(alias.split('=', 1) for alias in args.alias)
+    if args.command == 'update':
+        if args.featureset:
+            result = build_incrementally(project, datasets, args.featureset, args.materialized_dir, order_ids=args.order_id,
+                                         watermark=args.watermark, max_workers=args.workers, featureset_aliases=aliases)
+            affected = 'all' if result.affected_keys is None else result.affected_keys
+            print("Updated {} for {} orders, watermark {}".format(', '.join(result.featuresets), affected, result.watermark))
+        for name in args.customer_featureset:
+            counted = update_customer_features(project, datasets, name, args.materialized_dir)
+            print("Updated {} with {} newly delivered orders".format(name, counted))
+        for name in args.featureset + args.customer_featureset if args.online_dir else ():
+            write_online_store(materialized_featureset(project, args.materialized_dir, name), args.online_dir)
+        return
+
+    def write_stores(result):
+        for featureset in result.featuresets.values() if args.columnar_dir else ():
+            write_columnar_featureset(featureset, args.columnar_dir)
+        for featureset in result.featuresets.values() if args.online_dir else ():
+            write_online_store(featureset, args.online_dir)
+
+    if args.partitions:
+        if not args.output_dir:
+            parser.error("--partitions requires --output-dir")
+        result = build_chunked(project, datasets, args.output_dir, args.featureset, num_partitions=args.partitions,
+                               featureset_aliases=aliases, project_columns=not args.no_projection)
+        write_stores(result)
+    else:
+        with FeaturesetExecutor(project, datasets, max_workers=args.workers, featureset_aliases=aliases,
+                                project_columns=not args.no_projection, cache_dir=args.cache_dir) as executor:
+            result = executor.run(args.featureset)
+            # Before the work directory of the executor, which holds the built featuresets, is removed
+            write_stores(result)
+    print(result.format_timings())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+"""
+Chunked builds of the per-order featuresets, with bounded memory.
+
+The datasets that have an ORDER_ID column (orders, items, payments, reviews) are split into hash partitions of their
+ORDER_ID: the source file is streamed one record batch at a time, and the rows of every batch are appended to the
+Arrow IPC file of their partition on disk. The partition of an order is a hash of its ID, the same in every dataset,
+so partition `i` of the items holds the items of exactly the orders in partition `i` of the orders.
+
+Every feature of a per-order featureset groups rows by order (plus lookups in dimension tables like products and
+customers, which are read whole). The features are therefore computed partition by partition, with the same
+`build_feature` functions as in a full build: all rows of an order, and so every group, are in one partition, the
+outputs of the partitions hold disjoint orders, and their concatenation is the output of the full build (in another
+row order). Only one partition of the datasets is in memory at a time.
+"""
+import hashlib
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from .dataset import LocalDataset, LocalFeatureset, read_table, write_table
+from .executor import BuildResult, FeatureTiming, build_dag, load_feature_module
+from .projection import projected_dataset
+
+SUCCESS_FILE = '_SUCCESS'
+# Module-level caches of the helper modules of the features: (module, attribute). Their entries are keyed on dataset
+# versions, and every partition is a dataset version of its own, so they are cleared after every partition
+HELPER_CACHES = (('join_cache', 'join_cache'), ('delivered_orders', '_cache'))
+
+
+def partition_of(keys, num_partitions):
+    """Partition number of every key of an Arrow array, stable across datasets and runs."""
+    values = keys.to_numpy(zero_copy_only=False).astype(object, copy=False)
+    return (pd.util.hash_array(values) % np.uint64(num_partitions)).astype(np.int64)
+
+
+class PartitionedDataset:
+    """
+    A dataset split into `len(paths)` hash partitions of its key column, one Arrow IPC file per partition.
+
+    Every partition is a `LocalDataset` of its own, so it can be handed to a `build_feature` function.
+    """
+
+    def __init__(self, dataset, key, paths):
+        self.dataset = dataset
+        self.key = key
+        self.paths = list(paths)
+
+    def __repr__(self):
+        return "PartitionedDataset(name={!r}, key={!r}, partitions={})".format(self.dataset.name, self.key, len(self.paths))
+
+    def __len__(self):
+        return len(self.paths)
+
+    def partition(self, i, columns=None):
+        # The version tells the partitions apart in the caches of the helper modules
+        return LocalDataset(self.dataset.name, self.paths[i], version='{}-{}of{}'.format(self.dataset.version, i, len(self)),
+                            columns=columns if columns is not None else self.dataset.columns,
+                            id_dictionary=self.dataset.id_dictionary)
+
+    def iter_batches(self, columns=None):
+        """The rows of the dataset as Arrow tables, one partition at a time."""
+        for i in range(len(self)):
+            yield self.partition(i, columns).to_arrow()
+
+
+def partition_dataset(dataset, spill_dir, num_partitions, key='ORDER_ID', batch_size=64 * 1024):
+    """
+    Split a `LocalDataset` into `num_partitions` hash partitions of `key`, spilled to `spill_dir`.
+
+    The dataset is read one batch of `batch_size` rows at a time. Partitions of an unchanged dataset (same version,
+    projection and filters) that were spilled before are reused.
+    """
+    options = repr((dataset.version, dataset.columns, dataset.filters, key, num_partitions)).encode()
+    directory = os.path.join(spill_dir, '{}-{}'.format(dataset.name, hashlib.sha1(options).hexdigest()[:16]))
+    paths = [os.path.join(directory, '{}.arrow'.format(i)) for i in range(num_partitions)]
+    if os.path.exists(os.path.join(directory, SUCCESS_FILE)):
+        return PartitionedDataset(dataset, key, paths)
+
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+    sinks, writers = [], []
+    try:
+        for batch in dataset.iter_batches(batch_size=batch_size):
+            if not writers:
+                for path in paths:
+                    sinks.append(pa.OSFile(path, 'wb'))
+                    writers.append(pa.ipc.new_file(sinks[-1], batch.schema))
+            partitions = partition_of(batch.column(batch.schema.get_field_index(key)), num_partitions)
+            # Sort the rows of the batch by partition, then append every slice to its partition
+            order = np.argsort(partitions, kind='stable')
+            offsets = np.concatenate([[0], np.cumsum(np.bincount(partitions, minlength=num_partitions))])
+            batch = batch.take(pa.array(order))
+            for i, writer in enumerate(writers):
+                if offsets[i + 1] > offsets[i]:
+                    writer.write_batch(batch.slice(offsets[i], offsets[i + 1] - offsets[i]))
+    finally:
+        for writer in writers:
+            writer.close()
+        for sink in sinks:
+            sink.close()
+
+    if not writers:
+        # An empty dataset: empty partitions with the schema of the dataset
+        schema = dataset.schema if dataset.columns is None else pa.schema([dataset.schema.field(c) for c in dataset.columns])
+        for path in paths:
+            write_table(schema.empty_table(), path)
+    with open(os.path.join(directory, SUCCESS_FILE), 'w'):
+        pass
+    return PartitionedDataset(dataset, key, paths)
+
+
+def clear_helper_caches():
+    """Clear the caches of the imported helper modules (see `HELPER_CACHES`)."""
+    for module_name, attribute in HELPER_CACHES:
+        cache = getattr(sys.modules.get(module_name), attribute, None)
+        if cache is not None:
+            cache.clear()
+
+
+def build_chunked(project, datasets, output_dir, featuresets=None, num_partitions=16, spill_dir=None, key='ORDER_ID',
+                  featureset_aliases=None, project_columns=True, batch_size=64 * 1024):
+    """
+    Build the per-order `featuresets` (all featuresets of the project by default) one hash partition of ORDER_ID at a
+    time, and write every feature to `<output_dir>/<featureset>/<feature>.arrow`.
+
+    Datasets are partitioned in `spill_dir` (`<output_dir>/_partitions` by default). Features that read a featureset
+    read the same partition of its features. The caches of the helper modules of the features are cleared after every
+    partition. Raises a `ValueError` for a featureset that is not keyed on `key`.
+    """
+    start = time.perf_counter()
+    spill_dir = spill_dir or os.path.join(output_dir, '_partitions')
+    tasks = build_dag(project, featuresets, featureset_aliases=featureset_aliases, project_columns=project_columns)
+    partition_dir = os.path.join(spill_dir, '_outputs')
+    shutil.rmtree(partition_dir, ignore_errors=True)
+
+    def output_path(featureset, feature, i):
+        return os.path.join(partition_dir, featureset, feature, '{}.arrow'.format(i))
+
+    partitioned = {}
+    for task in tasks:
+        for node in task.features:
+            for feature_input in node.inputs:
+                if feature_input.entity_type == 'Dataset' and feature_input.name not in partitioned:
+                    dataset = datasets(feature_input.name)
+                    partitioned[feature_input.name] = (partition_dataset(dataset, spill_dir, num_partitions, key, batch_size)
+                                                       if key in dataset.schema.names else dataset)
+
+    # Helper modules of a featureset are imported by name from its directory
+    for task in tasks:
+        if task.directory not in sys.path:
+            sys.path.insert(0, task.directory)
+    modules = {node.feature.source: load_feature_module(node.feature.source) for task in tasks for node in task.features}
+    timings = {(task.featureset, node.feature.name): FeatureTiming(task.featureset, node.feature.name, 0.0, 0)
+               for task in tasks for node in task.features}
+    for i in range(num_partitions):
+        for task in tasks:
+            for node in task.features:
+                arguments = {}
+                for feature_input in node.inputs:
+                    if feature_input.entity_type == 'Featureset':
+                        config = project.featuresets[feature_input.name]
+                        entity = LocalFeatureset(feature_input.name, [output_path(feature_input.name, feature.name, i)
+                                                                      for feature in config.features])
+                    elif isinstance(partitioned[feature_input.name], PartitionedDataset):
+                        entity = partitioned[feature_input.name].partition(i)
+                    else:
+                        entity = partitioned[feature_input.name]
+                    if feature_input.columns is not None:
+                        entity = projected_dataset(entity, feature_input.columns)
+                    arguments[feature_input.parameter] = entity
+
+                feature_start = time.perf_counter()
+                feature_df = modules[node.feature.source].build_feature(**arguments)
+                timing = timings[(task.featureset, node.feature.name)]
+                timing.seconds += time.perf_counter() - feature_start
+                timing.rows += len(feature_df)
+                if feature_df.columns[0] != key:
+                    raise ValueError("Feature '{}' of featureset '{}' is not keyed on {}: it cannot be built in "
+                                     "partitions".format(node.feature.name, task.featureset, key))
+                path = output_path(task.featureset, node.feature.name, i)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                write_table(feature_df, path)
+        # Only the intermediates of the current partition are kept in memory
+        clear_helper_caches()
+
+    # Concatenating in pandas unifies the dtypes of the partitions (e.g. a column with nulls in one partition only)
+    built = {}
+    for name in dict.fromkeys(task.featureset for task in tasks):
+        paths = []
+        for feature in project.featuresets[name].features:
+            parts = [read_table(output_path(name, feature.name, i)).to_pandas() for i in range(num_partitions)]
+            path = os.path.join(output_dir, name, feature.name + '.arrow')
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            write_table(pd.concat(parts, ignore_index=True), path + '.tmp')
+            os.replace(path + '.tmp', path)
+            paths.append(path)
+        built[name] = LocalFeatureset(name, paths)
+    shutil.rmtree(partition_dir, ignore_errors=True)
+    return BuildResult(built, list(timings.values()), time.perf_counter() - start)
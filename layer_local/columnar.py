@@ -0,0 +1,178 @@
+"""
+Columnar materialization of featuresets.
+
+A built featureset is stored as the joined table of its features, sorted by its key (ORDER_ID for the order
+featuresets) and split into Parquet part files of contiguous key ranges. Parquet keeps the min/max statistics of every
+row group, so a read of a set of keys only loads the row groups whose key range holds one of the keys, and only the
+requested columns of them:
+
+    features = ColumnarFeatureset('order_features_tutorial6', 'columnar')
+    first_orders = features.to_pandas(columns=['TOTAL_ITEMS', 'MAIN_PRODUCT_CATEGORY'], keys=first_order_ids)
+
+`ColumnarFeatureset.to_pandas()` without arguments returns the whole featureset, like `layer.Featureset`.
+"""
+import json
+import os
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from .dataset import read_table
+from .versions import current_version, new_version_directory, publish_version
+
+METADATA_FILE = '_featureset.json'
+
+
+def _feature_tables(featureset):
+    # The tables of the features of a `LocalFeatureset`, memory mapped from their files; other featuresets are one table
+    feature_paths = getattr(featureset, 'feature_paths', None)
+    if feature_paths is not None:
+        return [read_table(path) for path in feature_paths]
+    return [pa.Table.from_pandas(featureset.to_pandas(), preserve_index=False)]
+
+
+def _string_keys(column):
+    # Dictionary-encoded keys (compact mode) are written as their values, so the statistics hold the keys themselves
+    column = column.combine_chunks() if isinstance(column, pa.ChunkedArray) else column
+    if pa.types.is_dictionary(column.type):
+        column = column.dictionary_decode()
+    return column.cast(pa.string())
+
+
+class _FeatureRows:
+    """The rows of one feature table, ordered by the position of their key in the sorted keys of the featureset."""
+
+    def __init__(self, table, key, sorted_keys, featureset_name):
+        if table.column_names[0] != key:
+            raise ValueError("A feature of featureset '{}' is keyed on {}, not on {}".format(
+                featureset_name, table.column_names[0], key))
+        self.table = table
+        positions = pc.index_in(_string_keys(table.column(key)), value_set=sorted_keys).to_numpy(zero_copy_only=False)
+        self.rows = np.argsort(positions, kind='stable')
+        self.positions = positions[self.rows]
+        if len(self.positions) > 1 and (self.positions[1:] == self.positions[:-1]).any():
+            raise ValueError("The key {} of a feature of featureset '{}' is not unique".format(key, featureset_name))
+
+    def columns(self, start, end):
+        # The feature columns of the keys at positions [start, end), null for the keys without a row in this feature
+        lo, hi = np.searchsorted(self.positions, [start, end])
+        row_of_key = np.full(end - start, -1, dtype=np.int64)
+        row_of_key[self.positions[lo:hi] - start] = self.rows[lo:hi]
+        indices = pa.array(row_of_key, mask=row_of_key < 0)
+        return [(name, self.table.column(name).take(indices)) for name in self.table.column_names[1:]]
+
+
+def write_columnar_featureset(featureset, directory, key=None, row_group_size=64 * 1024, rows_per_file=1024 * 1024):
+    """
+    Write a featureset (a `LocalFeatureset`, or anything with `name` and `to_pandas()`) as Parquet files sorted by
+    `key` (the first column by default) as a new version of `<directory>/<name>`, and make it the current version.
+    Returns the `ColumnarFeatureset`.
+
+    The features of a `LocalFeatureset` are joined on the key in Arrow, one part file at a time: besides the memory
+    mapped feature files, only the sorted keys and the rows of one part file are held in memory.
+    """
+    tables = _feature_tables(featureset)
+    key = key or tables[0].column_names[0]
+    keys = [_string_keys(table.column(key)) for table in tables]
+    if any(feature_keys.null_count for feature_keys in keys):
+        raise ValueError("The key {} of {} has missing values".format(key, featureset.name))
+    sorted_keys = pc.unique(pa.concat_arrays(keys))
+    sorted_keys = sorted_keys.take(pc.sort_indices(sorted_keys))
+    features = [_FeatureRows(table, key, sorted_keys, featureset.name) for table in tables]
+
+    path = os.path.join(directory, featureset.name)
+    version, tmp_path = new_version_directory(path)
+    files = []
+    for start in range(0, max(len(sorted_keys), 1), rows_per_file):
+        end = min(start + rows_per_file, len(sorted_keys))
+        columns = [(key, sorted_keys.slice(start, end - start))]
+        for feature in features:
+            columns.extend(feature.columns(start, end))
+        files.append('part-{:05d}.parquet'.format(len(files)))
+        pq.write_table(pa.Table.from_arrays([values for _, values in columns], names=[name for name, _ in columns]),
+                       os.path.join(tmp_path, files[-1]), row_group_size=row_group_size)
+    with open(os.path.join(tmp_path, METADATA_FILE), 'w') as f:
+        json.dump({'name': featureset.name, 'key': key, 'files': files}, f, indent=2)
+    publish_version(path, version, tmp_path)
+    return ColumnarFeatureset(featureset.name, directory)
+
+
+def _sorted_keys(keys):
+    values = pa.array(np.asarray(keys, dtype=object), type=pa.string())
+    values = pc.unique(values.filter(pc.is_valid(values)))
+    return values.take(pc.sort_indices(values))
+
+
+class ColumnarFeatureset:
+    """
+    Drop-in replacement for `layer.Featureset("<name>")` backed by the files written by `write_columnar_featureset`
+    under `<directory>/<name>`. `to_pandas()` optionally reads a subset of the columns and of the keys.
+
+    The featureset reads the version that was current when it was created; later writes do not change what it reads.
+    """
+
+    def __init__(self, name, directory):
+        self.name = name
+        self.path = os.path.join(directory, name)
+        while True:
+            self.version = current_version(self.path)
+            try:
+                with open(os.path.join(self.path, self.version, METADATA_FILE)) as f:
+                    metadata = json.load(f)
+                break
+            except FileNotFoundError:
+                # The version was replaced and removed by later writes since CURRENT was read
+                continue
+        self.key = metadata['key']
+        self.files = [os.path.join(self.path, self.version, file) for file in metadata['files']]
+
+    def __repr__(self):
+        return "ColumnarFeatureset(name={!r}, path={!r}, version={!r})".format(self.name, self.path, self.version)
+
+    @property
+    def schema(self):
+        return pq.read_schema(self.files[0], memory_map=True)
+
+    def _row_groups(self, parquet_file, sorted_keys):
+        # Row groups whose min/max key range holds at least one of the keys (all of them without statistics)
+        key_index = parquet_file.schema_arrow.get_field_index(self.key)
+        row_groups = []
+        for i in range(parquet_file.num_row_groups):
+            statistics = parquet_file.metadata.row_group(i).column(key_index).statistics
+            if statistics is None or not statistics.has_min_max:
+                row_groups.append(i)
+                continue
+            start = np.searchsorted(sorted_keys, statistics.min, side='left')
+            end = np.searchsorted(sorted_keys, statistics.max, side='right')
+            if end > start:
+                row_groups.append(i)
+        return row_groups
+
+    def to_arrow(self, columns=None, keys=None):
+        """
+        Read the featureset. `columns` selects feature columns (the key is always read), `keys` only reads the rows of
+        these keys, in key order.
+        """
+        if columns is not None:
+            columns = [self.key] + [column for column in columns if column != self.key]
+        if keys is None:
+            return pa.concat_tables([pq.read_table(path, columns=columns, memory_map=True) for path in self.files])
+
+        key_set = _sorted_keys(keys)
+        sorted_keys = key_set.to_numpy(zero_copy_only=False)
+        tables = []
+        for path in self.files:
+            parquet_file = pq.ParquetFile(path, memory_map=True)
+            row_groups = self._row_groups(parquet_file, sorted_keys)
+            if row_groups:
+                tables.append(parquet_file.read_row_groups(row_groups, columns=columns))
+        if not tables:
+            schema = self.schema
+            return (schema if columns is None else pa.schema([schema.field(c) for c in columns])).empty_table()
+        table = pa.concat_tables(tables)
+        return table.filter(pc.is_in(table[self.key], value_set=key_set))
+
+    def to_pandas(self, columns=None, keys=None):
+        return self.to_arrow(columns=columns, keys=keys).to_pandas(split_blocks=True)
@@ -0,0 +1,39 @@
+"""
+Compact dtypes for the Olist tables: dictionary-encoded ID columns and float32 money columns.
+
+ORDER_ID, CUSTOMER_ID, PRODUCT_ID and SELLER_ID are 32 character hex strings, which pandas holds as Python objects.
+In compact mode they are read as categoricals whose categories come from the `IdDictionary` of the project, shared by
+every table: all tables encode an ID with the same codes, so merges and groupbys on these columns compare integer codes
+instead of hashing strings. PRICE, FREIGHT_VALUE and PAYMENT_VALUE are downcast to float32 when every value survives
+the round trip at 2 decimals. Only single values survive it: sums of float32 values carry their representation error, so
+features aggregating money columns round them back to 2 decimals in float64 first (see `money.py` in the order features
+of tutorial6) to compute the same values as with the original columns.
+"""
+import numpy as np
+
+# Money columns, stored with 2 decimals
+MONEY_COLUMNS = ('PRICE', 'FREIGHT_VALUE', 'PAYMENT_VALUE')
+
+
+def downcast_money_column(values):
+    # Only downcast when every value is recovered from its float32 value by rounding to 2 decimals
+    values_float32 = values.astype(np.float32)
+    round_trips = np.array_equal(np.round(values_float32.astype(np.float64), 2), values, equal_nan=True)
+    return values_float32 if round_trips else values
+
+
+def compact_table_to_pandas(table, id_dictionary, downcast_money=True):
+    """
+    Convert an Arrow table to pandas, encoding its key columns with the ID dictionary and downcasting money columns
+    (unless `downcast_money` is False).
+    """
+    key_columns = [column for column in table.column_names if column in id_dictionary.key_columns]
+    df = table.drop(key_columns).to_pandas(split_blocks=True)
+    # Insert the key columns back at their positions in the table (in increasing order of position)
+    for position, column in enumerate(table.column_names):
+        if column in key_columns:
+            df.insert(position, column, id_dictionary.to_categorical(column, table[column]))
+    for column in MONEY_COLUMNS if downcast_money else ():
+        if column in df.columns and df[column].dtype == np.float64:
+            df[column] = downcast_money_column(df[column].to_numpy())
+    return df
@@ -0,0 +1,203 @@
+"""
+Compiled predictor for the model pipelines of the projects: a `ColumnTransformer` that one-hot encodes the categorical
+columns and passes the other columns through, followed by a `GradientBoostingRegressor` or `GradientBoostingClassifier`.
+
+`Pipeline.predict` builds a sparse one-hot matrix of all categories, validates it and walks every tree through the
+scikit-learn object stack. `compile_pipeline` flattens all trees into a few NumPy arrays instead (input column, threshold
+and children of every node, leaf values) and pre-resolves the one-hot columns: the input matrix only holds the numeric
+columns and an indicator column for each category the trees split on, computed from category codes. Prediction walks all
+trees for a batch of rows at once, one tree level per step:
+
+    model = compile_pipeline(layer.get_model("order_review_model").trained_model_object)
+    scores = model.predict(orders_df)
+
+Predictions are bit-identical to the pipeline's: float32 inputs are compared to the thresholds like in scikit-learn
+trees, and leaf values are added to the initial prediction tree by tree in the same order. The compiled predictor does
+not keep the estimators, and it avoids the fixed cost of a pipeline call, so it is fastest on small batches (online
+scoring). On batches of many thousands of rows the scikit-learn tree traversal is faster.
+"""
+import numpy as np
+import pandas as pd
+from sklearn.dummy import DummyClassifier, DummyRegressor
+from sklearn.preprocessing import FunctionTransformer, OneHotEncoder
+
+# Node indices evaluated at once (rows x trees)
+BATCH_NODES = 2 ** 16
+
+
+def _column_names(column_transformer, columns):
+    # Input column names of a transformer of a fitted ColumnTransformer (names, or positions for the remainder)
+    names = np.asarray(column_transformer.feature_names_in_, dtype=object)
+    if isinstance(columns, str):
+        return [columns]
+    if isinstance(columns, slice):
+        return list(names[columns])
+    columns = list(columns)
+    if columns and not isinstance(columns[0], str):
+        return list(names[np.asarray(columns)])
+    return columns
+
+
+def _float32_thresholds(thresholds):
+    # The largest float32 at or below every float64 threshold: for a float32 value x, x <= threshold exactly when
+    # x <= the float32 threshold, so nodes are tested in float32 like the inputs
+    thresholds32 = thresholds.astype(np.float32)
+    above = thresholds32.astype(np.float64) > thresholds
+    thresholds32[above] = np.nextafter(thresholds32[above], np.float32(-np.inf))
+    return thresholds32
+
+
+class CompiledPipeline:
+    """
+    Flat-array predictor of a fitted Pipeline(ColumnTransformer(OneHotEncoder, passthrough), GradientBoosting*).
+
+    `predict` (and `predict_proba` / `decision_function` for classifiers) take the same dataframes as the pipeline.
+    """
+
+    def __init__(self, pipeline):
+        column_transformer, model = pipeline[0], pipeline[-1]
+        if len(pipeline) != 2 or not hasattr(column_transformer, 'transformers_') or not hasattr(model, 'estimators_'):
+            raise ValueError("Only pipelines of a ColumnTransformer and a fitted gradient boosting model can be compiled")
+        if not (isinstance(model.init_, (DummyRegressor, DummyClassifier)) or model.init_ == 'zero'):
+            raise ValueError("Only gradient boosting models with a constant initial prediction can be compiled")
+        self.classes_ = getattr(model, 'classes_', None)
+        # The loss turns raw predictions into probabilities (`_loss` since scikit-learn 1.1)
+        self.loss = getattr(model, '_loss', None) or model.loss_
+        self.n_stages, self.n_outputs = model.estimators_.shape
+
+        # Every output column of the column transformer maps to (kind, index of the numeric or categorical column, code
+        # of the category for one-hot columns)
+        self.numeric_columns, self.categorical_columns, self.categories = [], [], []
+        output_columns = []
+        for name, transformer, columns in column_transformer.transformers_:
+            if transformer == 'drop':
+                continue
+            columns = _column_names(column_transformer, columns)
+            # Recent scikit-learn versions store a passthrough remainder as an identity FunctionTransformer
+            if transformer == 'passthrough' or (isinstance(transformer, FunctionTransformer) and transformer.func is None):
+                for column in columns:
+                    output_columns.append(('numeric', len(self.numeric_columns), -1))
+                    self.numeric_columns.append(column)
+            elif isinstance(transformer, OneHotEncoder) and transformer.drop is None \
+                    and transformer.handle_unknown == 'ignore' and not getattr(transformer, '_infrequent_enabled', False):
+                for column, categories in zip(columns, transformer.categories_):
+                    for code in range(len(categories)):
+                        output_columns.append(('categorical', len(self.categorical_columns), code))
+                    self.categorical_columns.append(column)
+                    self.categories.append(pd.Index(categories))
+            else:
+                raise ValueError("Transformer '{}' cannot be compiled: only one-hot encoders (handle_unknown='ignore', "
+                                 "drop=None) and passthrough columns are supported".format(name))
+        if len(output_columns) != model.n_features_in_:
+            raise ValueError("The column transformer outputs {} columns, the model expects {}".format(
+                len(output_columns), model.n_features_in_))
+
+        # All trees in one set of node arrays, in the order of the stages and of the classes within a stage
+        trees = [tree.tree_ for tree in model.estimators_.ravel()]
+        offsets = np.cumsum([0] + [tree.node_count for tree in trees])
+        self.roots = offsets[:-1]
+        children_left = np.concatenate([tree.children_left for tree in trees])
+        children_right = np.concatenate([tree.children_right for tree in trees])
+        is_leaf = children_left == -1
+        tree_offsets = np.repeat(offsets[:-1], [tree.node_count for tree in trees])
+        # Children of node i at 2 * i (x <= threshold) and 2 * i + 1. Leaves point to themselves, so rows that reached a
+        # leaf stay there until the deepest leaves are reached
+        node_ids = np.arange(len(children_left))
+        self.children = np.empty(2 * len(node_ids), dtype=np.int32)
+        self.children[0::2] = np.where(is_leaf, node_ids, children_left + tree_offsets)
+        self.children[1::2] = np.where(is_leaf, node_ids, children_right + tree_offsets)
+        self.threshold = _float32_thresholds(np.concatenate([tree.threshold for tree in trees]))
+        self.value = np.concatenate([tree.value[:, 0, 0] for tree in trees])
+        self.max_depth = max(tree.max_depth for tree in trees)
+
+        # Input columns: the numeric columns, then an indicator of every (categorical column, category) split on
+        features = np.concatenate([tree.feature for tree in trees])
+        split_features = np.unique(features[~is_leaf])
+        self.indicators = [output_columns[feature][1:] for feature in split_features
+                           if output_columns[feature][0] == 'categorical']
+        input_columns = {}
+        for feature in split_features:
+            kind, index, code = output_columns[feature]
+            input_columns[feature] = index if kind == 'numeric' \
+                else len(self.numeric_columns) + self.indicators.index((index, code))
+        # Leaves read any column, their result is not used
+        self.feature = np.array([input_columns.get(feature, 0) for feature in features], dtype=np.int32)
+
+        # Initial raw prediction of the constant initial estimator
+        self.initial_raw_prediction = model._raw_predict_init(np.zeros((1, model.n_features_in_), dtype=np.float32))[0]
+        self.learning_rate = model.learning_rate
+
+    @property
+    def nbytes(self):
+        """Size of the node arrays."""
+        arrays = (self.roots, self.children, self.threshold, self.value, self.feature)
+        return sum(array.nbytes for array in arrays)
+
+    def _inputs(self, X):
+        # Numeric columns as float32 (through float64, like the column transformer and the model), then the indicators
+        inputs = np.empty((len(X), len(self.numeric_columns) + len(self.indicators)), dtype=np.float32)
+        for i, column in enumerate(self.numeric_columns):
+            inputs[:, i] = X[column].to_numpy(dtype=np.float64)
+        if np.isnan(inputs[:, :len(self.numeric_columns)]).any():
+            raise ValueError("Input contains NaN")
+        # Unknown categories have the code -1, which is no category of any indicator (an all-zero one-hot row)
+        codes = {}
+        for i, (index, code) in enumerate(self.indicators, start=len(self.numeric_columns)):
+            if index not in codes:
+                codes[index] = self.categories[index].get_indexer(X[self.categorical_columns[index]])
+            inputs[:, i] = codes[index] == code
+        return inputs
+
+    def _leaves(self, inputs):
+        # Leaf of every row in every tree, walking all trees one level per step
+        row_offsets = (np.arange(len(inputs)) * inputs.shape[1])[:, None]
+        flat_inputs = inputs.ravel()
+        nodes = np.broadcast_to(self.roots, (len(inputs), len(self.roots)))
+        for _ in range(self.max_depth):
+            values = flat_inputs.take(row_offsets + self.feature.take(nodes))
+            nodes = self.children.take(2 * nodes + (values > self.threshold.take(nodes)))
+        return nodes
+
+    def decision_function(self, X):
+        """Raw predictions of the model, shaped like `_raw_predict` of scikit-learn: (rows, outputs)."""
+        inputs = self._inputs(X)
+        n_stages, n_outputs = self.n_stages, self.n_outputs
+        raw = np.empty((len(inputs), n_outputs))
+        batch_rows = max(1, BATCH_NODES // len(self.roots))
+        for start in range(0, len(inputs), batch_rows):
+            leaf_values = self.value.take(self._leaves(inputs[start:start + batch_rows]))
+            # The initial prediction, then the scaled leaf value of every stage, added up one stage after the other like
+            # the model adds its trees (add.accumulate sums sequentially, so the rounding is the same)
+            terms = np.empty((len(leaf_values), n_stages + 1, n_outputs))
+            terms[:, 0] = self.initial_raw_prediction
+            terms[:, 1:] = self.learning_rate * leaf_values.reshape(len(leaf_values), n_stages, n_outputs)
+            raw[start:start + batch_rows] = np.add.accumulate(terms, axis=1)[:, -1]
+        return raw
+
+    def predict_proba(self, X):
+        """Class probabilities of a classifier pipeline."""
+        raw = self.decision_function(X)
+        if hasattr(self.loss, '_raw_prediction_to_proba'):
+            return self.loss._raw_prediction_to_proba(raw)
+        return self.loss.predict_proba(raw.ravel() if raw.shape[1] == 1 else raw)
+
+    def predict(self, X):
+        """Predicted values of a regressor pipeline, or classes of a classifier pipeline."""
+        raw = self.decision_function(X)
+        if self.classes_ is None:
+            return raw.ravel()
+        if hasattr(self.loss, '_raw_prediction_to_decision'):
+            encoded_classes = self.loss._raw_prediction_to_decision(raw)
+        elif raw.shape[1] == 1:
+            encoded_classes = (raw.ravel() >= 0).astype(int)
+        else:
+            encoded_classes = np.argmax(raw, axis=1)
+        return self.classes_.take(encoded_classes, axis=0)
+
+
+def compile_pipeline(pipeline):
+    """
+    Compile a fitted `Pipeline` of a `ColumnTransformer` (one-hot encoders with `handle_unknown='ignore'` and
+    passthrough columns) and a gradient boosting model. Raises ValueError for any other pipeline.
+    """
+    return CompiledPipeline(pipeline)
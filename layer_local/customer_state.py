@@ -0,0 +1,119 @@
+"""
+Incremental maintenance of the customer featureset.
+
+`first_order_id`, `first_order_timestamp` and `ordered_again` are all read from the summary of the delivered orders of
+every CUSTOMER_UNIQUE_ID (first order id, first order timestamp and number of delivered orders, see
+`delivered_orders.py` in the featureset directory). Summaries of disjoint sets of orders merge into the summary of all
+orders, so the summary is kept as a state in `<materialized_dir>/<featureset>/state/` and only updated with the orders
+delivered since the previous update. Every order is scanned once, in purchase time order, and the state records which
+orders are scanned without holding all their ORDER_IDs:
+
+- the watermark, the latest purchase time of the scanned orders, and the ORDER_IDs scanned at that exact time,
+- the pending orders, scanned while they were not delivered yet, which are read again at every update.
+
+An update counts the delivered orders among the orders purchased since the watermark and the pending orders. The
+features are then computed from the state, with the same `build_feature` functions as in a full build, and written
+like the other materialized featuresets (see `incremental.py`).
+"""
+import importlib
+import json
+import os
+import sys
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from .dataset import read_table, write_table
+from .executor import load_feature_module, read_feature_inputs
+from .incremental import materialized_featureset
+
+STATE_DIR = 'state'
+
+
+def _write_atomically(df, path):
+    tmp_path = path + '.tmp'
+    write_table(df, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _summary_module(featureset, module_name):
+    # The helper module of the featureset, imported by name like its features import it
+    if featureset.directory not in sys.path:
+        sys.path.insert(0, featureset.directory)
+    return importlib.import_module(module_name)
+
+
+def update_customer_features(project, datasets, featureset_name, materialized_dir,
+                             orders_dataset='orders_dataset', customers_dataset='customers_dataset',
+                             summary_module='delivered_orders'):
+    """
+    Update the per-customer state of `featureset_name` with the newly delivered orders, and write its features
+    from the state into `materialized_dir`. Returns the number of newly counted orders (all orders on the first update).
+    """
+    featureset = project.featuresets[featureset_name]
+    module = _summary_module(featureset, summary_module)
+    state_dir = os.path.join(materialized_dir, featureset_name, STATE_DIR)
+    summary_path = os.path.join(state_dir, 'summary.arrow')
+    pending_path = os.path.join(state_dir, 'pending_orders.arrow')
+    watermark_path = os.path.join(state_dir, 'watermark.json')
+    os.makedirs(state_dir, exist_ok=True)
+
+    order_columns = ['ORDER_ID', 'CUSTOMER_ID', 'ORDER_STATUS', 'ORDER_PURCHASE_TIMESTAMP']
+    if os.path.exists(summary_path):
+        with open(watermark_path) as f:
+            state = json.load(f)
+        watermark, watermark_orders = state['watermark'], state['watermark_orders']
+        filters = [('ORDER_PURCHASE_TIMESTAMP', '>=', pd.Timestamp(watermark))] if watermark else []
+        scanned = datasets(orders_dataset, columns=order_columns, filters=filters).to_arrow()
+        # Orders purchased at the watermark are scanned again: skip the ones the previous updates scanned
+        is_known = pc.is_in(scanned['ORDER_ID'].cast(pa.string()), value_set=pa.array(watermark_orders, pa.string()))
+        scanned = scanned.filter(pc.invert(is_known))
+        pending_orders = read_table(pending_path)['ORDER_ID'].to_pylist()
+        pending = datasets(orders_dataset, columns=order_columns,
+                           filters=[('ORDER_ID', 'in', pending_orders)]).to_arrow().cast(scanned.schema)
+        summary_df = read_table(summary_path).to_pandas()
+    else:
+        watermark, watermark_orders = None, []
+        scanned = datasets(orders_dataset, columns=order_columns).to_arrow()
+        pending = scanned.slice(0, 0)
+        summary_df = None
+
+    # Delivered orders are counted, the other ones are pending (an order is counted once even if it is in the
+    # dataset twice)
+    orders_df = pa.concat_tables([scanned, pending]).to_pandas().drop_duplicates(subset=['ORDER_ID'])
+    is_delivered = (orders_df['ORDER_STATUS'] == 'delivered').to_numpy()
+    new_orders_df = orders_df[is_delivered]
+    pending_orders = pa.array(orders_df['ORDER_ID'][~is_delivered].astype(str).to_numpy(), type=pa.string())
+
+    if summary_df is None or len(new_orders_df):
+        customer_ids = [str(customer_id) for customer_id in new_orders_df['CUSTOMER_ID'].unique()]
+        customers_df = datasets(customers_dataset, columns=['CUSTOMER_ID', 'CUSTOMER_UNIQUE_ID'],
+                                filters=[('CUSTOMER_ID', 'in', customer_ids)]).to_pandas()
+        new_summary_df = module.summarize_delivered_orders(new_orders_df, customers_df)
+        summary_df = new_summary_df if summary_df is None else module.merge_delivered_orders_summaries(summary_df, new_summary_df)
+        _write_atomically(summary_df, summary_path)
+    _write_atomically(pa.table({'ORDER_ID': pending_orders}), pending_path)
+
+    # The watermark moves to the latest purchase time of the scanned orders (the pending ones are purchased before it).
+    # The scanned orders come first in orders_df.
+    scanned_df = orders_df[orders_df.index < scanned.num_rows]
+    latest = scanned_df['ORDER_PURCHASE_TIMESTAMP'].max()
+    if not pd.isna(latest):
+        at_latest = scanned_df['ORDER_ID'][scanned_df['ORDER_PURCHASE_TIMESTAMP'] == latest].astype(str).tolist()
+        if watermark is not None and latest == pd.Timestamp(watermark):
+            at_latest = watermark_orders + at_latest
+        watermark, watermark_orders = str(latest), at_latest
+    with open(watermark_path + '.tmp', 'w') as f:
+        json.dump({'watermark': watermark, 'watermark_orders': watermark_orders}, f)
+    os.replace(watermark_path + '.tmp', watermark_path)
+
+    # Compute the features from the state: the summary is served to the features in place of the datasets
+    layer_datasets = {orders_dataset: datasets(orders_dataset), customers_dataset: datasets(customers_dataset)}
+    module.use_delivered_orders_summary(layer_datasets[orders_dataset], layer_datasets[customers_dataset], summary_df)
+    materialized = materialized_featureset(project, materialized_dir, featureset_name)
+    for feature, path in zip(featureset.features, materialized.feature_paths):
+        arguments = {feature_input.parameter: layer_datasets[feature_input.name] for feature_input in read_feature_inputs(feature)}
+        feature_df = load_feature_module(feature.source).build_feature(**arguments)
+        _write_atomically(feature_df, path)
+    return len(new_orders_df)
@@ -0,0 +1,282 @@
+"""
+A local stand-in for `layer.Dataset` that reads the Olist tables from on-disk Parquet or Arrow IPC files.
+
+Files are memory mapped, so only the pages of the columns and row groups that are actually read are loaded.
+`to_pandas()` accepts an optional column projection and Parquet row-group predicate pushdown on top of the
+`layer.Dataset` surface, so feature code written against Layer runs unchanged.
+"""
+import hashlib
+import os
+
+import pyarrow as pa
+import pyarrow.dataset as pads
+import pyarrow.parquet as pq
+
+from .compact import compact_table_to_pandas
+from .id_dictionary import IdDictionary
+
+# File extensions searched for a table, in order of preference
+TABLE_FILE_EXTENSIONS = ('.parquet', '.arrow', '.feather')
+
+
+def find_table_file(data_dir, table_name):
+    for extension in TABLE_FILE_EXTENSIONS:
+        path = os.path.join(data_dir, table_name + extension)
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError(
+        "No Parquet or Arrow IPC file for table '{}' in {}".format(table_name, os.path.abspath(data_dir)))
+
+
+def file_version(path):
+    # A cheap content version of a file: a new write of the table changes its size or modification time
+    stat = os.stat(path)
+    return '{}-{}'.format(stat.st_size, stat.st_mtime_ns)
+
+
+def _filter_expression(filters):
+    # Convert filters in the DNF form of pyarrow.parquet (a list of (column, op, value) tuples that are ANDed together)
+    # into a dataset expression, for the Arrow IPC files that are filtered after reading
+    expression = None
+    for column, op, value in filters:
+        field = pads.field(column)
+        if op in ('=', '=='):
+            condition = field == value
+        elif op == '!=':
+            condition = field != value
+        elif op == '<':
+            condition = field < value
+        elif op == '<=':
+            condition = field <= value
+        elif op == '>':
+            condition = field > value
+        elif op == '>=':
+            condition = field >= value
+        elif op == 'in':
+            condition = field.isin(list(value))
+        elif op == 'not in':
+            condition = ~field.isin(list(value))
+        else:
+            raise ValueError("Unsupported filter operator: {}".format(op))
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def _filter_table(table, expression):
+    # Filter an in-memory table through pyarrow.dataset, which evaluates expressions on every supported pyarrow version
+    return pads.dataset(table).to_table(filter=expression)
+
+
+def read_table(path, columns=None, filters=None):
+    """
+    Read a Parquet or Arrow IPC file through a memory map.
+
+    `columns` projects the table on a subset of columns. `filters` is a list of (column, op, value) tuples that are
+    ANDed together; for Parquet files, row groups whose min/max statistics cannot match are skipped without being read.
+    """
+    columns = list(columns) if columns is not None else None
+    if path.endswith('.parquet'):
+        return pq.read_table(path, columns=columns, filters=filters or None, memory_map=True)
+
+    with pa.memory_map(path, 'r') as source:
+        table = pa.ipc.open_file(source).read_all()
+    if columns is not None:
+        table = table.select(columns)
+    if filters:
+        table = _filter_table(table, _filter_expression(filters))
+    return table
+
+
+def _iter_ipc_batches(path, columns=None):
+    with pa.memory_map(path, 'r') as source:
+        reader = pa.ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            if columns is not None:
+                batch = pa.RecordBatch.from_arrays([batch.column(batch.schema.get_field_index(column)) for column in columns],
+                                                   names=columns)
+            yield batch
+
+
+class LocalDataset:
+    """
+    Drop-in replacement for `layer.Dataset("<name>")` backed by a local Parquet or Arrow IPC file.
+
+    `columns` and `filters` set at construction time apply to every `to_pandas()` call, so a runner can hand a
+    projected dataset to a `build_feature` function that only calls `to_pandas()`. With an `id_dictionary`
+    (see `id_dictionary.IdDictionary`), `to_pandas()` returns compact dtypes.
+    """
+
+    def __init__(self, name, path, version=None, columns=None, filters=None, id_dictionary=None):
+        self.name = name
+        self.path = path
+        self.version = version or file_version(path)
+        self.columns = list(columns) if columns is not None else None
+        self.filters = list(filters) if filters else []
+        self.id_dictionary = id_dictionary
+
+    def __repr__(self):
+        return "LocalDataset(name={!r}, path={!r}, version={!r})".format(self.name, self.path, self.version)
+
+    @property
+    def schema(self):
+        if self.path.endswith('.parquet'):
+            return pq.read_schema(self.path, memory_map=True)
+        with pa.memory_map(self.path, 'r') as source:
+            return pa.ipc.open_file(source).schema
+
+    @property
+    def nbytes(self):
+        """
+        Size of the columns of the dataset in Arrow memory, from the file metadata without reading the data. For Parquet
+        files it is estimated by the uncompressed size of the column chunks, which is smaller for dictionary-encoded
+        columns. Filters are not taken into account.
+        """
+        if self.path.endswith('.parquet'):
+            metadata = pq.ParquetFile(self.path, memory_map=True).metadata
+            return sum(row_group.column(i).total_uncompressed_size
+                       for row_group in (metadata.row_group(j) for j in range(metadata.num_row_groups))
+                       for i in range(row_group.num_columns)
+                       if self.columns is None or row_group.column(i).path_in_schema in self.columns)
+        with pa.memory_map(self.path, 'r') as source:
+            table = pa.ipc.open_file(source).read_all()
+        return (table.select(self.columns) if self.columns is not None else table).nbytes
+
+    def with_options(self, columns=None, filters=None):
+        """A copy of this dataset with another column projection and additional filters."""
+        return LocalDataset(self.name, self.path, version=self.version,
+                            columns=columns if columns is not None else self.columns,
+                            filters=self.filters + list(filters or []),
+                            id_dictionary=self.id_dictionary)
+
+    def to_arrow(self, columns=None, filters=None):
+        columns = columns if columns is not None else self.columns
+        return read_table(self.path, columns=columns, filters=self.filters + list(filters or []))
+
+    def iter_batches(self, batch_size=64 * 1024, columns=None):
+        """Stream the dataset as Arrow record batches, reading one batch of rows at a time."""
+        columns = list(columns) if columns is not None else self.columns
+        expression = _filter_expression(self.filters) if self.filters else None
+        if self.path.endswith('.parquet'):
+            batches = pq.ParquetFile(self.path, memory_map=True).iter_batches(batch_size=batch_size, columns=columns)
+        else:
+            batches = _iter_ipc_batches(self.path, columns)
+        for batch in batches:
+            if expression is not None:
+                for filtered_batch in _filter_table(pa.Table.from_batches([batch]), expression).to_batches():
+                    yield filtered_batch
+            else:
+                yield batch
+
+    def to_pandas_batches(self, batch_size=64 * 1024, columns=None):
+        """
+        Stream the dataset as pandas dataframes of up to `batch_size` rows. In compact mode, money columns are not
+        downcast: whether a column is downcast depends on all of its values, so batches could disagree.
+        """
+        for batch in self.iter_batches(batch_size=batch_size, columns=columns):
+            table = pa.Table.from_batches([batch])
+            if self.id_dictionary is not None:
+                yield compact_table_to_pandas(table, self.id_dictionary, downcast_money=False)
+            else:
+                yield table.to_pandas(split_blocks=True)
+
+    def to_pandas(self, columns=None, filters=None):
+        table = self.to_arrow(columns=columns, filters=filters)
+        if self.id_dictionary is not None:
+            return compact_table_to_pandas(table, self.id_dictionary)
+        return table.to_pandas(split_blocks=True)
+
+
+class LocalFeatureset:
+    """
+    Drop-in replacement for `layer.Featureset("<name>")` backed by the local table files of its features.
+
+    Every feature file holds the key column of the featureset (for example ORDER_ID) and the feature columns.
+    `to_pandas()` joins the features on the key, in the order of the featureset YAML.
+    """
+
+    def __init__(self, name, feature_paths, version=None):
+        self.name = name
+        self.feature_paths = list(feature_paths)
+        self._version = version
+
+    @property
+    def version(self):
+        if self._version is None:
+            self._version = hashlib.sha1(' '.join(file_version(path) for path in self.feature_paths).encode()).hexdigest()
+        return self._version
+
+    def __repr__(self):
+        return "LocalFeatureset(name={!r}, features={})".format(self.name, len(self.feature_paths))
+
+    def to_pandas(self):
+        df = None
+        for path in self.feature_paths:
+            feature_df = read_table(path).to_pandas(split_blocks=True)
+            if df is None:
+                df = feature_df
+                continue
+            key = df.columns[0]
+            if feature_df.columns[0] != key:
+                raise ValueError("Feature {} of featureset '{}' is keyed on {}, not on {}".format(
+                    path, self.name, feature_df.columns[0], key))
+            df = df.merge(feature_df, on=key, how='outer')
+        return df
+
+
+class LocalDatasetProvider:
+    """
+    Resolves the datasets of a Layer project (`data/*.yaml`) to table files in a local data directory.
+
+    A dataset whose materialization `table_name` is `olist_orders` is read from `<data_dir>/olist_orders.parquet`
+    (or `.arrow` / `.feather`).
+
+    With `compact=True`, the ID columns of all datasets are read as categoricals sharing one dictionary per column and
+    money columns are downcast to float32 where that is lossless (see `compact.py`). The ID dictionary is persisted in
+    `id_dictionary_dir` (`<data_dir>/_id_dictionary` by default) and updated with the keys of the table files that
+    changed since it was last updated.
+    """
+
+    def __init__(self, project, data_dir, compact=False, id_dictionary_dir=None):
+        self.project = project
+        self.data_dir = data_dir
+        self.compact = compact
+        self.id_dictionary = IdDictionary(id_dictionary_dir or os.path.join(data_dir, '_id_dictionary'))
+
+    def _table_datasets(self):
+        datasets = []
+        for name, config in sorted(self.project.datasets.items()):
+            try:
+                datasets.append(LocalDataset(name, find_table_file(self.data_dir, config.table_name)))
+            except FileNotFoundError:
+                continue
+        return datasets
+
+    def update_id_dictionary(self):
+        """Add the keys of the table files that changed since the last update to the ID dictionary."""
+        self.id_dictionary.update(self._table_datasets())
+        return self.id_dictionary
+
+    def dataset(self, name, columns=None, filters=None):
+        config = self.project.datasets[name]
+        return LocalDataset(name, find_table_file(self.data_dir, config.table_name), columns=columns, filters=filters,
+                            id_dictionary=self.update_id_dictionary() if self.compact else None)
+
+    def __call__(self, name, **options):
+        return self.dataset(name, **options)
+
+
+def write_table(df, path, row_group_size=1024 * 1024):
+    """
+    Write a pandas dataframe (or an Arrow table) as a local table file (Parquet or Arrow IPC, depending on the extension
+    of `path`).
+
+    Sort the dataframe on the column you filter most (for example ORDER_ID) before writing it, so that the min/max
+    statistics of the Parquet row groups are selective.
+    """
+    table = df if isinstance(df, pa.Table) else pa.Table.from_pandas(df, preserve_index=False)
+    if path.endswith('.parquet'):
+        pq.write_table(table, path, row_group_size=row_group_size)
+    else:
+        with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table, max_chunksize=row_group_size)
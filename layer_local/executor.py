@@ -0,0 +1,367 @@
+"""
+Runs the featuresets of a Layer project locally, as a DAG of `build_feature` calls on a process pool.
+
+The featureset YAMLs list the features, and the `Dataset("...")` / `Featureset("...")` annotations of every
+`build_feature` function give the dependencies: a feature that reads a featureset runs after all features of that
+featureset. Independent features run in parallel worker processes.
+
+Datasets are shared with the workers through shared memory: every dataset is written once, uncompressed, as an Arrow
+IPC file under /dev/shm and the workers memory map it, so its columns are never copied between processes. Feature
+outputs go through the same directory and are read back as `LocalFeatureset`s by the features that depend on them.
+
+Features whose datasets are handed to the same helper modules (for example the item features, which share
+`items_aggregates.py`) run in the same task, one after another, so the intermediates cached by the helpers are
+computed once.
+"""
+import ast
+import hashlib
+import importlib.util
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field, replace
+from typing import Dict, List, Optional, Set
+
+import pyarrow as pa
+
+from .dataset import LocalDataset, LocalFeatureset, write_table
+from .feature_cache import FeatureCache, feature_cache_key, featureset_version
+from .project import FeatureConfig
+from .projection import annotation_entity, build_feature_definition, infer_featureset_columns, projected_dataset
+
+# Shared memory is a tmpfs on Linux. Elsewhere, the files go to the temporary directory (and the page cache).
+SHARED_MEMORY_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+
+
+@dataclass
+class FeatureInput:
+    parameter: str
+    entity_type: str  # 'Dataset' or 'Featureset'
+    name: str
+    columns: Optional[List[str]] = None  # Inferred column projection of a dataset
+
+
+@dataclass
+class FeatureNode:
+    feature: FeatureConfig
+    inputs: List[FeatureInput]
+
+
+@dataclass
+class FeatureTask:
+    """Features of one featureset that run one after another in the same worker process."""
+    featureset: str
+    directory: str
+    features: List[FeatureNode]
+    dependencies: Set[str] = field(default_factory=set)  # Featuresets that must be built first
+
+
+@dataclass
+class FeatureTiming:
+    featureset: str
+    feature: str
+    seconds: float
+    rows: int
+    cached: bool = False  # Served from the feature cache
+
+
+@dataclass
+class BuildResult:
+    featuresets: Dict[str, LocalFeatureset]
+    timings: List[FeatureTiming]
+    seconds: float
+
+    def format_timings(self):
+        lines = ['{:<32} {:<40} {:>10} {:>10}'.format('featureset', 'feature', 'seconds', 'rows')]
+        for timing in self.timings:
+            seconds = 'cached' if timing.cached else '{:.3f}'.format(timing.seconds)
+            lines.append('{:<32} {:<40} {:>10} {:>10}'.format(timing.featureset, timing.feature, seconds, timing.rows))
+        lines.append('{:<32} {:<40} {:>10.3f}'.format('total (wall time)', '', self.seconds))
+        return '\n'.join(lines)
+
+
+def read_feature_inputs(feature):
+    """The `Dataset` and `Featureset` parameters of the `build_feature` function of a feature."""
+    with open(feature.source) as f:
+        function = build_feature_definition(ast.parse(f.read(), filename=feature.source))
+    if function is None:
+        raise ValueError("{} has no build_feature function".format(feature.source))
+    inputs = []
+    for argument in function.args.args:
+        entity = annotation_entity(argument.annotation)
+        if entity is None:
+            raise ValueError("Parameter '{}' of {} is not annotated with a Dataset or a Featureset".format(
+                argument.arg, feature.source))
+        inputs.append(FeatureInput(argument.arg, entity[0], entity[1]))
+    return inputs
+
+
+def build_dag(project, featuresets=None, featureset_aliases=None, project_columns=True):
+    """
+    Build the tasks that compute the given featuresets (all featuresets of the project by default) and the
+    featuresets they depend on, in a topological order.
+
+    `featureset_aliases` maps featureset names used in `Featureset("...")` annotations to featuresets of the project,
+    for features that read a featureset published under another name (like `order_features_trial`).
+    """
+    featureset_aliases = featureset_aliases or {}
+    pending = list(featuresets or project.featuresets)
+    tasks = {}
+    while pending:
+        name = pending.pop()
+        if name in tasks:
+            continue
+        if name not in project.featuresets:
+            raise ValueError("Featureset '{}' is not defined in project '{}'".format(name, project.name))
+        featureset = project.featuresets[name]
+        inferred = infer_featureset_columns(featureset) if project_columns else {}
+
+        groups = {}
+        for feature in featureset.features:
+            inputs = read_feature_inputs(feature)
+            helper_modules = frozenset()
+            for feature_input in inputs:
+                if feature_input.entity_type == 'Featureset':
+                    resolved = featureset_aliases.get(feature_input.name, feature_input.name)
+                    if resolved not in project.featuresets:
+                        raise ValueError(
+                            "Feature '{}' reads featureset '{}', which is not defined in project '{}'. "
+                            "Map it to a featureset of the project with `featureset_aliases`.".format(
+                                feature.name, feature_input.name, project.name))
+                    feature_input.name = resolved
+                elif feature.name in inferred:
+                    dataset_columns = inferred[feature.name].parameters[feature_input.parameter]
+                    if dataset_columns.columns is not None:
+                        feature_input.columns = sorted(dataset_columns.columns)
+                    helper_modules |= dataset_columns.helper_modules
+            # Features sharing helper modules form one task, every other feature is a task of its own
+            group_key = helper_modules or feature.name
+            groups.setdefault(group_key, []).append(FeatureNode(feature, inputs))
+
+        tasks[name] = []
+        for nodes in groups.values():
+            dependencies = {feature_input.name for node in nodes for feature_input in node.inputs
+                            if feature_input.entity_type == 'Featureset'}
+            tasks[name].append(FeatureTask(name, featureset.directory, nodes, dependencies))
+            pending.extend(dependencies)
+
+    return [task for name in _topological_order(tasks) for task in tasks[name]]
+
+
+def _topological_order(tasks):
+    dependencies = {name: set().union(*(task.dependencies for task in featureset_tasks))
+                    for name, featureset_tasks in tasks.items()}
+    order = []
+    while dependencies:
+        ready = sorted(name for name, names in dependencies.items() if not names - set(order))
+        if not ready:
+            raise ValueError("Featuresets {} depend on each other".format(sorted(dependencies)))
+        for name in ready:
+            order.append(name)
+            del dependencies[name]
+    return order
+
+
+def load_feature_module(source):
+    """Import a feature source file as a module of its own."""
+    module_name = 'layer_local_feature_' + hashlib.sha1(os.path.abspath(source).encode()).hexdigest()[:12]
+    spec = importlib.util.spec_from_file_location(module_name, source)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _table_rows(path):
+    with pa.memory_map(path, 'r') as source:
+        return pa.ipc.open_file(source).read_all().num_rows
+
+
+def _run_task(task, inputs, output_paths):
+    # Runs in a worker process. Helper modules of a featureset are imported by name from its directory.
+    if task.directory not in sys.path:
+        sys.path.insert(0, task.directory)
+    results = []
+    for node in task.features:
+        module = load_feature_module(node.feature.source)
+        arguments = {}
+        for feature_input in node.inputs:
+            entity = inputs[(feature_input.entity_type, feature_input.name)]
+            if feature_input.columns is not None:
+                entity = projected_dataset(entity, feature_input.columns)
+            arguments[feature_input.parameter] = entity
+
+        start = time.perf_counter()
+        feature_df = module.build_feature(**arguments)
+        seconds = time.perf_counter() - start
+
+        # Write to a temporary file first: the output path may be in the feature cache, which must only hold complete files
+        path = output_paths[node.feature.name]
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        write_table(feature_df, tmp_path)
+        os.replace(tmp_path, path)
+        results.append((node.feature.name, seconds, len(feature_df)))
+    return results
+
+
+class FeaturesetExecutor:
+    """
+    Builds featuresets of a project from the datasets of a `LocalDatasetProvider`.
+
+    Use it as a context manager: the shared memory directory (and the `LocalFeatureset`s built in it) is removed on
+    exit, unless an explicit `work_dir` is given.
+
+        with FeaturesetExecutor(project, datasets, max_workers=4) as executor:
+            result = executor.run(["order_features_tutorial6"])
+            print(result.format_timings())
+            order_features_df = result.featuresets["order_features_tutorial6"].to_pandas()
+
+    With a `cache_dir`, feature outputs are kept in a `FeatureCache` and features whose source, helper modules,
+    requirements and inputs did not change are served from it instead of being computed again.
+
+    `dataset_filters` maps dataset names to filters (see `read_table`) applied to the datasets before they are shared
+    with the features, for example to compute the features of some orders only (see `incremental.py`).
+    """
+
+    def __init__(self, project, datasets, max_workers=None, featureset_aliases=None, project_columns=True, work_dir=None,
+                 cache_dir=None, dataset_filters=None):
+        self.project = project
+        self.datasets = datasets
+        self.max_workers = max_workers
+        self.featureset_aliases = featureset_aliases or {}
+        self.project_columns = project_columns
+        self.work_dir = work_dir
+        self.cache = FeatureCache(cache_dir) if cache_dir else None
+        self.dataset_filters = dataset_filters or {}
+        self._owns_work_dir = work_dir is None
+        self._source_datasets = {}
+        self._shared_datasets = {}
+        self._featuresets = {}
+
+    def __enter__(self):
+        if self.work_dir is None:
+            self.work_dir = tempfile.mkdtemp(prefix='layer_local_', dir=SHARED_MEMORY_DIR)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._owns_work_dir and self.work_dir is not None:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+            self.work_dir = None
+
+    def _source_dataset(self, name):
+        if name not in self._source_datasets:
+            self._source_datasets[name] = self.datasets(name, filters=self.dataset_filters.get(name))
+        return self._source_datasets[name]
+
+    def _dataset_version(self, name):
+        # Filtered datasets are other inputs than the whole dataset, for the feature cache
+        dataset = self._source_dataset(name)
+        if not dataset.filters:
+            return dataset.version
+        return '{}:{}'.format(dataset.version, hashlib.sha256(repr(dataset.filters).encode()).hexdigest())
+
+    def _shared_dataset(self, name):
+        # Write the dataset once as an uncompressed Arrow IPC file that the workers memory map
+        if name not in self._shared_datasets:
+            dataset = self._source_dataset(name)
+            path = os.path.join(self.work_dir, 'datasets', name + '.arrow')
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            write_table(dataset.to_arrow(), path)
+            self._shared_datasets[name] = LocalDataset(name, path, version=self._dataset_version(name),
+                                                       id_dictionary=dataset.id_dictionary)
+        return self._shared_datasets[name]
+
+    def _feature_keys(self, tasks):
+        # Cache keys of all features, computed before anything runs: a featureset's version is derived from the keys of
+        # its features, so the keys of the features that read it are known too (tasks are in topological order)
+        keys = {}
+        versions = {}
+        options = ['compact'] if getattr(self.datasets, 'compact', False) else []
+        for task in tasks:
+            for node in task.features:
+                input_versions = []
+                for feature_input in node.inputs:
+                    if feature_input.entity_type == 'Dataset':
+                        version = self._dataset_version(feature_input.name)
+                    else:
+                        if feature_input.name not in versions:
+                            config = self.project.featuresets[feature_input.name]
+                            versions[feature_input.name] = featureset_version(
+                                [keys[(feature_input.name, feature.name)] for feature in config.features])
+                        version = versions[feature_input.name]
+                    input_versions.append((feature_input.parameter, feature_input.entity_type, feature_input.name, version))
+                keys[(task.featureset, node.feature.name)] = feature_cache_key(node.feature, input_versions, options)
+        return keys
+
+    def run(self, featuresets=None):
+        """Build the given featuresets (all featuresets of the project by default) and the featuresets they read."""
+        if self.work_dir is None:
+            raise RuntimeError("FeaturesetExecutor.run must be called inside a `with FeaturesetExecutor(...)` block")
+        start = time.perf_counter()
+        tasks = build_dag(self.project, featuresets, self.featureset_aliases, self.project_columns)
+        keys = self._feature_keys(tasks)
+        if self.cache is not None:
+            paths = {feature: self.cache.path(key) for feature, key in keys.items()}
+        else:
+            paths = {(featureset, feature): os.path.join(self.work_dir, 'features', '{}.{}.arrow'.format(featureset, feature))
+                     for featureset, feature in keys}
+        cached = {feature for feature, key in keys.items() if self.cache is not None and key in self.cache}
+
+        remaining = {task.featureset for task in tasks}
+        unfinished_tasks = {name: sum(task.featureset == name for task in tasks) for name in remaining}
+        timings = []
+
+        def finish(task):
+            unfinished_tasks[task.featureset] -= 1
+            if unfinished_tasks[task.featureset] == 0:
+                # Every feature of the featureset is built: features that read it can run
+                config = self.project.featuresets[task.featureset]
+                feature_keys = [keys[(task.featureset, feature.name)] for feature in config.features]
+                self._featuresets[task.featureset] = LocalFeatureset(
+                    task.featureset, [paths[(task.featureset, feature.name)] for feature in config.features],
+                    version=featureset_version(feature_keys))
+                remaining.discard(task.featureset)
+
+        waiting = list(tasks)
+        running = {}
+        # Workers are spawned rather than forked: the parent process already runs Arrow threads
+        with ProcessPoolExecutor(self.max_workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            while waiting or running:
+                for task in [task for task in waiting if not task.dependencies & remaining]:
+                    waiting.remove(task)
+                    nodes = []
+                    for node in task.features:
+                        if (task.featureset, node.feature.name) in cached:
+                            path = paths[(task.featureset, node.feature.name)]
+                            timings.append(FeatureTiming(task.featureset, node.feature.name, 0.0, _table_rows(path), cached=True))
+                        else:
+                            nodes.append(node)
+                    if not nodes:
+                        finish(task)
+                        continue
+
+                    task_inputs = {(feature_input.entity_type, feature_input.name):
+                                   self._shared_dataset(feature_input.name) if feature_input.entity_type == 'Dataset'
+                                   else self._featuresets[feature_input.name]
+                                   for node in nodes for feature_input in node.inputs}
+                    output_paths = {node.feature.name: paths[(task.featureset, node.feature.name)] for node in nodes}
+                    running[pool.submit(_run_task, replace(task, features=nodes), task_inputs, output_paths)] = task
+
+                if not running:
+                    # Only cached tasks were ready: they may have unblocked waiting tasks
+                    if waiting and all(task.dependencies & remaining for task in waiting):
+                        raise RuntimeError("No task can run: featuresets {} are never built".format(sorted(remaining)))
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = running.pop(future)
+                    for feature_name, seconds, rows in future.result():
+                        timings.append(FeatureTiming(task.featureset, feature_name, seconds, rows))
+                    finish(task)
+
+        built = {task.featureset: self._featuresets[task.featureset] for task in tasks}
+        return BuildResult(built, timings, time.perf_counter() - start)
@@ -0,0 +1,62 @@
+"""
+A content-addressed cache for the outputs of `build_feature` functions.
+
+The output of a feature is stored as an Arrow IPC file named after a hash of everything that determines it:
+the feature source file, the sibling helper modules it imports, its `requirements.txt` and the versions of its input
+datasets and featuresets. A feature whose key is in the cache is not computed again, so iterating on one feature of a
+featureset only recomputes that feature (and the features of the featuresets that read it).
+"""
+import hashlib
+import os
+
+from .projection import sibling_modules
+
+
+def _update_with_file(hasher, label, path):
+    hasher.update(label.encode() + b'\0')
+    with open(path, 'rb') as f:
+        hasher.update(hashlib.sha256(f.read()).digest())
+
+
+def feature_cache_key(feature, input_versions, options=()):
+    """
+    Cache key of a feature (a `project.FeatureConfig`).
+
+    `input_versions` lists (parameter, entity type, name, version) for every parameter of `build_feature`, and
+    `options` any other setting that changes the output (like the compact dtypes of the datasets).
+    """
+    hasher = hashlib.sha256()
+    _update_with_file(hasher, 'source', feature.source)
+    for path in sorted(sibling_modules(feature.source)):
+        _update_with_file(hasher, 'module ' + os.path.basename(path), path)
+    if feature.environment and os.path.exists(feature.environment):
+        _update_with_file(hasher, 'environment', feature.environment)
+    for parameter, entity_type, name, version in input_versions:
+        hasher.update('input {} {} {} {}\0'.format(parameter, entity_type, name, version).encode())
+    for option in options:
+        hasher.update('option {}\0'.format(option).encode())
+    return hasher.hexdigest()
+
+
+def featureset_version(feature_keys):
+    """Version of a featureset built from features with the given cache keys (in the order of the featureset YAML)."""
+    return hashlib.sha256(' '.join(feature_keys).encode()).hexdigest()
+
+
+class FeatureCache:
+    """Feature outputs stored as `<directory>/<key[:2]>/<key>.arrow`."""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key + '.arrow')
+
+    def __contains__(self, key):
+        return os.path.exists(self.path(key))
+
+    def clear(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith('.arrow'):
+                    os.remove(os.path.join(root, name))
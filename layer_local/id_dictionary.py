@@ -0,0 +1,159 @@
+"""
+A persistent dictionary of the Olist IDs, shared by all datasets of a project.
+
+Every distinct value of ORDER_ID, CUSTOMER_ID, PRODUCT_ID and SELLER_ID gets a dense int32 surrogate: its position
+in the `<directory>/<COLUMN>.arrow` file of the column. Surrogates never change: when a table file changes, only its
+key columns are scanned again and the values that are not in the dictionary yet are appended. The versions of the
+scanned tables are recorded in `<directory>/versions.json`, so an unchanged table is never scanned twice.
+
+With surrogates, a join on an ID is an array gather (see `gather_rows`) instead of a hash join on strings.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# ID columns that join the Olist tables
+KEY_COLUMNS = ('ORDER_ID', 'CUSTOMER_ID', 'PRODUCT_ID', 'SELLER_ID')
+
+VERSIONS_FILE = 'versions.json'
+
+
+def _write_atomically(path, write):
+    # Write to a temporary file first, so that readers never see a partially written file
+    tmp_path = path + '.tmp'
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+class IdDictionary:
+    """Maps the values of the key columns to int32 surrogates, persisted in `directory`."""
+
+    def __init__(self, directory, key_columns=KEY_COLUMNS):
+        self.directory = directory
+        self.key_columns = tuple(key_columns)
+        self._values = {}
+        self._sorted = {}
+        self._versions = None
+
+    def __getstate__(self):
+        # Processes that receive the dictionary memory map its files again instead of unpickling the values
+        return {'directory': self.directory, 'key_columns': self.key_columns}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def _column_path(self, column):
+        return os.path.join(self.directory, column + '.arrow')
+
+    def versions(self):
+        # Versions of the tables whose key columns are in the dictionary, by dataset name
+        if self._versions is None:
+            path = os.path.join(self.directory, VERSIONS_FILE)
+            if os.path.exists(path):
+                with open(path) as f:
+                    self._versions = json.load(f)
+            else:
+                self._versions = {}
+        return self._versions
+
+    def values(self, column):
+        """The values of a key column, in surrogate order."""
+        if column not in self._values:
+            path = self._column_path(column)
+            if os.path.exists(path):
+                with pa.memory_map(path, 'r') as source:
+                    self._values[column] = pa.ipc.open_file(source).read_all()[column].combine_chunks()
+            else:
+                self._values[column] = pa.array([], type=pa.string())
+        return self._values[column]
+
+    def update(self, datasets):
+        """
+        Add the key values of the given `LocalDataset`s whose version changed since they were last scanned.
+        Returns the key columns that got new values.
+        """
+        versions = dict(self.versions())
+        new_values = {}
+        for dataset in datasets:
+            if versions.get(dataset.name) == dataset.version:
+                continue
+            columns = [column for column in self.key_columns if column in dataset.schema.names]
+            if columns:
+                table = dataset.with_options(columns=columns).to_arrow()
+                for column in columns:
+                    values = pc.unique(table[column])
+                    values = values.filter(pc.is_valid(values))
+                    known = pa.concat_arrays([self.values(column)] + new_values.get(column, []))
+                    values = values.filter(pc.invert(pc.is_in(values, value_set=known)))
+                    if len(values):
+                        new_values.setdefault(column, []).append(values.cast(pa.string()))
+            versions[dataset.name] = dataset.version
+
+        os.makedirs(self.directory, exist_ok=True)
+        for column, arrays in new_values.items():
+            values = pa.concat_arrays([self.values(column)] + arrays)
+            table = pa.Table.from_arrays([values], names=[column])
+
+            def write(path, table=table):
+                with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+
+            _write_atomically(self._column_path(column), write)
+            self._values[column] = values
+            self._sorted.pop(column, None)
+
+        # The versions are written last: if an update is interrupted, the changed tables are scanned again
+        if versions != self.versions():
+            def write(path):
+                with open(path, 'w') as f:
+                    json.dump(versions, f, indent=2, sort_keys=True)
+
+            _write_atomically(os.path.join(self.directory, VERSIONS_FILE), write)
+            self._versions = versions
+        return sorted(new_values)
+
+    def surrogates(self, column, values):
+        """int32 surrogates of an Arrow array of values of a key column (-1 for nulls and unknown values)."""
+        indices = pc.fill_null(pc.index_in(values, value_set=self.values(column)), -1)
+        # Without nulls, Arrays and ChunkedArrays convert with a plain to_numpy() (ChunkedArray.to_numpy takes no
+        # arguments on pyarrow 6)
+        return indices.to_numpy().astype(np.int32, copy=False)
+
+    def _sorted_dictionary(self, column):
+        # Categorical dtype with the values of the column in sorted order, and the sorted position of every surrogate
+        if column not in self._sorted:
+            values = self.values(column)
+            order = pc.sort_indices(values).to_numpy()
+            ranks = np.empty(len(values) + 1, dtype=np.int32)
+            ranks[order] = np.arange(len(values), dtype=np.int32)
+            # The extra last rank is used by the surrogate -1
+            ranks[-1] = -1
+            dtype = pd.CategoricalDtype(pd.Index(values.take(pa.array(order)).to_pandas()), ordered=False)
+            self._sorted[column] = (dtype, ranks)
+        return self._sorted[column]
+
+    def categorical_dtype(self, column):
+        """The categorical dtype of a key column: categories are sorted, so groupbys order groups like on strings."""
+        return self._sorted_dictionary(column)[0]
+
+    def to_categorical(self, column, values):
+        """Encode an Arrow array of values of a key column as a categorical of `categorical_dtype(column)`."""
+        dtype, ranks = self._sorted_dictionary(column)
+        return pd.Categorical.from_codes(ranks[self.surrogates(column, values)], dtype=dtype)
+
+
+def gather_rows(left_surrogates, right_surrogates, size):
+    """
+    Left join on a key that is unique in the right table, as an array gather: returns, for every left surrogate,
+    the position of the right row with the same surrogate, or -1 when there is none. `size` is the number of values
+    of the key column in the dictionary.
+    """
+    positions = np.full(size + 1, -1, dtype=np.int64)
+    valid = right_surrogates >= 0
+    positions[right_surrogates[valid]] = np.flatnonzero(valid)
+    # Left rows without a surrogate use the extra last position
+    return positions[left_surrogates]
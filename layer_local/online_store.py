@@ -0,0 +1,248 @@
+"""
+Online store of built featuresets: one row per key, looked up in microseconds.
+
+`write_online_store` materializes a featureset as fixed-width NumPy arrays sorted by its key (ORDER_ID for the order
+featuresets, CUSTOMER_UNIQUE_ID for the customer features): the keys as fixed-width byte strings, every numeric and
+datetime column as an array of its dtype, and every other column (strings, categoricals) as int32 codes into a
+dictionary of its values. Nullable columns (`Int64`, `Float64`, `boolean`) are stored as their NumPy values and a mask
+of their missing values, and time zone aware timestamps as UTC times; both come back with their pandas dtype. Row i of
+every column array is the row of key i, so a key lookup is a binary search of the sorted keys followed by a gather of
+the columns. `OnlineFeatureset` memory maps the arrays:
+
+    orders = OnlineFeatureset('order_features_tutorial6', 'online')
+    rows = orders.multi_get(['e481f51cbdc54678b7cc49136f2d6af7', '53cdb2fc8bc7dce0b6741e2150273451'])
+
+Every write creates a new version directory `<directory>/<name>/<version>`, then switches the `CURRENT` file to it with
+an atomic rename (see `versions.py`). Readers keep using the version they opened until they `refresh()`, which
+`OnlineFeatureset` does every `refresh_interval` seconds, so the store is refreshed from the offline build without
+stopping the readers.
+"""
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from .versions import current_version, new_version_directory, publish_version
+
+METADATA_FILE = '_store.json'
+# Nullable columns that are stored as NumPy values and a mask of their missing values
+MASKED_ARRAYS = (pd.arrays.IntegerArray, pd.arrays.FloatingArray, pd.arrays.BooleanArray)
+
+
+class _Column:
+    """The memory-mapped values of a column, with its dictionary, mask of missing values and pandas dtype if any."""
+
+    def __init__(self, values, dictionary=None, mask=None, dtype=None):
+        self.values = values
+        self.dictionary = dictionary
+        self.mask = mask
+        self.dtype = dtype
+
+
+def _encode_keys(keys):
+    # Keys as UTF-8 byte strings (ASCII keys like the Olist IDs convert directly)
+    try:
+        return np.asarray(keys, dtype=bytes)
+    except UnicodeEncodeError:
+        return np.char.encode(np.asarray(keys, dtype=str), 'utf-8')
+
+
+def _write_dictionary(values, path):
+    table = pa.table({'value': pa.array(values)})
+    with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+
+
+def _read_dictionary(path):
+    with pa.memory_map(path) as source:
+        return pa.ipc.open_file(source).read_all().column('value').to_pandas().to_numpy(dtype=object)
+
+
+def write_online_store(featureset, directory, key=None):
+    """
+    Write a featureset (a `LocalFeatureset`, or anything with `name` and `to_pandas()`) as a new version of the online
+    store `<directory>/<name>`, keyed on `key` (the first column by default), and make it the current version.
+    Returns the `OnlineFeatureset`.
+    """
+    df = featureset.to_pandas()
+    key = key or df.columns[0]
+    if df[key].isna().any():
+        raise ValueError("The key {} of {} has missing values".format(key, featureset.name))
+    encoded_keys = _encode_keys(df[key].astype(str).to_numpy())
+    order = np.argsort(encoded_keys, kind='stable')
+    encoded_keys = encoded_keys[order]
+    if len(encoded_keys) > 1 and (encoded_keys[1:] == encoded_keys[:-1]).any():
+        raise ValueError("The key {} of {} is not unique".format(key, featureset.name))
+
+    path = os.path.join(directory, featureset.name)
+    version, tmp_path = new_version_directory(path)
+    np.save(os.path.join(tmp_path, 'keys.npy'), encoded_keys)
+    columns = []
+    for i, column in enumerate(c for c in df.columns if c != key):
+        values = df[column].iloc[order]
+        file_name = 'column-{}.npy'.format(i)
+        if isinstance(values.dtype, np.dtype) and values.dtype.kind in 'biufmM':
+            np.save(os.path.join(tmp_path, file_name), values.to_numpy().astype(values.dtype.str))
+            columns.append({'name': column, 'file': file_name, 'dictionary': None})
+            continue
+        if isinstance(values.dtype, pd.DatetimeTZDtype):
+            # Time zone aware timestamps: their UTC times (NaT for missing values), converted to the time zone on reads
+            np.save(os.path.join(tmp_path, file_name),
+                    values.dt.tz_convert('UTC').dt.tz_localize(None).to_numpy(dtype='datetime64[ns]'))
+            columns.append({'name': column, 'file': file_name, 'dictionary': None, 'dtype': str(values.dtype)})
+            continue
+        if isinstance(values.array, MASKED_ARRAYS):
+            # Nullable integers, floats and booleans: their values and a mask of the missing values
+            mask_file = 'mask-{}.npy'.format(i)
+            numpy_dtype = values.dtype.numpy_dtype
+            np.save(os.path.join(tmp_path, file_name), values.to_numpy(dtype=numpy_dtype, na_value=numpy_dtype.type(0)))
+            np.save(os.path.join(tmp_path, mask_file), values.isna().to_numpy())
+            columns.append({'name': column, 'file': file_name, 'dictionary': None, 'mask': mask_file,
+                            'dtype': str(values.dtype)})
+            continue
+        if isinstance(values.dtype, pd.api.extensions.ExtensionDtype) \
+                and not isinstance(values.dtype, (pd.CategoricalDtype, pd.StringDtype)):
+            raise ValueError("Column {} of {} has the dtype {}, which the online store cannot hold".format(
+                column, featureset.name, values.dtype))
+        # Strings, categoricals and other objects: codes into the distinct values (-1 for missing values)
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            codes, dictionary = values.cat.codes.to_numpy(), values.cat.categories
+        else:
+            codes, dictionary = pd.factorize(values)
+        dictionary_file = 'dictionary-{}.arrow'.format(i)
+        np.save(os.path.join(tmp_path, file_name), codes.astype(np.int32))
+        _write_dictionary(np.asarray(dictionary, dtype=object), os.path.join(tmp_path, dictionary_file))
+        columns.append({'name': column, 'file': file_name, 'dictionary': dictionary_file})
+    with open(os.path.join(tmp_path, METADATA_FILE), 'w') as f:
+        json.dump({'name': featureset.name, 'key': key, 'rows': len(encoded_keys), 'columns': columns}, f, indent=2)
+    publish_version(path, version, tmp_path)
+    return OnlineFeatureset(featureset.name, directory)
+
+
+class _StoreVersion:
+    """The memory-mapped arrays of one version of an online store."""
+
+    def __init__(self, path):
+        with open(os.path.join(path, METADATA_FILE)) as f:
+            metadata = json.load(f)
+        self.key = metadata['key']
+        self.keys = np.load(os.path.join(path, 'keys.npy'), mmap_mode='r')
+        self.columns = {}
+        for column in metadata['columns']:
+            values = np.load(os.path.join(path, column['file']), mmap_mode='r')
+            dictionary = _read_dictionary(os.path.join(path, column['dictionary'])) if column['dictionary'] else None
+            mask = np.load(os.path.join(path, column['mask']), mmap_mode='r') if column.get('mask') else None
+            dtype = pd.api.types.pandas_dtype(column['dtype']) if column.get('dtype') else None
+            self.columns[column['name']] = _Column(values, dictionary, mask, dtype)
+
+    def positions(self, keys):
+        # Row of every key, -1 for the keys that are not in the store
+        encoded_keys = _encode_keys(keys)
+        positions = np.searchsorted(self.keys, encoded_keys)
+        found = positions < len(self.keys)
+        found[found] = self.keys[positions[found]] == encoded_keys[found]
+        # Longer keys than the fixed width of the store would match a truncated key
+        if encoded_keys.dtype.itemsize > self.keys.dtype.itemsize:
+            found &= np.char.str_len(encoded_keys) <= self.keys.dtype.itemsize
+        return np.where(found, positions, -1)
+
+    def gather(self, column, positions):
+        column = self.columns[column]
+        values = np.asarray(column.values.take(positions))
+        if column.mask is not None:
+            return column.dtype.construct_array_type()(values, np.asarray(column.mask.take(positions)))
+        if isinstance(column.dtype, pd.DatetimeTZDtype):
+            return pd.DatetimeIndex(values).tz_localize('UTC').tz_convert(column.dtype.tz).array
+        if column.dictionary is None:
+            return values
+        if not len(column.dictionary):
+            return np.full(len(values), None, dtype=object)
+        return np.where(values >= 0, column.dictionary.take(values), None)
+
+
+class OnlineFeatureset:
+    """
+    Reader of the online store of a featureset, written by `write_online_store` under `<directory>/<name>`.
+
+    `multi_get` returns the rows of a batch of keys. `to_pandas(columns=..., keys=...)` returns them as a dataframe,
+    like `ColumnarFeatureset.to_pandas`, so the online store can replace it in `layer_local.scoring.ChurnScorer`.
+    """
+
+    def __init__(self, name, directory, refresh_interval=1.0):
+        self.name = name
+        self.path = os.path.join(directory, name)
+        self.refresh_interval = refresh_interval
+        self.version = None
+        self._store = None
+        self._checked = None
+        self.refresh()
+
+    def __repr__(self):
+        return "OnlineFeatureset(name={!r}, path={!r}, version={!r})".format(self.name, self.path, self.version)
+
+    def __len__(self):
+        return len(self._store.keys)
+
+    @property
+    def key(self):
+        return self._store.key
+
+    @property
+    def schema(self):
+        fields = [pa.field(self.key, pa.string())]
+        for name, column in self._store.columns.items():
+            if isinstance(column.dtype, pd.DatetimeTZDtype):
+                fields.append(pa.field(name, pa.timestamp('ns', tz=str(column.dtype.tz))))
+            elif column.dictionary is None:
+                fields.append(pa.field(name, pa.from_numpy_dtype(column.values.dtype)))
+            else:
+                fields.append(pa.field(name, pa.string()))
+        return pa.schema(fields)
+
+    def refresh(self):
+        """Switch to the current version of the store if it changed. Returns whether it did."""
+        self._checked = time.monotonic()
+        while True:
+            version = current_version(self.path)
+            if version == self.version:
+                return False
+            try:
+                store = _StoreVersion(os.path.join(self.path, version))
+                break
+            except FileNotFoundError:
+                # The version was replaced and removed by later writes since CURRENT was read
+                continue
+        # One assignment, so concurrent lookups see either the previous version or the new one
+        self._store = store
+        self.version = version
+        return True
+
+    def _current_store(self):
+        if self.refresh_interval is not None and time.monotonic() - self._checked >= self.refresh_interval:
+            self.refresh()
+        return self._store
+
+    def multi_get(self, keys, columns=None):
+        """
+        Rows of the given keys that are in the store, in the order of `keys`: a dict of the key column and of the
+        `columns` (all by default) to NumPy arrays (pandas arrays for the nullable and time zone aware columns).
+        """
+        store = self._current_store()
+        keys = np.asarray(keys, dtype=object)
+        positions = store.positions(keys)
+        found = positions >= 0
+        positions = positions[found]
+        rows = {store.key: keys[found]}
+        for column in store.columns if columns is None else columns:
+            if column != store.key:
+                rows[column] = store.gather(column, positions)
+        return rows
+
+    def to_pandas(self, columns=None, keys=None):
+        store = self._current_store()
+        if keys is None:
+            keys = np.char.decode(np.asarray(store.keys), 'utf-8').astype(object)
+        return pd.DataFrame(self.multi_get(keys, columns=columns))
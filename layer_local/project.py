@@ -0,0 +1,91 @@
+"""
+Reads the configuration files of a Layer project: the datasets declared under `data/`,
+the featuresets declared under `features/` and the models declared under `models/`.
+"""
+import glob
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import yaml
+
+
+@dataclass
+class DatasetConfig:
+    name: str
+    table_name: str
+    description: str = ""
+
+
+@dataclass
+class FeatureConfig:
+    name: str
+    source: str
+    environment: Optional[str] = None
+    description: str = ""
+
+
+@dataclass
+class FeaturesetConfig:
+    name: str
+    directory: str
+    features: List[FeatureConfig] = field(default_factory=list)
+    description: str = ""
+
+
+@dataclass
+class ModelConfig:
+    name: str
+    directory: str
+    entrypoint: str
+    environment: Optional[str] = None
+    description: str = ""
+
+
+@dataclass
+class Project:
+    directory: str
+    name: str
+    datasets: Dict[str, DatasetConfig] = field(default_factory=dict)
+    featuresets: Dict[str, FeaturesetConfig] = field(default_factory=dict)
+    models: Dict[str, ModelConfig] = field(default_factory=dict)
+
+
+def _read_yaml(path):
+    with open(path) as f:
+        return yaml.safe_load(f) or {}
+
+
+def load_project(project_dir):
+    """Parse all the entity configuration files of the Layer project in `project_dir`."""
+    project_dir = os.path.abspath(project_dir)
+    project_config = _read_yaml(os.path.join(project_dir, '.layer', 'project.yaml'))
+    project = Project(directory=project_dir, name=project_config.get('name', os.path.basename(project_dir)))
+
+    for path in sorted(glob.glob(os.path.join(project_dir, '**', '*.yaml'), recursive=True)):
+        config = _read_yaml(path)
+        directory = os.path.dirname(path)
+        entity_type = config.get('type')
+        if entity_type == 'dataset':
+            project.datasets[config['name']] = DatasetConfig(
+                name=config['name'],
+                table_name=config['materialization']['table_name'],
+                description=config.get('description', ""))
+        elif entity_type == 'featureset':
+            features = [FeatureConfig(name=feature['name'],
+                                      source=os.path.join(directory, feature['source']),
+                                      environment=feature.get('environment') and os.path.join(directory, feature['environment']),
+                                      description=feature.get('description', ""))
+                        for feature in config.get('features', [])]
+            project.featuresets[config['name']] = FeaturesetConfig(
+                name=config['name'], directory=directory, features=features, description=config.get('description', ""))
+        elif entity_type == 'model':
+            training = config['training']
+            project.models[config['name']] = ModelConfig(
+                name=config['name'],
+                directory=directory,
+                entrypoint=os.path.join(directory, training['entrypoint']),
+                environment=training.get('environment') and os.path.join(directory, training['environment']),
+                description=config.get('description', ""))
+
+    return project
@@ -0,0 +1,256 @@
+"""
+Static column-projection inference for `build_feature` functions.
+
+Most features read two or three columns of their input datasets but convert the whole dataset to pandas.
+This module parses the feature source files listed in a featureset YAML and works out which columns each
+`Dataset("...")` parameter can be read through, so the local loader only fetches those columns.
+
+The analysis is conservative. The candidate columns of a dataset are every string constant and attribute name of the
+code that can handle the dataset: the whole feature module (module-level constants and the local functions
+`build_feature` calls) and every sibling module of the featureset it imports, transitively. Candidates are intersected
+with the dataset schema at load time. Whenever the code may use columns that are not named literally (`getattr` with a
+computed name, f-strings, `.columns`, `dropna()` without a subset, returning the raw dataframe, passing the dataset
+object or its dataframe to a function that is not defined in the analysed modules, ...) the dataset is read in full.
+"""
+import ast
+import builtins
+import os
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, Optional
+
+# Dataframe methods that depend on every column of the dataframe
+WHOLE_FRAME_METHODS = {'iterrows', 'itertuples', 'describe', 'info', 'select_dtypes', 'to_dict', 'to_records',
+                       'melt', 'stack', 'equals', 'duplicated'}
+# Dataframe methods that depend on every column unless their `subset` argument is given
+SUBSET_METHODS = {'dropna', 'drop_duplicates'}
+
+
+@dataclass
+class DatasetColumns:
+    """Columns of one dataset parameter of a feature. `columns` is None when the whole dataset must be read."""
+    dataset_name: str
+    columns: Optional[FrozenSet[str]]
+    helper_modules: FrozenSet[str] = frozenset()
+
+
+@dataclass
+class FeatureColumns:
+    source: str
+    parameters: Dict[str, DatasetColumns] = field(default_factory=dict)
+
+
+def _parse(path):
+    with open(path) as f:
+        return ast.parse(f.read(), filename=path)
+
+
+def annotation_entity(annotation):
+    """
+    The Layer entity of a `build_feature` parameter annotation: ('Dataset', name) for `Dataset("name")` or
+    `layer.Dataset("name")`, ('Featureset', name) for `Featureset("name")`, None for anything else.
+    """
+    if not isinstance(annotation, ast.Call) or not annotation.args:
+        return None
+    func = annotation.func
+    func_name = func.id if isinstance(func, ast.Name) else func.attr if isinstance(func, ast.Attribute) else None
+    first_arg = annotation.args[0]
+    if func_name in ('Dataset', 'Featureset') and isinstance(first_arg, ast.Constant) and isinstance(first_arg.value, str):
+        return func_name, first_arg.value
+    return None
+
+
+def build_feature_definition(tree):
+    return next((node for node in tree.body if isinstance(node, ast.FunctionDef) and node.name == 'build_feature'), None)
+
+
+def _dataset_name(annotation):
+    entity = annotation_entity(annotation)
+    return entity[1] if entity and entity[0] == 'Dataset' else None
+
+
+def _sibling_imports(tree, directory):
+    # Names imported with `from <module> import <name>` where <module>.py lives next to the feature source
+    imports = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom) and node.module and node.level == 0:
+            module_path = os.path.join(directory, node.module.replace('.', os.sep) + '.py')
+            if os.path.exists(module_path):
+                for alias in node.names:
+                    imports[alias.asname or alias.name] = module_path
+    return imports
+
+
+def _helper_closure(module_paths, directory):
+    # The given sibling modules and every sibling module they import, transitively
+    closure = set()
+    pending = list(module_paths)
+    while pending:
+        path = pending.pop()
+        if path in closure:
+            continue
+        closure.add(path)
+        pending.extend(set(_sibling_imports(_parse(path), directory).values()) - closure)
+    return closure
+
+
+def sibling_modules(source_path):
+    """Paths of the modules next to `source_path` that it imports, transitively."""
+    directory = os.path.dirname(os.path.abspath(source_path))
+    return _helper_closure(set(_sibling_imports(_parse(source_path), directory).values()), directory)
+
+
+def _uses_unknown_columns(nodes):
+    for root in nodes:
+        for node in ast.walk(root):
+            if isinstance(node, ast.JoinedStr):
+                return True
+            if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == 'getattr' \
+                    and not (len(node.args) > 1 and isinstance(node.args[1], ast.Constant)):
+                return True
+            if isinstance(node, ast.Attribute) and node.attr in ('columns', 'T'):
+                return True
+            if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
+                method = node.func.attr
+                if method in WHOLE_FRAME_METHODS:
+                    return True
+                if method in SUBSET_METHODS and not node.args and 'subset' not in {k.arg for k in node.keywords}:
+                    return True
+    return False
+
+
+def _candidate_columns(nodes):
+    candidates = set()
+    for root in nodes:
+        for node in ast.walk(root):
+            if isinstance(node, ast.Constant) and isinstance(node.value, str):
+                candidates.add(node.value)
+            elif isinstance(node, ast.Attribute):
+                candidates.add(node.attr)
+    return candidates
+
+
+def _dataframe_names(function, parameter):
+    # Variables assigned from `<parameter>.to_pandas()`
+    names = set()
+    for node in ast.walk(function):
+        if isinstance(node, ast.Assign) and _is_to_pandas_call(node.value, parameter):
+            names.update(target.id for target in node.targets if isinstance(target, ast.Name))
+    return names
+
+
+def _passes_frame_to_unknown_function(tree, frame_names, known_functions):
+    # Whether a dataframe of the dataset is passed to a plain function call that is not analysed (not a function of the
+    # feature module, a sibling import or a builtin), which may read any of its columns
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id not in known_functions:
+            arguments = node.args + [keyword.value for keyword in node.keywords]
+            if any(isinstance(argument, ast.Name) and argument.id in frame_names for argument in arguments):
+                return True
+    return False
+
+
+def _is_to_pandas_call(node, parameter):
+    return (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == 'to_pandas'
+            and isinstance(node.func.value, ast.Name) and node.func.value.id == parameter)
+
+
+def _parameter_uses(function, parameter, sibling_imports):
+    """
+    Classify every use of a dataset parameter: returns the sibling modules it is handed to,
+    or None if it is used in a way the analysis does not follow.
+    """
+    parents = {}
+    for node in ast.walk(function):
+        for child in ast.iter_child_nodes(node):
+            parents[child] = node
+
+    helper_modules = set()
+    for node in ast.walk(function):
+        if not (isinstance(node, ast.Name) and node.id == parameter and isinstance(node.ctx, ast.Load)):
+            continue
+        parent = parents.get(node)
+        if isinstance(parent, ast.Attribute) and parent.attr == 'to_pandas':
+            continue
+        if isinstance(parent, ast.Call) and node in parent.args and isinstance(parent.func, ast.Name) \
+                and parent.func.id in sibling_imports:
+            helper_modules.add(sibling_imports[parent.func.id])
+            continue
+        return None
+    return helper_modules
+
+
+def infer_feature_columns(source_path):
+    """Infer the columns read from each `Dataset` parameter of the `build_feature` function in `source_path`."""
+    directory = os.path.dirname(os.path.abspath(source_path))
+    tree = _parse(source_path)
+    function = build_feature_definition(tree)
+    result = FeatureColumns(source=source_path)
+    if function is None:
+        return result
+
+    sibling_imports = _sibling_imports(tree, directory)
+    returned_names = {node.value.id for node in ast.walk(function)
+                      if isinstance(node, ast.Return) and isinstance(node.value, ast.Name)}
+    # Code that can handle the dataframes: the whole feature module and the sibling modules it imports
+    scope = [tree] + [_parse(path) for path in sorted(_helper_closure(set(sibling_imports.values()), directory))]
+    known_functions = set(sibling_imports) | set(dir(builtins)) | {
+        node.name for node in ast.walk(tree) if isinstance(node, (ast.FunctionDef, ast.ClassDef))}
+
+    for argument in function.args.args:
+        dataset_name = _dataset_name(argument.annotation)
+        if dataset_name is None:
+            continue
+        helper_modules = _parameter_uses(function, argument.arg, sibling_imports)
+        frame_names = _dataframe_names(function, argument.arg)
+        if helper_modules is None or returned_names & frame_names \
+                or _passes_frame_to_unknown_function(tree, frame_names, known_functions):
+            result.parameters[argument.arg] = DatasetColumns(dataset_name, None)
+            continue
+
+        helper_modules = _helper_closure(helper_modules, directory)
+        columns = None if _uses_unknown_columns(scope) else frozenset(_candidate_columns(scope))
+        result.parameters[argument.arg] = DatasetColumns(dataset_name, columns, frozenset(helper_modules))
+
+    return result
+
+
+def infer_featureset_columns(featureset):
+    """
+    Infer the columns of every feature of a featureset (a `project.FeaturesetConfig`).
+
+    Datasets that are handed to sibling helper modules sharing a module (like `join_cache.py`, which the other helpers
+    import) share the union of their columns across the featureset: the helpers cache intermediate dataframes per
+    dataset, so all their callers must read the dataset through the same projection to share the cached result. The
+    `helper_modules` of a dataset parameter are then all the helper modules of its group.
+    """
+    features = {feature.name: infer_feature_columns(feature.source) for feature in featureset.features}
+
+    # Groups of (dataset name, helper modules, columns): helper modules of a dataset that overlap are merged into one group
+    groups = []
+    for feature_columns in features.values():
+        for dataset_columns in feature_columns.parameters.values():
+            if not dataset_columns.helper_modules:
+                continue
+            name, modules, columns = dataset_columns.dataset_name, set(dataset_columns.helper_modules), dataset_columns.columns
+            for group in [group for group in groups if group[0] == name and group[1] & modules]:
+                groups.remove(group)
+                modules |= group[1]
+                columns = None if columns is None or group[2] is None else columns | group[2]
+            groups.append((name, modules, columns))
+
+    for feature_columns in features.values():
+        for parameter, dataset_columns in feature_columns.parameters.items():
+            if dataset_columns.helper_modules:
+                _, modules, columns = next(group for group in groups if group[0] == dataset_columns.dataset_name
+                                           and dataset_columns.helper_modules <= group[1])
+                feature_columns.parameters[parameter] = DatasetColumns(dataset_columns.dataset_name, columns,
+                                                                       frozenset(modules))
+    return features
+
+
+def projected_dataset(dataset, columns):
+    """Project a `LocalDataset` on the inferred candidate columns that exist in its schema (in schema order)."""
+    if columns is None:
+        return dataset
+    projection = [name for name in dataset.schema.names if name in columns]
+    return dataset.with_options(columns=projection) if projection else dataset
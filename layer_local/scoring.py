@@ -0,0 +1,235 @@
+"""
+Local churn scoring server.
+
+`ChurnScorer` scores customers with a trained churn pipeline (the `Pipeline` returned by `churn_model.py`): it looks up
+the features of their first orders by FIRST_ORDER_ID in local featuresets (`OnlineFeatureset`s, `ColumnarFeatureset`s,
+or any featureset whose `to_pandas` takes `columns` and `keys`), joins them on ORDER_ID and predicts the churn
+probability. Pipelines that `compile_pipeline` supports are scored with their compiled predictor.
+
+`serve` runs an asyncio HTTP server around a scorer. Concurrent requests are coalesced into micro-batches by a
+`MicroBatcher`: a batch is scored as soon as it holds `max_batch_size` requests, or `max_wait` seconds after its first
+request, so one feature lookup and one prediction serve many requests:
+
+    GET /score?first_order_id=<ORDER_ID>  ->  {"FIRST_ORDER_ID": "...", "CHURN_PROBABILITY": 0.12}
+    GET /stats                            ->  requests, batches, mean batch size, p50/p99 latency (ms), throughput
+
+    python -m layer_local serve churn_model.joblib online --featureset order_features_tutorial6 \
+        --featureset order_features_tutorial6_new --max-batch-size 64 --max-wait-ms 2
+"""
+import asyncio
+import json
+import time
+from collections import deque
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from .compiled_predictor import compile_pipeline
+
+
+def _compiled(pipeline):
+    try:
+        return compile_pipeline(pipeline)
+    except ValueError:
+        return pipeline
+
+
+class ChurnScorer:
+    """
+    Churn probabilities of customers given the ORDER_IDs of their first orders.
+
+    `feature_models` maps derived feature columns of the pipeline to the models predicting them from the same feature
+    rows, like PREDICTED_ORDER_REVIEW_SCORE with the order review model in tutorial6_after.
+    """
+
+    def __init__(self, pipeline, featuresets, key='ORDER_ID', feature_models=None, compile=True):
+        self.featuresets = featuresets
+        self.key = key
+        self.columns = list(pipeline.feature_names_in_)
+        self.feature_models = {column: (_compiled(model) if compile else model, list(model.feature_names_in_))
+                               for column, model in (feature_models or {}).items()}
+        self.model = _compiled(pipeline) if compile else pipeline
+        # Columns to read from every featureset: the features of the pipeline and of the feature models
+        needed = set(self.columns).union(*(columns for _, columns in self.feature_models.values()))
+        self.featureset_columns = [[name for name in featureset.schema.names if name in needed and name != key]
+                                   for featureset in featuresets]
+
+    def features(self, first_order_ids):
+        """Feature rows of the given orders, in their order; orders without features (or with nulls) are dropped."""
+        keys = pd.Index(pd.unique(np.asarray(first_order_ids, dtype=object)))
+        features_df = pd.DataFrame({self.key: keys})
+        for featureset, columns in zip(self.featuresets, self.featureset_columns):
+            featureset_df = featureset.to_pandas(columns=columns, keys=keys)
+            features_df = features_df.merge(featureset_df, on=self.key, how='inner')
+        features_df = features_df.dropna()
+        for column, (model, columns) in self.feature_models.items():
+            features_df[column] = model.predict(features_df[columns])
+        return features_df
+
+    def score(self, first_order_ids):
+        """Churn probability of every first order that has features, as a dict."""
+        features_df = self.features(first_order_ids)
+        if features_df.empty:
+            return {}
+        probabilities = self.model.predict_proba(features_df[self.columns])[:, 1]
+        return dict(zip(features_df[self.key], probabilities.tolist()))
+
+
+class LatencyStats:
+    """Latencies of the last `window` requests and the throughput since the first request."""
+
+    def __init__(self, window=100000):
+        self.latencies = deque(maxlen=window)
+        self.requests = 0
+        self.batches = 0
+        self.started = None
+
+    def record_batch(self, latencies):
+        now = time.perf_counter()
+        if self.started is None:
+            self.started = now - max(latencies, default=0)
+        self.latencies.extend(latencies)
+        self.requests += len(latencies)
+        self.batches += 1
+
+    def report(self):
+        latencies_ms = np.asarray(self.latencies) * 1000
+        elapsed = time.perf_counter() - self.started if self.started is not None else 0
+        return {
+            'requests': self.requests,
+            'batches': self.batches,
+            'mean_batch_size': self.requests / self.batches if self.batches else 0,
+            'p50_latency_ms': float(np.percentile(latencies_ms, 50)) if len(latencies_ms) else None,
+            'p99_latency_ms': float(np.percentile(latencies_ms, 99)) if len(latencies_ms) else None,
+            'throughput_per_s': self.requests / elapsed if elapsed else 0,
+        }
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent `submit(key)` calls into calls of `score_batch(keys)` (returning a dict of results by key) of
+    at most `max_batch_size` keys, waiting at most `max_wait` seconds after the first key of a batch. Batches are scored
+    one at a time in a worker thread, while the next batch gathers requests.
+    """
+
+    def __init__(self, score_batch, max_batch_size=64, max_wait=0.002, stats=None):
+        self.score_batch = score_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.stats = stats if stats is not None else LatencyStats()
+        self._queue = None
+        self._worker = None
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+
+    async def submit(self, key):
+        """Result of `key` in its batch (KeyError when the batch has no result for it)."""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((key, time.perf_counter(), future))
+        return await future
+
+    async def _next_batch(self):
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            keys = [key for key, _, _ in batch]
+            try:
+                results = await loop.run_in_executor(None, self.score_batch, keys)
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            now = time.perf_counter()
+            for key, _, future in batch:
+                if future.done():
+                    continue
+                if key in results:
+                    future.set_result(results[key])
+                else:
+                    future.set_exception(KeyError(key))
+            self.stats.record_batch([now - submitted for _, submitted, _ in batch])
+
+
+async def _respond(writer, status, body):
+    payload = json.dumps(body).encode()
+    writer.write('HTTP/1.1 {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\n\r\n'.format(
+        status, len(payload)).encode() + payload)
+    await writer.drain()
+
+
+async def _handle(batcher, reader, writer):
+    # Minimal HTTP/1.1: GET requests on a keep-alive connection, until the client closes it
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            parts = request_line.decode('latin-1').split()
+            url = urlsplit(parts[1] if len(parts) > 1 else '/')
+            if url.path == '/stats':
+                await _respond(writer, '200 OK', batcher.stats.report())
+            elif url.path == '/score':
+                first_order_id = parse_qs(url.query).get('first_order_id', [None])[0]
+                if first_order_id is None:
+                    await _respond(writer, '400 Bad Request', {'error': "Missing first_order_id"})
+                    continue
+                try:
+                    probability = await batcher.submit(first_order_id)
+                except KeyError:
+                    await _respond(writer, '404 Not Found', {'error': "No features for this order"})
+                    continue
+                await _respond(writer, '200 OK', {'FIRST_ORDER_ID': first_order_id, 'CHURN_PROBABILITY': probability})
+            else:
+                await _respond(writer, '404 Not Found', {'error': "Unknown path"})
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def serve_forever(scorer, host='127.0.0.1', port=8080, max_batch_size=64, max_wait=0.002, stats=None):
+    """Run the scoring server of `scorer` until it is cancelled, recording the served requests in `stats`."""
+    batcher = MicroBatcher(scorer.score, max_batch_size=max_batch_size, max_wait=max_wait, stats=stats)
+    batcher.start()
+    server = await asyncio.start_server(lambda reader, writer: _handle(batcher, reader, writer), host, port)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await batcher.stop()
+
+
+def serve(scorer, host='127.0.0.1', port=8080, max_batch_size=64, max_wait=0.002):
+    """Run the scoring server until interrupted, then print the latency and throughput report."""
+    stats = LatencyStats()
+    try:
+        asyncio.run(serve_forever(scorer, host, port, max_batch_size, max_wait, stats))
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(stats.report(), indent=2))
@@ -0,0 +1,47 @@
+"""
+Versioned store directories, shared by the online store and the columnar featuresets.
+
+Every write of a store `<directory>/<name>` creates a new version directory `<directory>/<name>/<version>`, then
+switches the `CURRENT` file to it with an atomic rename. Readers read `CURRENT` once and keep using the version they
+opened, so they see either the previous version or the new one, never a partially written or missing store.
+"""
+import os
+import shutil
+import time
+import uuid
+
+CURRENT_FILE = 'CURRENT'
+# Versions kept besides the current one, for readers that did not refresh yet
+PREVIOUS_VERSIONS = 1
+
+
+def new_version_directory(path):
+    """Create a temporary directory for a new version of the store `path`. Returns the version and the directory."""
+    version = '{}-{}'.format(time.strftime('%Y%m%dT%H%M%S'), uuid.uuid4().hex[:8])
+    tmp_path = os.path.join(path, '.tmp-' + version)
+    os.makedirs(tmp_path)
+    return version, tmp_path
+
+
+def _remove_old_versions(path, current):
+    versions = sorted((entry for entry in os.listdir(path) if entry not in (CURRENT_FILE, current)
+                       and not entry.startswith('.')), key=lambda entry: os.path.getmtime(os.path.join(path, entry)))
+    for entry in versions[:max(0, len(versions) - PREVIOUS_VERSIONS)]:
+        shutil.rmtree(os.path.join(path, entry), ignore_errors=True)
+
+
+def publish_version(path, version, tmp_path):
+    """Move the written directory `tmp_path` to its version directory and make it the current version of `path`."""
+    os.replace(tmp_path, os.path.join(path, version))
+    # Switch the readers to the new version
+    current_tmp = os.path.join(path, '.{}.tmp-{}'.format(CURRENT_FILE, version))
+    with open(current_tmp, 'w') as f:
+        f.write(version)
+    os.replace(current_tmp, os.path.join(path, CURRENT_FILE))
+    _remove_old_versions(path, version)
+
+
+def current_version(path):
+    """The current version of the store `path`."""
+    with open(os.path.join(path, CURRENT_FILE)) as f:
+        return f.read().strip()
@@ -0,0 +1,54 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+from layer_local import LocalDatasetProvider, load_project
+from olist import ORDER_FEATURESETS, TUTORIAL6_DIR, olist_tables, reference_order_featuresets, write_olist_tables
+
+
+@pytest.fixture(scope='session')
+def project():
+    return load_project(TUTORIAL6_DIR)
+
+
+@pytest.fixture(scope='session')
+def tables():
+    return olist_tables()
+
+
+@pytest.fixture
+def data_dir(tmp_path, tables):
+    data_dir = str(tmp_path / 'data')
+    write_olist_tables(tables, data_dir)
+    return data_dir
+
+
+@pytest.fixture
+def datasets(project, data_dir):
+    return LocalDatasetProvider(project, data_dir)
+
+
+@pytest.fixture
+def reference(project, datasets):
+    """The order featuresets built in this process from the whole datasets."""
+    return reference_order_featuresets(project, datasets)
+
+
+@pytest.fixture
+def import_order_helper(project):
+    """`importlib.import_module` for the helper modules of the order featureset."""
+    directory = project.featuresets[ORDER_FEATURESETS[0]].directory
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+    return importlib.import_module
+
+
+@pytest.fixture
+def import_churn_model_helper():
+    """`importlib.import_module` for the helper modules of the churn model."""
+    directory = os.path.join(TUTORIAL6_DIR, 'models', 'churn_model')
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+    return importlib.import_module
@@ -0,0 +1,174 @@
+"""
+Small synthetic copies of the Olist tables of the tutorial6 project, and exact references to compare local builds to.
+"""
+import os
+import sys
+import uuid
+
+import numpy as np
+import pandas as pd
+import pandas.testing
+
+from layer_local import write_table
+from layer_local.chunked import clear_helper_caches
+from layer_local.executor import load_feature_module, read_feature_inputs
+
+TUTORIAL6_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tutorial6')
+# Featureset names of the Featureset("...") annotations that are published under another name
+FEATURESET_ALIASES = {'order_features_tutorial6cd': 'order_features_tutorial6'}
+ORDER_FEATURESETS = ['order_features_tutorial6', 'order_features_tutorial6_new']
+CUSTOMER_FEATURESET = 'customer_features_tutorial6'
+
+CATEGORIES = ['cama_mesa_banho', 'esporte_lazer', 'beleza_saude', 'informatica', 'moveis', 'utilidades', 'relogios',
+              'telefonia', 'automotivo', 'brinquedos', 'pet', 'livros', None]
+CATEGORIES_ENGLISH = ['bed_bath_table', 'sports_leisure', 'health_beauty', 'computers_accessories', 'furniture_decor',
+                      'housewares', 'watches_gifts', 'telephony', 'auto', 'toys', 'pet_shop']
+
+
+def _ids(rng, n):
+    return np.array([uuid.UUID(int=int(x)).hex for x in rng.integers(0, 2 ** 63, n)], dtype=object)
+
+
+def _seconds(rng, high, n):
+    return pd.to_timedelta(rng.integers(0, high, n), unit='s')
+
+
+def olist_tables(seed=0, n_orders=600, n_customers=400, n_products=120):
+    """Olist tables by table name, with repeat customers, multi-item orders, untranslated and missing categories."""
+    rng = np.random.default_rng(seed)
+    customer_ids = _ids(rng, n_customers)
+    unique_ids = _ids(rng, n_customers * 4 // 5)
+    customers = pd.DataFrame({
+        'CUSTOMER_ID': customer_ids,
+        'CUSTOMER_UNIQUE_ID': unique_ids[rng.integers(0, len(unique_ids), n_customers)],
+        'CUSTOMER_CITY': rng.choice(np.array(['sao paulo', 'rio de janeiro', 'curitiba', 'campinas', None], dtype=object),
+                                    n_customers),
+        'CUSTOMER_STATE': rng.choice(['SP', 'RJ', 'PR', 'MG'], n_customers),
+    })
+
+    order_ids = _ids(rng, n_orders)
+    purchased = pd.Timestamp('2017-01-01') + _seconds(rng, 600 * 86400, n_orders)
+    # Orders purchased at the same time
+    purchased = purchased.where(rng.random(n_orders) > 0.02, purchased[0])
+    orders = pd.DataFrame({
+        'ORDER_ID': order_ids,
+        'CUSTOMER_ID': customer_ids[rng.integers(0, n_customers, n_orders)],
+        'ORDER_STATUS': rng.choice(['delivered'] * 8 + ['canceled', 'shipped'], n_orders),
+        'ORDER_PURCHASE_TIMESTAMP': purchased,
+    })
+    orders['ORDER_APPROVED_AT'] = orders['ORDER_PURCHASE_TIMESTAMP'] + _seconds(rng, 3 * 86400, n_orders)
+    orders['ORDER_DELIVERED_CARRIER_DATE'] = orders['ORDER_APPROVED_AT'] + _seconds(rng, 5 * 86400, n_orders)
+    orders['ORDER_DELIVERED_CUSTOMER_DATE'] = orders['ORDER_DELIVERED_CARRIER_DATE'] + _seconds(rng, 15 * 86400, n_orders)
+    orders['ORDER_ESTIMATED_DELIVERY_DATE'] = orders['ORDER_PURCHASE_TIMESTAMP'] + pd.to_timedelta(
+        rng.integers(5, 30, n_orders), unit='D')
+
+    product_ids = _ids(rng, n_products)
+    products = pd.DataFrame({
+        'PRODUCT_ID': product_ids,
+        'PRODUCT_CATEGORY_NAME': rng.choice(np.array(CATEGORIES, dtype=object), n_products),
+        'PRODUCT_NAME_LENGHT': rng.integers(5, 60, n_products).astype(float),
+        'PRODUCT_DESCRIPTION_LENGHT': rng.integers(50, 3000, n_products).astype(float),
+        'PRODUCT_PHOTOS_QTY': rng.integers(1, 8, n_products).astype(float),
+    })
+    # The last two categories have no translation
+    translations = pd.DataFrame({'PRODUCT_CATEGORY_NAME': CATEGORIES[:len(CATEGORIES_ENGLISH)],
+                                 'PRODUCT_CATEGORY_NAME_ENGLISH': CATEGORIES_ENGLISH})
+
+    n_items = n_orders * 13 // 10
+    items = pd.DataFrame({
+        'ORDER_ID': order_ids[np.sort(rng.integers(0, n_orders, n_items))],
+        'ORDER_ITEM_ID': 1,
+        'PRODUCT_ID': product_ids[rng.integers(0, n_products, n_items)],
+        'SELLER_ID': _ids(rng, 20)[rng.integers(0, 20, n_items)],
+        'PRICE': np.round(rng.uniform(5, 500, n_items), 2),
+        'FREIGHT_VALUE': np.round(rng.uniform(0, 50, n_items), 2),
+    })
+    items['ORDER_ITEM_ID'] = items.groupby('ORDER_ID').cumcount() + 1
+
+    n_payments = n_orders * 11 // 10
+    payments = pd.DataFrame({
+        'ORDER_ID': order_ids[rng.integers(0, n_orders, n_payments)],
+        'PAYMENT_SEQUENTIAL': 1,
+        'PAYMENT_TYPE': rng.choice(['credit_card', 'boleto', 'voucher', 'debit_card'], n_payments),
+        'PAYMENT_INSTALLMENTS': rng.integers(1, 10, n_payments),
+        'PAYMENT_VALUE': np.round(rng.uniform(5, 500, n_payments), 2),
+    })
+
+    reviews = pd.DataFrame({
+        'REVIEW_ID': _ids(rng, n_orders),
+        'ORDER_ID': order_ids,
+        'REVIEW_SCORE': rng.integers(1, 6, n_orders),
+        'REVIEW_ANSWER_TIMESTAMP': orders['ORDER_DELIVERED_CUSTOMER_DATE'],
+    })
+    return {
+        'olist_orders': orders,
+        'olist_customers': customers,
+        'olist_items': items,
+        'olist_products': products,
+        'olist_category_name_translation': translations,
+        'olist_payments': payments,
+        'olist_reviews': reviews,
+    }
+
+
+def write_olist_tables(tables, data_dir):
+    """Write the tables to `data_dir`, as Parquet files and one Arrow IPC file (payments), like a local data copy."""
+    os.makedirs(data_dir, exist_ok=True)
+    for table_name, df in tables.items():
+        extension = '.arrow' if table_name == 'olist_payments' else '.parquet'
+        write_table(df, os.path.join(data_dir, table_name + extension))
+
+
+class FrameFeatureset:
+    """A built featureset held as a dataframe, with the `to_pandas` of `layer.Featureset`."""
+
+    def __init__(self, name, df):
+        self.name = name
+        self.df = df
+
+    def to_pandas(self):
+        return self.df.copy()
+
+
+def reference_featureset(project, datasets, name, featuresets=None):
+    """
+    Featureset `name` computed in this process, feature after feature, from the whole datasets: the reference for the
+    local builds. `featuresets` holds the `FrameFeatureset`s of the featuresets it reads.
+    """
+    config = project.featuresets[name]
+    if config.directory not in sys.path:
+        sys.path.insert(0, config.directory)
+    # Intermediates cached (or installed, like an incrementally maintained summary) by earlier builds are not reused
+    clear_helper_caches()
+    df = None
+    for feature in config.features:
+        arguments = {}
+        for feature_input in read_feature_inputs(feature):
+            if feature_input.entity_type == 'Dataset':
+                arguments[feature_input.parameter] = datasets(feature_input.name)
+            else:
+                arguments[feature_input.parameter] = featuresets[FEATURESET_ALIASES.get(feature_input.name,
+                                                                                        feature_input.name)]
+        feature_df = load_feature_module(feature.source).build_feature(**arguments)
+        df = feature_df if df is None else df.merge(feature_df, on=df.columns[0], how='outer')
+    clear_helper_caches()
+    return FrameFeatureset(name, df)
+
+
+def reference_order_featuresets(project, datasets):
+    featuresets = {}
+    for name in ORDER_FEATURESETS:
+        featuresets[name] = reference_featureset(project, datasets, name, featuresets)
+    return featuresets
+
+
+def assert_same_rows(df, expected):
+    """The dataframes hold the same rows and columns, in any row order (categoricals are compared as values)."""
+    assert list(df.columns) == list(expected.columns)
+    key = expected.columns[0]
+    normalized = []
+    for frame in (df, expected):
+        frame = frame.astype({column: object for column in frame.columns
+                              if isinstance(frame[column].dtype, pd.CategoricalDtype)})
+        normalized.append(frame.sort_values(key).reset_index(drop=True))
+    pandas.testing.assert_frame_equal(normalized[0], normalized[1], check_dtype=False, check_exact=True)
@@ -0,0 +1,39 @@
+import sys
+
+import pytest
+
+import layer_local.chunked
+from layer_local import build_chunked
+from olist import FEATURESET_ALIASES, ORDER_FEATURESETS, assert_same_rows
+
+
+def join_cache_sizes(monkeypatch, project, datasets, output_dir, num_partitions):
+    """Entries and bytes held by the items/products join cache at the end of every partition of a chunked build."""
+    sizes = []
+    clear_helper_caches = layer_local.chunked.clear_helper_caches
+
+    def record_and_clear():
+        join_cache = sys.modules['join_cache'].join_cache
+        sizes.append((len(join_cache), join_cache.size_bytes))
+        clear_helper_caches()
+
+    monkeypatch.setattr(layer_local.chunked, 'clear_helper_caches', record_and_clear)
+    build_chunked(project, datasets, output_dir, ORDER_FEATURESETS[:1], num_partitions=num_partitions)
+    return sizes
+
+
+@pytest.mark.parametrize('num_partitions', [1, 7])
+def test_chunked_build_equals_reference(project, datasets, reference, tmp_path, num_partitions):
+    result = build_chunked(project, datasets, str(tmp_path / 'chunked'), ORDER_FEATURESETS,
+                           num_partitions=num_partitions, featureset_aliases=FEATURESET_ALIASES)
+    for name in ORDER_FEATURESETS:
+        assert_same_rows(result.featuresets[name].to_pandas(), reference[name].to_pandas())
+
+
+def test_join_cache_stays_flat_across_partitions(monkeypatch, project, datasets, tmp_path):
+    (_, full_bytes), = join_cache_sizes(monkeypatch, project, datasets, str(tmp_path / 'full'), 1)
+    sizes = join_cache_sizes(monkeypatch, project, datasets, str(tmp_path / 'chunked'), 8)
+    assert len(sizes) == 8
+    # One join of the current partition, never the joins of the earlier partitions
+    assert {entries for entries, _ in sizes} == {sizes[0][0]}
+    assert max(size_bytes for _, size_bytes in sizes) < full_bytes / 2
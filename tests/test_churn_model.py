@@ -0,0 +1,67 @@
+import importlib
+import os
+import sys
+
+import numpy as np
+import pytest
+
+from olist import (CUSTOMER_FEATURESET, ORDER_FEATURESETS, TUTORIAL6_DIR, reference_featureset,
+                   reference_order_featuresets)
+
+
+class RecordingTrain:
+    """The parameters and metrics logged by a `train_model` function, in place of `layer.Train`."""
+
+    def __init__(self):
+        self.parameters = {}
+        self.metrics = {}
+
+    def log_parameters(self, parameters):
+        self.parameters.update(parameters)
+
+    def log_metric(self, name, value):
+        self.metrics[name] = value
+
+    def register_input(self, df):
+        pass
+
+    def register_output(self, df):
+        pass
+
+
+def import_model(name):
+    directory = os.path.join(TUTORIAL6_DIR, 'models', name)
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+    return importlib.import_module(name)
+
+
+@pytest.fixture
+def featuresets(project, datasets):
+    featuresets = reference_order_featuresets(project, datasets)
+    featuresets[CUSTOMER_FEATURESET] = reference_featureset(project, datasets, CUSTOMER_FEATURESET)
+    return featuresets
+
+
+@pytest.mark.parametrize('engine', ['gradient_boosting', 'hist_gradient_boosting'])
+def test_churn_model_trains_with_every_engine(featuresets, engine, monkeypatch):
+    churn_model = import_model('churn_model')
+    monkeypatch.setattr(churn_model, 'ENGINE', engine)
+    train = RecordingTrain()
+    pipeline = churn_model.train_model(train, *[featuresets[name] for name in ORDER_FEATURESETS],
+                                       featuresets[CUSTOMER_FEATURESET])
+    assert 0 <= train.metrics['ROC AUC Score'] <= 1
+    if engine == 'hist_gradient_boosting':
+        # The encoded categorical variables are split natively
+        assert pipeline.named_steps['m'].is_categorical_[:4].all()
+
+
+@pytest.mark.parametrize('engine', ['gradient_boosting', 'hist_gradient_boosting'])
+def test_order_review_model_trains_with_every_engine(featuresets, engine, monkeypatch):
+    order_review_model = import_model('order_review_model')
+    monkeypatch.setattr(order_review_model, 'ENGINE', engine)
+    train = RecordingTrain()
+    pipeline = order_review_model.train_model(train, *[featuresets[name] for name in ORDER_FEATURESETS])
+    assert np.isfinite(train.metrics['R2 Score'])
+    if engine == 'hist_gradient_boosting':
+        assert pipeline.named_steps['m'].is_categorical_[:3].all()
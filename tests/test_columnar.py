@@ -0,0 +1,71 @@
+import os
+
+import numpy as np
+import pyarrow.parquet as pq
+import pytest
+
+from layer_local import ColumnarFeatureset, LocalFeatureset, write_columnar_featureset, write_table
+from olist import FrameFeatureset, assert_same_rows
+
+
+@pytest.fixture
+def order_features(reference):
+    return reference['order_features_tutorial6']
+
+
+@pytest.fixture
+def local_featureset(order_features, tmp_path):
+    # Two features that miss some of the orders of each other
+    df = order_features.to_pandas()
+    feature_paths = []
+    for i, (rows, columns) in enumerate([(df.index[50:], ['TOTAL_PRODUCT_PRICE', 'MAIN_PRODUCT_CATEGORY']),
+                                         (df.index[:-50], ['ORDER_STATUS'])]):
+        feature_paths.append(str(tmp_path / 'feature-{}.arrow'.format(i)))
+        write_table(df.loc[rows, ['ORDER_ID'] + columns].sample(frac=1, random_state=i), feature_paths[-1])
+    return LocalFeatureset(order_features.name, feature_paths)
+
+
+def test_featureset_is_written_sorted_by_key(local_featureset, tmp_path):
+    featureset = write_columnar_featureset(local_featureset, str(tmp_path / 'columnar'), row_group_size=100,
+                                           rows_per_file=300)
+    expected = local_featureset.to_pandas()
+    df = featureset.to_pandas()
+    assert len(featureset.files) == -(-len(expected) // 300)
+    assert df['ORDER_ID'].is_monotonic_increasing
+    assert_same_rows(df, expected)
+
+
+def test_key_set_reads_only_load_the_row_groups_of_the_keys(order_features, tmp_path):
+    featureset = write_columnar_featureset(order_features, str(tmp_path), row_group_size=50)
+    df = order_features.to_pandas().set_index('ORDER_ID')
+    keys = list(np.random.default_rng(0).permutation(df.index.to_numpy())[:3]) + ['unknown']
+    parquet_file = pq.ParquetFile(featureset.files[0])
+    row_groups = featureset._row_groups(parquet_file, np.sort(np.asarray(keys, dtype=object)))
+    assert len(row_groups) <= 4 < parquet_file.num_row_groups
+
+    columns = ['MAIN_PRODUCT_CATEGORY', 'TOTAL_PRODUCT_PRICE']
+    result = featureset.to_pandas(columns=columns, keys=keys)
+    assert result['ORDER_ID'].tolist() == sorted(keys[:3])
+    assert_same_rows(result, df.loc[keys[:3], columns].reset_index())
+    assert featureset.to_pandas(columns=columns, keys=['unknown']).columns.tolist() == ['ORDER_ID'] + columns
+
+
+def test_readers_keep_their_version(order_features, tmp_path):
+    featureset = write_columnar_featureset(order_features, str(tmp_path))
+    df = order_features.to_pandas()
+    updated = df.assign(TOTAL_PRODUCT_PRICE=df['TOTAL_PRODUCT_PRICE'] + 1)
+    write_columnar_featureset(FrameFeatureset(order_features.name, updated), str(tmp_path))
+    # The previous version is kept for the readers that opened it
+    assert_same_rows(featureset.to_pandas(), df)
+    reader = ColumnarFeatureset(order_features.name, str(tmp_path))
+    assert reader.version != featureset.version
+    assert_same_rows(reader.to_pandas(), updated)
+
+    write_columnar_featureset(order_features, str(tmp_path))
+    assert featureset.version not in os.listdir(str(tmp_path / order_features.name))
+
+
+def test_duplicate_keys_are_rejected(order_features, tmp_path):
+    df = order_features.to_pandas()
+    with pytest.raises(ValueError, match='not unique'):
+        write_columnar_featureset(FrameFeatureset(order_features.name, df.iloc[[0, 0, 1]]), str(tmp_path))
@@ -0,0 +1,84 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from layer_local import (FeaturesetExecutor, IdDictionary, LocalDatasetProvider, build_chunked, gather_rows,
+                         write_table)
+from layer_local.compact import MONEY_COLUMNS
+from olist import FEATURESET_ALIASES, ORDER_FEATURESETS, assert_same_rows
+
+
+@pytest.fixture
+def compact_datasets(project, data_dir):
+    return LocalDatasetProvider(project, data_dir, compact=True)
+
+
+def test_compact_datasets_hold_the_same_values(project, datasets, compact_datasets):
+    for name in project.datasets:
+        df, compact_df = datasets(name).to_pandas(), compact_datasets(name).to_pandas()
+        for column in compact_df.columns:
+            if column in compact_datasets.id_dictionary.key_columns:
+                assert isinstance(compact_df[column].dtype, pd.CategoricalDtype)
+                compact_df[column] = compact_df[column].astype(object)
+            elif column in MONEY_COLUMNS:
+                # Money values are recovered exactly by rounding to 2 decimals
+                assert compact_df[column].dtype == np.float32
+                compact_df[column] = np.round(compact_df[column].astype(np.float64), 2)
+        pd.testing.assert_frame_equal(compact_df, df, check_exact=True)
+
+
+def test_compact_build_equals_normal_build(project, compact_datasets, reference):
+    with FeaturesetExecutor(project, compact_datasets, max_workers=2, featureset_aliases=FEATURESET_ALIASES) as executor:
+        result = executor.run(ORDER_FEATURESETS)
+        for name in ORDER_FEATURESETS:
+            assert_same_rows(result.featuresets[name].to_pandas(), reference[name].to_pandas())
+
+
+def test_compact_chunked_build_equals_normal_build(project, compact_datasets, reference, tmp_path):
+    result = build_chunked(project, compact_datasets, str(tmp_path / 'chunked'), ORDER_FEATURESETS, num_partitions=4,
+                           featureset_aliases=FEATURESET_ALIASES)
+    for name in ORDER_FEATURESETS:
+        assert_same_rows(result.featuresets[name].to_pandas(), reference[name].to_pandas())
+
+
+def test_surrogates_never_change(project, data_dir, tables, tmp_path):
+    id_dictionary = IdDictionary(str(tmp_path / 'ids'))
+    datasets = LocalDatasetProvider(project, data_dir, id_dictionary_dir=id_dictionary.directory)
+    orders = tables['olist_orders']
+    write_table(orders.iloc[:300], os.path.join(data_dir, 'olist_orders.parquet'))
+    assert 'ORDER_ID' in id_dictionary.update([datasets('orders_dataset')])
+    known = pa.array(orders['ORDER_ID'].iloc[:300])
+    surrogates = id_dictionary.surrogates('ORDER_ID', known)
+    assert sorted(surrogates) == list(range(300))
+
+    # Appended orders get new surrogates, the known ones keep theirs
+    write_table(orders, os.path.join(data_dir, 'olist_orders.parquet'))
+    assert 'ORDER_ID' in IdDictionary(id_dictionary.directory).update([datasets('orders_dataset')])
+    id_dictionary = IdDictionary(id_dictionary.directory)
+    np.testing.assert_array_equal(id_dictionary.surrogates('ORDER_ID', known), surrogates)
+    assert sorted(id_dictionary.surrogates('ORDER_ID', pa.array(orders['ORDER_ID'].iloc[300:]))) == list(range(300, 600))
+    # An unchanged table is not scanned again
+    assert id_dictionary.update([datasets('orders_dataset')]) == []
+
+    # Chunked arrays, nulls and unknown values
+    values = pa.chunked_array([orders['ORDER_ID'].iloc[:2].tolist(), [None, 'unknown']])
+    np.testing.assert_array_equal(id_dictionary.surrogates('ORDER_ID', values), list(surrogates[:2]) + [-1, -1])
+    categorical = id_dictionary.to_categorical('ORDER_ID', values)
+    assert list(categorical[:2]) == orders['ORDER_ID'].iloc[:2].tolist() and categorical[2:].isna().all()
+
+
+def test_gather_rows_equals_a_left_merge(project, data_dir, tables, tmp_path):
+    datasets = LocalDatasetProvider(project, data_dir, id_dictionary_dir=str(tmp_path / 'ids'))
+    id_dictionary = datasets.update_id_dictionary()
+    items, products = tables['olist_items'], tables['olist_products']
+    # Products that are not in the products table
+    left = pa.array(items['PRODUCT_ID'].tolist() + ['unknown', None])
+    right = pa.array(products['PRODUCT_ID'].iloc[10:])
+    positions = gather_rows(id_dictionary.surrogates('PRODUCT_ID', left), id_dictionary.surrogates('PRODUCT_ID', right),
+                            len(id_dictionary.values('PRODUCT_ID')))
+    expected = pd.DataFrame({'PRODUCT_ID': left.to_pylist()}).merge(
+        pd.DataFrame({'PRODUCT_ID': right.to_pylist(), 'POSITION': np.arange(len(right))}), on='PRODUCT_ID', how='left')
+    np.testing.assert_array_equal(positions, expected['POSITION'].fillna(-1).astype(np.int64))
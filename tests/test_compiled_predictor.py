@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import GradientBoostingClassifier, GradientBoostingRegressor, HistGradientBoostingClassifier
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder
+
+from layer_local.compiled_predictor import compile_pipeline
+
+CATEGORICAL_COLUMNS = ['ORDER_STATUS', 'MAIN_PAYMENT_TYPE']
+
+
+def features(seed, n):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'ORDER_STATUS': rng.choice(['delivered', 'shipped', 'canceled'], n),
+        'TOTAL_PRODUCT_PRICE': np.round(rng.uniform(5, 500, n), 2),
+        'MAIN_PAYMENT_TYPE': rng.choice(['credit_card', 'boleto', 'voucher'], n),
+        'TOTAL_ITEMS': rng.integers(1, 5, n),
+        # float32 values equal to tree thresholds exercise the float32 comparisons
+        'DAYS_BETWEEN_ESTIMATE_ACTUAL_DELIVERY': rng.integers(-10, 20, n).astype(np.float32) / 3,
+    })
+
+
+def pipeline(model):
+    transformer = ColumnTransformer(transformers=[('cat', OneHotEncoder(handle_unknown='ignore'), CATEGORICAL_COLUMNS)],
+                                    remainder='passthrough')
+    return Pipeline(steps=[('t', transformer), ('m', model)])
+
+
+@pytest.fixture
+def X_train():
+    return features(0, 2000)
+
+
+@pytest.fixture
+def X_test():
+    X = features(1, 500)
+    # Categories the encoder did not see
+    X.loc[:10, 'ORDER_STATUS'] = 'unavailable'
+    return X
+
+
+def target(X):
+    return (X['TOTAL_PRODUCT_PRICE'] / 100 + (X['ORDER_STATUS'] == 'delivered') * 2 - X['TOTAL_ITEMS']).to_numpy()
+
+
+def test_regressor_predictions_are_identical(X_train, X_test):
+    model = pipeline(GradientBoostingRegressor(n_estimators=30, max_depth=4, random_state=0)).fit(X_train, target(X_train))
+    compiled = compile_pipeline(model)
+    np.testing.assert_array_equal(compiled.predict(X_test), model.predict(X_test))
+    np.testing.assert_array_equal(compiled.predict(X_test.iloc[:1]), model.predict(X_test.iloc[:1]))
+
+
+@pytest.mark.parametrize('n_classes', [2, 3])
+def test_classifier_probabilities_are_identical(X_train, X_test, n_classes):
+    y_train = np.digitize(target(X_train), np.quantile(target(X_train), np.linspace(0, 1, n_classes + 1)[1:-1]))
+    model = pipeline(GradientBoostingClassifier(n_estimators=30, max_depth=3, random_state=0)).fit(X_train, y_train)
+    compiled = compile_pipeline(model)
+    np.testing.assert_array_equal(compiled.predict_proba(X_test), model.predict_proba(X_test))
+    np.testing.assert_array_equal(compiled.predict(X_test), model.predict(X_test))
+
+
+def test_other_pipelines_are_rejected(X_train):
+    model = pipeline(HistGradientBoostingClassifier(max_iter=5))
+    model.fit(X_train, target(X_train) > 0)
+    with pytest.raises(ValueError):
+        compile_pipeline(model)
@@ -0,0 +1,83 @@
+import importlib
+import os
+import sys
+
+import pandas as pd
+import pandas.testing
+import pytest
+
+from layer_local import materialized_featureset, read_table, update_customer_features
+from olist import CUSTOMER_FEATURESET, ORDER_FEATURESETS, assert_same_rows, reference_featureset, write_olist_tables
+
+
+@pytest.fixture
+def delivered_orders(project):
+    directory = project.featuresets[CUSTOMER_FEATURESET].directory
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+    return importlib.import_module('delivered_orders')
+
+
+def test_featuresets_build_the_same_dataset_keys(project):
+    # Every featureset holds its own copy of dataset_keys.py, below its header comment
+    sources = []
+    for name in (ORDER_FEATURESETS[0], CUSTOMER_FEATURESET):
+        path = os.path.join(project.featuresets[name].directory, 'dataset_keys.py')
+        assert not os.path.islink(path)
+        with open(path) as f:
+            sources.append(f.read().split('\n\n\n', 1)[1])
+    assert sources[0] == sources[1]
+
+
+def test_merged_summaries_equal_the_summary_of_all_orders(delivered_orders, tables):
+    orders, customers = tables['olist_orders'], tables['olist_customers']
+    # Split in dataset order, like appended orders; some orders of both parts have the same purchase time
+    earlier, later = orders.iloc[:len(orders) // 2], orders.iloc[len(orders) // 2:]
+    assert earlier['ORDER_PURCHASE_TIMESTAMP'].isin(later['ORDER_PURCHASE_TIMESTAMP']).any()
+    merged = delivered_orders.merge_delivered_orders_summaries(
+        delivered_orders.summarize_delivered_orders(earlier, customers),
+        delivered_orders.summarize_delivered_orders(later, customers))
+    pandas.testing.assert_frame_equal(merged, delivered_orders.summarize_delivered_orders(orders, customers))
+
+
+def test_customers_listed_twice_are_counted_once(delivered_orders, tables):
+    orders, customers = tables['olist_orders'], tables['olist_customers']
+    duplicated = pd.concat([customers, customers.iloc[::3]], ignore_index=True)
+    pandas.testing.assert_frame_equal(delivered_orders.summarize_delivered_orders(orders, duplicated),
+                                      delivered_orders.summarize_delivered_orders(orders, customers))
+
+
+def test_customer_state_updates_equal_full_rebuild(project, datasets, data_dir, tables, tmp_path, delivered_orders):
+    materialized_dir = str(tmp_path / 'materialized')
+    orders = tables['olist_orders']
+    cutoff = orders['ORDER_PURCHASE_TIMESTAMP'].quantile(0.8)
+    earlier = orders[orders['ORDER_PURCHASE_TIMESTAMP'] <= cutoff].copy()
+    # Orders that are delivered after the first update
+    delivered_later = earlier['ORDER_ID'][earlier['ORDER_STATUS'] == 'delivered'].iloc[::7].tolist()
+    earlier.loc[earlier['ORDER_ID'].isin(delivered_later), 'ORDER_STATUS'] = 'shipped'
+    write_olist_tables({'olist_orders': earlier}, data_dir)
+    assert update_customer_features(project, datasets, CUSTOMER_FEATURESET, materialized_dir) == \
+        (earlier['ORDER_STATUS'] == 'delivered').sum()
+
+    state_dir = os.path.join(materialized_dir, CUSTOMER_FEATURESET, 'state')
+    # The state holds the orders that are not delivered, not the counted ones
+    pending = set(read_table(os.path.join(state_dir, 'pending_orders.arrow'))['ORDER_ID'].to_pylist())
+    assert pending == set(earlier['ORDER_ID'][earlier['ORDER_STATUS'] != 'delivered'])
+
+    # The pending orders that are delivered since are counted with the new orders, including a new order purchased at
+    # the same time as the latest order of the previous update
+    orders = orders.copy()
+    later = ~orders['ORDER_ID'].isin(earlier['ORDER_ID'])
+    orders.loc[orders.index[later & (orders['ORDER_STATUS'] == 'delivered')][0], 'ORDER_PURCHASE_TIMESTAMP'] = \
+        earlier['ORDER_PURCHASE_TIMESTAMP'].max()
+    write_olist_tables({'olist_orders': orders}, data_dir)
+    counted = update_customer_features(project, datasets, CUSTOMER_FEATURESET, materialized_dir)
+    assert counted == len(delivered_later) + (orders['ORDER_STATUS'][later] == 'delivered').sum()
+    # Orders that are counted already are not counted again, including the orders purchased at the watermark
+    assert update_customer_features(project, datasets, CUSTOMER_FEATURESET, materialized_dir) == 0
+
+    expected = reference_featureset(project, datasets, CUSTOMER_FEATURESET).to_pandas()
+    assert_same_rows(materialized_featureset(project, materialized_dir, CUSTOMER_FEATURESET).to_pandas(), expected)
+    summary = read_table(os.path.join(state_dir, 'summary.arrow')).to_pandas()
+    pandas.testing.assert_frame_equal(summary, delivered_orders.summarize_delivered_orders(orders, tables['olist_customers']))
+    assert summary['TOTAL_ORDERS'].sum() == (orders['ORDER_STATUS'] == 'delivered').sum()
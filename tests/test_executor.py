@@ -0,0 +1,31 @@
+from layer_local import FeaturesetExecutor, build_dag
+from olist import FEATURESET_ALIASES, ORDER_FEATURESETS, assert_same_rows
+
+
+def test_process_pool_build_equals_reference(project, datasets, reference):
+    with FeaturesetExecutor(project, datasets, max_workers=2, featureset_aliases=FEATURESET_ALIASES) as executor:
+        result = executor.run(ORDER_FEATURESETS)
+        for name in ORDER_FEATURESETS:
+            assert_same_rows(result.featuresets[name].to_pandas(), reference[name].to_pandas())
+    assert {timing.feature for timing in result.timings} == {feature.name for name in ORDER_FEATURESETS
+                                                             for feature in project.featuresets[name].features}
+
+
+def test_unprojected_build_equals_projected_build(project, datasets):
+    with FeaturesetExecutor(project, datasets, max_workers=2, featureset_aliases=FEATURESET_ALIASES) as executor:
+        projected = executor.run(ORDER_FEATURESETS[:1]).featuresets[ORDER_FEATURESETS[0]].to_pandas()
+    with FeaturesetExecutor(project, datasets, max_workers=2, featureset_aliases=FEATURESET_ALIASES,
+                            project_columns=False) as executor:
+        unprojected = executor.run(ORDER_FEATURESETS[:1]).featuresets[ORDER_FEATURESETS[0]].to_pandas()
+    assert_same_rows(projected, unprojected)
+
+
+def test_featuresets_run_after_the_featuresets_they_read(project):
+    tasks = build_dag(project, ['order_features_tutorial6_new'], featureset_aliases=FEATURESET_ALIASES)
+    order = [task.featureset for task in tasks]
+    assert order.index('order_features_tutorial6_new') > max(i for i, name in enumerate(order)
+                                                             if name == 'order_features_tutorial6')
+    # The features that join items and products share one task, so the join is built once
+    item_features = {'avg_product_description_length', 'avg_product_name_length', 'avg_product_photos_qty',
+                     'main_product_category'}
+    assert any(item_features <= {node.feature.name for node in task.features} for task in tasks)
@@ -0,0 +1,84 @@
+import os
+import shutil
+
+import pytest
+
+from layer_local import FeaturesetExecutor, LocalDatasetProvider, load_project, write_table
+from olist import FEATURESET_ALIASES, ORDER_FEATURESETS, TUTORIAL6_DIR, assert_same_rows, reference_order_featuresets
+
+
+@pytest.fixture
+def project_dir(tmp_path):
+    # A copy of the project, so its feature sources can be edited
+    project_dir = str(tmp_path / 'tutorial6')
+    shutil.copytree(TUTORIAL6_DIR, project_dir, ignore=shutil.ignore_patterns('__pycache__'), symlinks=True)
+    return project_dir
+
+
+def build(project_dir, data_dir, cache_dir):
+    project = load_project(project_dir)
+    datasets = LocalDatasetProvider(project, data_dir)
+    with FeaturesetExecutor(project, datasets, max_workers=2, featureset_aliases=FEATURESET_ALIASES,
+                            cache_dir=cache_dir) as executor:
+        result = executor.run(ORDER_FEATURESETS)
+        built = {name: result.featuresets[name].to_pandas() for name in ORDER_FEATURESETS}
+    computed = {timing.feature for timing in result.timings if not timing.cached}
+    return built, computed
+
+
+def assert_equals_reference(built, project_dir, data_dir):
+    project = load_project(project_dir)
+    reference = reference_order_featuresets(project, LocalDatasetProvider(project, data_dir))
+    for name in ORDER_FEATURESETS:
+        assert_same_rows(built[name], reference[name].to_pandas())
+
+
+def append_comment(path):
+    with open(path, 'a') as f:
+        f.write('\n# Edited\n')
+
+
+def features_of(project_dir, name):
+    return {feature.name for feature in load_project(project_dir).featuresets[name].features}
+
+
+def test_rebuild_is_served_from_the_cache(project_dir, data_dir, tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    first, computed = build(project_dir, data_dir, cache_dir)
+    assert computed == features_of(project_dir, ORDER_FEATURESETS[0]) | features_of(project_dir, ORDER_FEATURESETS[1])
+    second, computed = build(project_dir, data_dir, cache_dir)
+    assert computed == set()
+    for name in ORDER_FEATURESETS:
+        assert_same_rows(second[name], first[name])
+    assert_equals_reference(second, project_dir, data_dir)
+
+
+def test_edited_feature_is_recomputed_with_its_readers(project_dir, data_dir, tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    build(project_dir, data_dir, cache_dir)
+    append_comment(os.path.join(project_dir, 'features', 'order_features', 'review_score.py'))
+    built, computed = build(project_dir, data_dir, cache_dir)
+    # order_features_tutorial6_new reads the edited featureset
+    assert computed == {'review_score'} | features_of(project_dir, ORDER_FEATURESETS[1])
+    assert_equals_reference(built, project_dir, data_dir)
+
+
+def test_edited_helper_module_invalidates_the_features_importing_it(project_dir, data_dir, tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    build(project_dir, data_dir, cache_dir)
+    append_comment(os.path.join(project_dir, 'features', 'order_features', 'money.py'))
+    built, computed = build(project_dir, data_dir, cache_dir)
+    assert {'total_product_price', 'total_payment'} <= computed
+    assert 'review_score' not in computed and 'order_timestamp' not in computed
+    assert_equals_reference(built, project_dir, data_dir)
+
+
+def test_changed_dataset_invalidates_the_features_reading_it(project_dir, data_dir, tables, tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    build(project_dir, data_dir, cache_dir)
+    reviews = tables['olist_reviews'].copy()
+    reviews['REVIEW_SCORE'] = 6 - reviews['REVIEW_SCORE']
+    write_table(reviews, os.path.join(data_dir, 'olist_reviews.parquet'))
+    built, computed = build(project_dir, data_dir, cache_dir)
+    assert computed == {'review_score'} | features_of(project_dir, ORDER_FEATURESETS[1])
+    assert_equals_reference(built, project_dir, data_dir)
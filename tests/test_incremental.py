@@ -0,0 +1,39 @@
+from layer_local import build_incrementally, materialized_featureset
+from olist import (FEATURESET_ALIASES, ORDER_FEATURESETS, assert_same_rows, reference_order_featuresets,
+                   write_olist_tables)
+
+ORDER_TABLES = ('olist_orders', 'olist_items', 'olist_payments', 'olist_reviews')
+
+
+def tables_until(tables, cutoff):
+    """The tables with the orders purchased up to `cutoff` only."""
+    orders = tables['olist_orders']
+    order_ids = orders['ORDER_ID'][orders['ORDER_PURCHASE_TIMESTAMP'] <= cutoff]
+    return {name: df[df['ORDER_ID'].isin(order_ids)] if name in ORDER_TABLES else df for name, df in tables.items()}
+
+
+def test_incremental_update_equals_full_rebuild(project, datasets, data_dir, tables, tmp_path):
+    materialized_dir = str(tmp_path / 'materialized')
+    orders = tables['olist_orders']
+    cutoff = orders['ORDER_PURCHASE_TIMESTAMP'].quantile(0.8)
+    write_olist_tables(tables_until(tables, cutoff), data_dir)
+    first = build_incrementally(project, datasets, ORDER_FEATURESETS, materialized_dir,
+                                featureset_aliases=FEATURESET_ALIASES, max_workers=2)
+    assert first.affected_keys is None
+
+    # New orders, and old orders whose status changed since the first build
+    updated = dict(tables, olist_orders=orders.copy())
+    changed = orders['ORDER_ID'][orders['ORDER_PURCHASE_TIMESTAMP'] <= cutoff].iloc[:5].tolist()
+    updated['olist_orders'].loc[orders['ORDER_ID'].isin(changed), 'ORDER_STATUS'] = 'canceled'
+    write_olist_tables(updated, data_dir)
+    second = build_incrementally(project, datasets, ORDER_FEATURESETS, materialized_dir, order_ids=changed,
+                                 featureset_aliases=FEATURESET_ALIASES, max_workers=2)
+    assert second.affected_keys == (orders['ORDER_PURCHASE_TIMESTAMP'] > cutoff).sum() + len(changed)
+
+    expected = reference_order_featuresets(project, datasets)
+    for name in ORDER_FEATURESETS:
+        assert_same_rows(materialized_featureset(project, materialized_dir, name).to_pandas(), expected[name].to_pandas())
+
+    third = build_incrementally(project, datasets, ORDER_FEATURESETS, materialized_dir,
+                                featureset_aliases=FEATURESET_ALIASES)
+    assert third.affected_keys == 0
@@ -0,0 +1,99 @@
+import os
+import time
+import types
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def model_cache(import_churn_model_helper):
+    return import_churn_model_helper('model_cache')
+
+
+class Loader:
+    """Models that record how often they are fetched."""
+
+    def __init__(self):
+        self.loads = []
+
+    def __call__(self, name, version):
+        def load():
+            self.loads.append((name, version))
+            return {'name': name, 'version': version, 'weights': np.arange(1000, dtype=np.float64)}
+        return load
+
+
+def test_models_are_cached_in_memory_and_on_disk(model_cache, tmp_path):
+    cache, loader = model_cache.ModelCache(str(tmp_path)), Loader()
+    model = cache.get_or_load('order_review_model', 1, loader('order_review_model', 1))
+    assert cache.get_or_load('order_review_model', 1, loader('order_review_model', 1)) is model
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # Another process loads the model from disk
+    cache = model_cache.ModelCache(str(tmp_path))
+    loaded = cache.get_or_load('order_review_model', 1, loader('order_review_model', 1))
+    assert loaded['version'] == 1 and np.array_equal(loaded['weights'], model['weights'])
+    assert loader.loads == [('order_review_model', 1)] and (cache.hits, cache.misses) == (1, 0)
+
+
+def test_versions_are_cached_apart(model_cache, tmp_path):
+    cache, loader = model_cache.ModelCache(str(tmp_path)), Loader()
+    for version in (1, 2, 1, 2):
+        model = cache.get_or_load('order_review_model', version, loader('order_review_model', version))
+        assert model['version'] == version
+    assert loader.loads == [('order_review_model', 1), ('order_review_model', 2)]
+
+
+def test_least_recently_used_models_are_evicted(model_cache, tmp_path):
+    loader = Loader()
+    cache = model_cache.ModelCache(str(tmp_path), max_memory_entries=2)
+    for version in (1, 2, 1, 3):
+        cache.get_or_load('model', version, loader('model', version))
+    # Version 2 left the memory, version 1 was used after it
+    assert list(cache._memory) == [('model', '1'), ('model', '3')]
+
+    # The disk holds 2 model files: the least recently used file is removed when a third one is written
+    size = os.path.getsize(os.path.join(str(tmp_path), 'model', '1.joblib'))
+    cache = model_cache.ModelCache(str(tmp_path / 'small'), max_disk_bytes=2 * size, max_memory_entries=0)
+    for version in (1, 2):
+        cache.get_or_load('model', version, loader('model', version))
+    # Files written in the same clock tick have the same modification time
+    for age, version in [(20, 1), (10, 2)]:
+        path = os.path.join(str(tmp_path / 'small'), 'model', '{}.joblib'.format(version))
+        os.utime(path, (time.time() - age, time.time() - age))
+    for version in (1, 3):
+        cache.get_or_load('model', version, loader('model', version))
+    assert sorted(os.listdir(str(tmp_path / 'small' / 'model'))) == ['1.joblib', '3.joblib']
+    loader.loads.clear()
+    cache.get_or_load('model', 2, loader('model', 2))
+    assert loader.loads == [('model', 2)]
+
+
+def test_load_model_calls_layer_once_per_version(model_cache, tmp_path, monkeypatch):
+    calls = []
+    latest = {'version': 1}
+
+    def get_model(name):
+        calls.append(name)
+        model_name, _, version = name.partition(':')
+        version = int(version) if version else latest['version']
+        return types.SimpleNamespace(version=version, trained_model_object={'version': version})
+
+    monkeypatch.setattr(model_cache.layer, 'get_model', get_model, raising=False)
+    monkeypatch.setattr(model_cache, 'model_cache', model_cache.ModelCache(str(tmp_path)))
+
+    # The latest version is pinned on the first call
+    assert model_cache.load_model('order_review_model') == {'version': 1}
+    latest['version'] = 2
+    assert model_cache.load_model('order_review_model') == {'version': 1}
+    assert calls == ['order_review_model']
+    # Cached versions are not fetched from Layer
+    assert model_cache.load_model('order_review_model', version=1) == {'version': 1}
+    assert model_cache.load_model('order_review_model', version=2) == {'version': 2}
+    assert model_cache.load_model('order_review_model', version=2) == {'version': 2}
+    assert calls == ['order_review_model', 'order_review_model:2']
+    # Clearing the cache unpins the version
+    model_cache.model_cache.clear()
+    assert model_cache.load_model('order_review_model') == {'version': 2}
+    assert calls == ['order_review_model', 'order_review_model:2', 'order_review_model']
@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pandas.testing
+import pyarrow as pa
+import pytest
+
+from layer_local import OnlineFeatureset, write_online_store
+from olist import FrameFeatureset, assert_same_rows
+
+
+@pytest.fixture
+def order_features(reference):
+    return reference['order_features_tutorial6']
+
+
+def test_store_holds_the_featureset(order_features, tmp_path):
+    store = write_online_store(order_features, str(tmp_path))
+    assert len(store) == len(order_features.to_pandas())
+    assert_same_rows(store.to_pandas(), order_features.to_pandas())
+
+
+def test_lookups_equal_the_rows_of_the_featureset(order_features, tmp_path):
+    store = write_online_store(order_features, str(tmp_path))
+    df = order_features.to_pandas().set_index('ORDER_ID')
+    rng = np.random.default_rng(0)
+    keys = list(rng.permutation(df.index.to_numpy())[:50]) + ['unknown', df.index[0] + 'x', df.index[0][:-1]]
+    columns = ['MAIN_PRODUCT_CATEGORY', 'TOTAL_PRODUCT_PRICE', 'ORDER_STATUS']
+    rows = store.multi_get(keys, columns=columns)
+    # Rows of the known keys, in the order of the keys
+    assert list(rows['ORDER_ID']) == keys[:50]
+    expected = df.loc[keys[:50], columns].reset_index()
+    assert_same_rows(store.to_pandas(columns=columns, keys=keys), expected)
+
+
+def test_readers_switch_to_a_new_version(order_features, tmp_path):
+    store = write_online_store(order_features, str(tmp_path))
+    reader = OnlineFeatureset(order_features.name, str(tmp_path), refresh_interval=None)
+    df = order_features.to_pandas()
+    updated = df.assign(TOTAL_PRODUCT_PRICE=df['TOTAL_PRODUCT_PRICE'] + 1)
+    write_online_store(FrameFeatureset(order_features.name, updated), str(tmp_path))
+    # Readers keep their version until they refresh
+    assert_same_rows(reader.to_pandas(), df)
+    assert reader.refresh()
+    assert_same_rows(reader.to_pandas(), updated)
+    assert reader.version != store.version
+
+
+def test_duplicate_keys_are_rejected(order_features, tmp_path):
+    df = order_features.to_pandas()
+    with pytest.raises(ValueError, match='not unique'):
+        write_online_store(FrameFeatureset(order_features.name, df.iloc[[0, 0, 1]]), str(tmp_path))
+
+
+def test_nullable_and_time_zone_aware_columns_keep_their_dtype(tmp_path):
+    timestamps = pd.to_datetime(['2018-01-01 10:00:00', None, '2018-03-01 23:30:00', '2017-12-31 23:59:00'])
+    df = pd.DataFrame({'ORDER_ID': ['c', 'a', 'b', 'd'],
+                       'TOTAL_ITEMS': pd.array([3, None, 1, 2], dtype='Int64'),
+                       'AVG_PRICE': pd.array([1.5, 2.5, None, 0.5], dtype='Float64'),
+                       'USE_VOUCHER': pd.array([True, None, False, True], dtype='boolean'),
+                       'ORDER_PURCHASE_TIMESTAMP': timestamps.tz_localize('America/Sao_Paulo')})
+    store = write_online_store(FrameFeatureset('order_features', df), str(tmp_path))
+    pandas.testing.assert_frame_equal(store.to_pandas(), df.sort_values('ORDER_ID', ignore_index=True))
+    rows = store.multi_get(['d', 'a'], columns=['TOTAL_ITEMS', 'ORDER_PURCHASE_TIMESTAMP'])
+    assert list(rows['TOTAL_ITEMS']) == [2, pd.NA]
+    assert list(rows['ORDER_PURCHASE_TIMESTAMP'])[0] == df['ORDER_PURCHASE_TIMESTAMP'][3]
+    assert store.schema.types[1:] == [pa.int64(), pa.float64(), pa.bool_(), pa.timestamp('ns', tz='America/Sao_Paulo')]
+
+
+def test_unsupported_extension_dtypes_are_rejected(tmp_path):
+    df = pd.DataFrame({'ORDER_ID': ['a', 'b'], 'PURCHASE_MONTH': pd.period_range('2018-01', periods=2, freq='M')})
+    with pytest.raises(ValueError, match='cannot hold'):
+        write_online_store(FrameFeatureset('order_features', df), str(tmp_path))
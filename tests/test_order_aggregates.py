@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import pandas.testing
+import pytest
+
+
+def money(rng, n, high):
+    # Money values with missing values, for orders of about 10 rows, where plain and compensated sums differ
+    values = np.round(rng.uniform(0, high, n), 2)
+    values[rng.random(n) < 0.02] = np.nan
+    return values
+
+
+@pytest.fixture
+def items_df():
+    rng = np.random.default_rng(0)
+    n = 20000
+    order_ids = np.array(['order_%04d' % i for i in range(2000)], dtype=object)
+    return pd.DataFrame({'ORDER_ID': order_ids[rng.integers(0, len(order_ids), n)],
+                         'PRODUCT_ID': rng.integers(0, 100, n).astype(str).astype(object),
+                         'SELLER_ID': rng.integers(0, 10, n).astype(str).astype(object),
+                         'PRICE': money(rng, n, 500),
+                         'FREIGHT_VALUE': money(rng, n, 50)})
+
+
+def test_item_sums_equal_the_baseline_features(import_order_helper, items_df):
+    aggregates = import_order_helper('items_aggregates').aggregate_items(items_df)
+    # The features before their aggregation was shared
+    for feature_name, column in [('TOTAL_PRODUCT_PRICE', 'PRICE'), ('TOTAL_FREIGHT_PRICE', 'FREIGHT_VALUE')]:
+        expected = items_df.groupby('ORDER_ID', as_index=False).agg(**{feature_name: (column, 'sum')})
+        pandas.testing.assert_frame_equal(aggregates[['ORDER_ID', feature_name]], expected, check_exact=True)
+
+
+@pytest.fixture
+def payments_df():
+    rng = np.random.default_rng(1)
+    n = 20000
+    order_ids = np.array(['order_%04d' % i for i in range(2000)], dtype=object)
+    payment_types = np.array(['credit_card', 'boleto', 'voucher', 'debit_card', None], dtype=object)
+    payments_df = pd.DataFrame({'ORDER_ID': order_ids[rng.integers(0, len(order_ids), n)],
+                                'PAYMENT_TYPE': payment_types[rng.integers(0, len(payment_types), n)],
+                                'PAYMENT_VALUE': money(rng, n, 500)})
+    # Orders paid by two payment types with the same total
+    ties = pd.DataFrame({'ORDER_ID': np.repeat(['tie_%d' % i for i in range(50)], 2),
+                         'PAYMENT_TYPE': np.tile(['boleto', 'credit_card'], 50),
+                         'PAYMENT_VALUE': np.repeat(np.round(rng.uniform(0, 500, 50), 2), 2)})
+    return pd.concat([payments_df, ties], ignore_index=True)
+
+
+def test_payment_sums_equal_the_baseline_features(import_order_helper, payments_df):
+    aggregates = import_order_helper('payments_aggregates').aggregate_payments(payments_df)
+
+    # The features before their aggregation was shared
+    total_payment = payments_df[["ORDER_ID", "PAYMENT_VALUE"]].groupby(['ORDER_ID'], as_index=False)\
+        .agg(TOTAL_PAYMENT=("PAYMENT_VALUE", "sum"))
+    pandas.testing.assert_frame_equal(aggregates[['ORDER_ID', 'TOTAL_PAYMENT']], total_payment, check_exact=True)
+
+    payments_df = payments_df.copy()
+    payments_df['PAYMENT_TYPE_TOTAL'] = payments_df.groupby(['ORDER_ID', 'PAYMENT_TYPE'])['PAYMENT_VALUE'].transform('sum')
+    payments_df['PAYMENT_TYPE_TOTAL_MAX'] = payments_df.groupby(['ORDER_ID'])['PAYMENT_TYPE_TOTAL'].transform('max')
+    payments_df['MAIN_PAYMENT_TYPE'] = np.where(payments_df['PAYMENT_TYPE_TOTAL_MAX'] == payments_df['PAYMENT_TYPE_TOTAL'],
+                                                payments_df.PAYMENT_TYPE, np.NaN)
+    main_payment_type = payments_df.groupby(['ORDER_ID'], as_index=False)\
+        .agg(MAIN_PAYMENT_TYPE=("MAIN_PAYMENT_TYPE", "first"))
+    pandas.testing.assert_frame_equal(aggregates[['ORDER_ID', 'MAIN_PAYMENT_TYPE']], main_payment_type)
@@ -0,0 +1,90 @@
+import functools
+import os
+
+import numpy as np
+import pandas as pd
+import pandas.testing
+import pytest
+
+from olist import FrameFeatureset, assert_same_rows
+
+
+@pytest.fixture
+def partitioned_join(import_order_helper):
+    return import_order_helper('partitioned_join')
+
+
+def batches(df, rows):
+    return [df.iloc[start:start + rows] for start in range(0, len(df), rows)]
+
+
+def test_spilled_join_equals_merge(partitioned_join, tables, tmp_path):
+    items = tables['olist_items'].assign(ITEM_POSITION=np.arange(len(tables['olist_items'])))
+    products = tables['olist_products']
+    spilled_files = []
+    joined = []
+    # Both sides exceed the memory budget and are spilled
+    for df in partitioned_join.left_join_batches(batches(items, 100), batches(products, 10), 'PRODUCT_ID', 4,
+                                                 memory_budget=1, spill_dir=str(tmp_path)):
+        spilled_files.extend(name for directory in os.listdir(tmp_path)
+                             for name in os.listdir(os.path.join(tmp_path, directory)))
+        joined.append(df)
+    assert spilled_files and os.listdir(tmp_path) == []
+    # Rows come out grouped by partition
+    assert len(joined) == 4
+    joined_df = pd.concat(joined).sort_values('ITEM_POSITION', ignore_index=True)
+    pandas.testing.assert_frame_equal(joined_df, items.merge(products, on='PRODUCT_ID', how='left'), check_exact=True)
+
+
+def test_spilled_partitions_keep_the_rows_in_order(partitioned_join, tables):
+    orders = tables['olist_orders'][['ORDER_ID', 'ORDER_STATUS']]
+    orders = orders.assign(ORDER_ID=pd.Categorical(orders['ORDER_ID']), POSITION=np.arange(len(orders)))
+    with partitioned_join.SpilledPartitions('ORDER_ID', 8, memory_budget=4096) as partitions:
+        for df in batches(orders, 50):
+            partitions.add(df)
+        assert partitions.spilled
+        numbers = partitioned_join.partition_numbers(orders['ORDER_ID'], 8)
+        for i in range(8):
+            pandas.testing.assert_frame_equal(partitions.partition(i), orders[numbers == i].reset_index(drop=True))
+
+
+def test_partition_count_grows_with_the_datasets(partitioned_join, tables):
+    items = partitioned_join.loaded_dataset(FrameFeatureset('items_dataset', tables['olist_items']))
+    assert items.nbytes > 0
+    assert partitioned_join.partition_count(items, memory_budget=items.nbytes * 100) == 1
+    assert partitioned_join.partition_count(items, memory_budget=items.nbytes // 4) == 16
+    assert partitioned_join.partition_count(items, memory_budget=1) == partitioned_join.MAX_PARTITIONS
+
+
+@pytest.mark.parametrize('layer_datasets', [False, True])
+def test_items_products_by_order_equal_merge(partitioned_join, datasets, tables, layer_datasets, tmp_path):
+    items, products = datasets('items_dataset'), datasets('products_dataset')
+    if layer_datasets:
+        # Datasets read as a whole, like Layer Datasets
+        items = partitioned_join.loaded_dataset(FrameFeatureset('items_dataset', tables['olist_items']))
+        products = partitioned_join.loaded_dataset(FrameFeatureset('products_dataset', tables['olist_products']))
+    columns = ['ORDER_ID', 'PRICE', 'PRODUCT_CATEGORY_NAME']
+    memory_budget = 16 * 1024
+    assert not partitioned_join.fits_in_memory(items, products, memory_budget=memory_budget)
+    partitions = list(partitioned_join.items_products_by_order(items, products, columns, memory_budget=memory_budget,
+                                                               spill_dir=str(tmp_path)))
+
+    expected = tables['olist_items'].merge(tables['olist_products'], on='PRODUCT_ID', how='left')[columns]
+    # Every order is in one partition, with its items in their original order
+    assert sum(df['ORDER_ID'].nunique() for df in partitions) == expected['ORDER_ID'].nunique()
+    for df in partitions:
+        pandas.testing.assert_frame_equal(df, expected[expected['ORDER_ID'].isin(df['ORDER_ID'])].reset_index(drop=True),
+                                          check_exact=True)
+
+
+def test_out_of_core_main_product_category_equals_in_memory(import_order_helper, datasets, reference, monkeypatch):
+    main_product_category = import_order_helper('main_product_category')
+    partitioned_join = import_order_helper('partitioned_join')
+    arguments = {'items_layer_df': datasets('items_dataset'), 'products_layer_df': datasets('products_dataset'),
+                 'category_name_translation_layer_df': datasets('category_name_translation_dataset')}
+    monkeypatch.setattr(main_product_category, 'fits_in_memory', lambda *layer_datasets: False)
+    monkeypatch.setattr(main_product_category, 'items_products_by_order',
+                        functools.partial(partitioned_join.items_products_by_order, memory_budget=16 * 1024))
+    result = main_product_category.build_feature(**arguments)
+    expected = reference['order_features_tutorial6'].to_pandas()[['ORDER_ID', 'MAIN_PRODUCT_CATEGORY']]
+    assert_same_rows(result, expected.dropna(subset=['MAIN_PRODUCT_CATEGORY']))
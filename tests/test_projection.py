@@ -0,0 +1,79 @@
+import textwrap
+
+import pytest
+
+from layer_local import infer_feature_columns, projected_dataset
+
+
+def write_feature(directory, source, name='feature.py'):
+    path = directory / name
+    path.write_text(textwrap.dedent(source))
+    return str(path)
+
+
+@pytest.fixture
+def feature_dir(tmp_path):
+    directory = tmp_path / 'features'
+    directory.mkdir()
+    return directory
+
+
+def test_projection_reads_the_named_columns(feature_dir, datasets):
+    path = write_feature(feature_dir, '''
+        from layer import Dataset
+
+        def build_feature(items: Dataset("items_dataset")):
+            items_df = items.to_pandas()
+            return items_df.groupby('ORDER_ID', as_index=False)['PRICE'].sum()
+    ''')
+    columns = infer_feature_columns(path).parameters['items'].columns
+    assert {'ORDER_ID', 'PRICE'} <= columns
+    assert projected_dataset(datasets('items_dataset'), columns).to_pandas().columns.tolist() == ['ORDER_ID', 'PRICE']
+
+
+def test_module_constants_and_local_functions_are_scanned(feature_dir, datasets):
+    path = write_feature(feature_dir, '''
+        from layer import Dataset
+
+        PRICE_COLUMN = 'PRICE'
+
+
+        def total(df):
+            return df.groupby('ORDER_ID', as_index=False)[PRICE_COLUMN].sum()
+
+
+        def build_feature(items: Dataset("items_dataset")):
+            items_df = items.to_pandas()
+            return total(items_df)
+    ''')
+    columns = infer_feature_columns(path).parameters['items'].columns
+    assert 'PRICE' in columns
+    items_df = projected_dataset(datasets('items_dataset'), columns).to_pandas()
+    assert items_df.groupby('ORDER_ID', as_index=False)['PRICE'].sum().shape[0] > 0
+
+
+def test_sibling_module_constants_are_scanned(feature_dir):
+    write_feature(feature_dir, '''
+        FREIGHT_COLUMN = 'FREIGHT_VALUE'
+    ''', name='columns.py')
+    path = write_feature(feature_dir, '''
+        from layer import Dataset
+        from columns import FREIGHT_COLUMN
+
+        def build_feature(items: Dataset("items_dataset")):
+            items_df = items.to_pandas()
+            return items_df.groupby('ORDER_ID', as_index=False)[FREIGHT_COLUMN].sum()
+    ''')
+    assert 'FREIGHT_VALUE' in infer_feature_columns(path).parameters['items'].columns
+
+
+def test_frames_passed_to_unknown_functions_are_read_in_full(feature_dir):
+    path = write_feature(feature_dir, '''
+        from layer import Dataset
+        from olist_helpers import total
+
+        def build_feature(items: Dataset("items_dataset")):
+            items_df = items.to_pandas()
+            return total(items_df)
+    ''')
+    assert infer_feature_columns(path).parameters['items'].columns is None
@@ -0,0 +1,95 @@
+import asyncio
+
+import numpy as np
+import pytest
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import GradientBoostingClassifier
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder
+
+from layer_local import write_online_store
+from layer_local.scoring import ChurnScorer, MicroBatcher
+from olist import ORDER_FEATURESETS
+
+CATEGORICAL_COLUMNS = ['ORDER_STATUS', 'MAIN_PAYMENT_TYPE']
+NUMERICAL_COLUMNS = ['TOTAL_PAYMENT', 'DAYS_BETWEEN_ESTIMATE_ACTUAL_DELIVERY', 'IS_MULTI_ITEMS', 'TOTAL_WAITING']
+
+
+@pytest.fixture
+def features_df(reference):
+    features_df = reference[ORDER_FEATURESETS[0]].to_pandas().merge(reference[ORDER_FEATURESETS[1]].to_pandas(),
+                                                                     on='ORDER_ID')
+    return features_df[['ORDER_ID'] + CATEGORICAL_COLUMNS + NUMERICAL_COLUMNS]
+
+
+@pytest.fixture
+def pipeline(features_df):
+    X = features_df.dropna()
+    transformer = ColumnTransformer(transformers=[('cat', OneHotEncoder(handle_unknown='ignore'), CATEGORICAL_COLUMNS)],
+                                    remainder='passthrough')
+    model = GradientBoostingClassifier(n_estimators=20, max_depth=3, random_state=0)
+    churned = (X['TOTAL_WAITING'] > X['TOTAL_WAITING'].median()) ^ (X['ORDER_STATUS'] != 'delivered')
+    return Pipeline(steps=[('t', transformer), ('m', model)]).fit(X[CATEGORICAL_COLUMNS + NUMERICAL_COLUMNS], churned)
+
+
+@pytest.fixture
+def scorer(reference, pipeline, tmp_path):
+    stores = [write_online_store(reference[name], str(tmp_path)) for name in ORDER_FEATURESETS]
+    return ChurnScorer(pipeline, stores)
+
+
+def expected_scores(pipeline, features_df, order_ids):
+    rows = features_df.set_index('ORDER_ID').loc[order_ids].dropna()
+    return dict(zip(rows.index, pipeline.predict_proba(rows[CATEGORICAL_COLUMNS + NUMERICAL_COLUMNS])[:, 1].tolist()))
+
+
+def test_scores_equal_pipeline_probabilities(scorer, pipeline, features_df):
+    order_ids = features_df['ORDER_ID'].tolist()
+    # Orders with missing features are not scored
+    assert features_df.isna().any(axis=1).any()
+    assert scorer.score(order_ids + ['unknown']) == expected_scores(pipeline, features_df, order_ids)
+
+
+def test_micro_batches_equal_direct_scores(scorer, features_df):
+    order_ids = features_df['ORDER_ID'].tolist()[:200] + ['unknown']
+    batches = []
+
+    def score_batch(keys):
+        batches.append(len(keys))
+        return scorer.score(keys)
+
+    async def submit_all():
+        batcher = MicroBatcher(score_batch, max_batch_size=16, max_wait=0.01)
+        batcher.start()
+        try:
+            return await asyncio.gather(*(batcher.submit(order_id) for order_id in order_ids), return_exceptions=True)
+        finally:
+            await batcher.stop()
+
+    results = dict(zip(order_ids, asyncio.run(submit_all())))
+    expected = scorer.score(order_ids)
+    assert {key: value for key, value in results.items() if not isinstance(value, Exception)} == expected
+    # Orders without features fail with a KeyError, like in the scoring server
+    assert all(isinstance(value, KeyError) for key, value in results.items() if key not in expected)
+    assert sum(batches) == len(order_ids) and max(batches) <= 16 and len(batches) < len(order_ids)
+
+
+def test_batch_errors_reach_every_request():
+    def score_batch(keys):
+        raise RuntimeError("Scoring failed")
+
+    async def submit_all():
+        batcher = MicroBatcher(score_batch, max_batch_size=4, max_wait=0.01)
+        batcher.start()
+        try:
+            return await asyncio.gather(*(batcher.submit(key) for key in range(6)), return_exceptions=True)
+        finally:
+            await batcher.stop()
+
+    results = asyncio.run(submit_all())
+    assert len(results) == 6 and all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_unknown_orders_have_no_score(scorer):
+    assert scorer.score([]) == {}
+    assert scorer.score(np.array(['unknown'], dtype=object)) == {}
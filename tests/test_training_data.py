@@ -0,0 +1,111 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pandas.testing
+import pytest
+
+from layer_local import write_columnar_featureset
+from olist import (CUSTOMER_FEATURESET, ORDER_FEATURESETS, FrameFeatureset, assert_same_rows, reference_featureset,
+                   reference_order_featuresets, write_olist_tables)
+
+
+@pytest.fixture
+def training_data(import_churn_model_helper):
+    return import_churn_model_helper('training_data')
+
+
+@pytest.fixture
+def tied_reviews(tables):
+    # Second reviews answered at the same time as the first review of their order, with another score
+    reviews = tables['olist_reviews']
+    second_reviews = reviews.iloc[::5].assign(REVIEW_SCORE=lambda df: df['REVIEW_SCORE'] % 5 + 1)
+    return pd.concat([reviews, second_reviews], ignore_index=True)
+
+
+def test_review_score_has_one_row_per_order(project, datasets, data_dir, tied_reviews):
+    write_olist_tables({'olist_reviews': tied_reviews}, data_dir)
+    df = reference_featureset(project, datasets, ORDER_FEATURESETS[0]).to_pandas()
+    assert df['ORDER_ID'].is_unique
+    # The last review of the dataset is kept
+    expected = tied_reviews.drop_duplicates(subset=['ORDER_ID'], keep='last').set_index('ORDER_ID')['REVIEW_SCORE']
+    pandas.testing.assert_series_equal(df.set_index('ORDER_ID')['REVIEW_SCORE'].dropna().sort_index(),
+                                       expected.sort_index(), check_dtype=False)
+
+
+def test_training_data_has_one_row_per_label(project, datasets, data_dir, tied_reviews, training_data,
+                                             import_churn_model_helper):
+    write_olist_tables({'olist_reviews': tied_reviews}, data_dir)
+    featuresets = reference_order_featuresets(project, datasets)
+    customer_features = reference_featureset(project, datasets, CUSTOMER_FEATURESET).to_pandas()
+    labels_df = import_churn_model_helper('churn_labels').churn_labels(customer_features, datetime.date(2018, 10, 17))
+    labels_df = labels_df[['CUSTOMER_UNIQUE_ID', 'FIRST_ORDER_ID', 'CHURNED']]
+    training_data_df = training_data.assemble_training_data(labels_df, 'FIRST_ORDER_ID',
+                                                            [featuresets[name] for name in ORDER_FEATURESETS])
+    assert len(training_data_df) == len(labels_df)
+
+
+def test_duplicate_feature_rows_are_rejected(training_data):
+    labels_df = pd.DataFrame({'FIRST_ORDER_ID': ['a', 'b'], 'CHURNED': [0, 1]})
+    features = FrameFeatureset('order_features', pd.DataFrame({'ORDER_ID': ['a', 'a', 'b'], 'REVIEW_SCORE': [1, 2, 3]}))
+    with pytest.raises(ValueError, match='not unique on ORDER_ID'):
+        training_data.assemble_training_data(labels_df, 'FIRST_ORDER_ID', [features])
+
+
+def baseline_churn_labels(customer_features, dataset_max_date, order_silence_period=365):
+    # The labels of the churn model before churn_labels.py
+    customer_not_ordered_again = customer_features[
+        (customer_features.ORDERED_AGAIN == 0)
+        & (customer_features.FIRST_ORDER_TIMESTAMP.dt.date + datetime.timedelta(days=order_silence_period)
+           < dataset_max_date)]
+    customer_ordered_again = customer_features.loc[(customer_features.ORDERED_AGAIN == 1)]
+    customers_features_filtered = pd.concat([customer_not_ordered_again, customer_ordered_again])
+    customers_features_filtered['CHURNED'] = 1
+    customers_features_filtered.loc[customers_features_filtered['ORDERED_AGAIN'] == 1, 'CHURNED'] = 0
+    return customers_features_filtered
+
+
+@pytest.fixture
+def customer_features(project, datasets):
+    return reference_featureset(project, datasets, CUSTOMER_FEATURESET).to_pandas()
+
+
+def test_churn_labels_equal_the_baseline_labels(import_churn_model_helper, customer_features):
+    churn_labels = import_churn_model_helper('churn_labels').churn_labels
+    max_date = datetime.date(2018, 10, 17)
+    pandas.testing.assert_frame_equal(churn_labels(customer_features, max_date),
+                                      baseline_churn_labels(customer_features, max_date))
+
+    # First orders around the end of the silence period, at midnight and late in the day, and without a timestamp
+    timestamps = pd.to_datetime(['2017-10-16 00:00:00', '2017-10-16 23:59:59', '2017-10-17 00:00:00',
+                                 '2017-10-17 23:59:59', '2017-10-18 12:00:00', '1969-12-31 23:00:00', None])
+    edge_cases = pd.DataFrame({'CUSTOMER_UNIQUE_ID': ['c%d' % i for i in range(2 * len(timestamps))],
+                               'FIRST_ORDER_TIMESTAMP': np.tile(timestamps, 2),
+                               'ORDERED_AGAIN': np.repeat([0, 1], len(timestamps))}, index=np.arange(100, 114))
+    for silence_days in (365, 0):
+        pandas.testing.assert_frame_equal(churn_labels(edge_cases, max_date, silence_days),
+                                          baseline_churn_labels(edge_cases, max_date, silence_days))
+
+
+@pytest.mark.parametrize('columnar', [False, True])
+def test_training_data_equals_the_baseline_merge(project, datasets, customer_features, training_data,
+                                                 import_churn_model_helper, columnar, tmp_path):
+    featuresets = reference_order_featuresets(project, datasets)
+    labels_df = import_churn_model_helper('churn_labels').churn_labels(customer_features, datetime.date(2018, 10, 17))
+    labels_df = labels_df[['CUSTOMER_UNIQUE_ID', 'FIRST_ORDER_ID', 'CHURNED']]
+    # The training data of the churn model before training_data.py
+    order_features_base = featuresets[ORDER_FEATURESETS[0]].to_pandas().dropna()
+    order_high_level_features = featuresets[ORDER_FEATURESETS[1]].to_pandas().dropna()
+    order_features = order_features_base.merge(order_high_level_features, on='ORDER_ID', how='left')
+    expected = labels_df.merge(order_features, left_on='FIRST_ORDER_ID', right_on='ORDER_ID', how='left')
+
+    if columnar:
+        # Key-set reads of the columnar featuresets, with small row groups
+        featuresets = {name: write_columnar_featureset(featureset, str(tmp_path), row_group_size=50)
+                       for name, featureset in featuresets.items()}
+    training_data_df = training_data.assemble_training_data(labels_df, 'FIRST_ORDER_ID',
+                                                            [featuresets[name] for name in ORDER_FEATURESETS])
+    if columnar:
+        assert_same_rows(training_data_df, expected)
+    else:
+        pandas.testing.assert_frame_equal(training_data_df, expected, check_exact=True)
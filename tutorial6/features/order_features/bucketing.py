@@ -0,0 +1,33 @@
+# "Top N or other" bucketing of nominal columns with many levels (categories, cities, states).
+# The values of the column are factorized once: every distinct value gets an integer code (the codes of a categorical
+# are used as they are). A lookup table maps every code to its bucket, the value itself for the top values and
+# 'other' for the rest, so bucketing every row is a single array gather instead of a list membership test per row.
+
+import numpy as np
+import pandas as pd
+
+OTHER = 'other'
+
+
+def top_values_by_frequency(values, n):
+    # The n most frequent non-null values of a Series, the first one seen first among values with the same frequency
+    codes, uniques = pd.factorize(values)
+    counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+    top_codes = np.argsort(-counts, kind='stable')[:n]
+    return list(np.asarray(uniques, dtype=object)[top_codes])
+
+
+def bucket_top_values(values, top_values=None, n=None, other=OTHER):
+    # Same as values.apply(lambda value: value if value in top_values else other).
+    # Without `top_values`, the `n` most frequent values of the data are kept (see `top_values_by_frequency`). Note that
+    # they then depend on the rows the feature is built from, unlike a fixed list.
+    if top_values is None:
+        if n is None:
+            raise ValueError("Pass the top values to keep, or their number n to derive them from the data")
+        top_values = top_values_by_frequency(values, n)
+
+    codes, uniques = pd.factorize(values)
+    # One bucket per code, and an extra last bucket for the code -1 of nulls, which are never in the top values
+    buckets = np.append(np.asarray(uniques, dtype=object), other)
+    buckets[~np.append(pd.Index(uniques).isin(top_values), False)] = other
+    return pd.Series(buckets[codes], index=values.index, name=values.name)
@@ -0,0 +1,12 @@
+# Cache keys of Layer datasets, for the helper modules of this featureset that cache dataframes per dataset
+# (join_cache.py and the aggregate helpers). Featuresets only import helpers from their own directory, so the customer
+# features hold a copy of dataset_key: keep both copies identical, so both featuresets build their keys the same way.
+
+
+def dataset_key(layer_dataset):
+    # Identify a Layer dataset by its name and version, so that a new version of the dataset is never served from cache.
+    # Local datasets (see layer_local) can also be read through a column projection or filters, which are part of the key.
+    columns = getattr(layer_dataset, 'columns', None)
+    filters = getattr(layer_dataset, 'filters', None)
+    return (getattr(layer_dataset, 'name', None), getattr(layer_dataset, 'version', None),
+            tuple(columns) if columns is not None else None, repr(filters) if filters else None)
@@ -5,35 +5,68 @@
 from typing import Any
 from layer import Dataset
 import numpy as np
+import pandas as pd
+from bucketing import bucket_top_values
+from money import money_values
+from join_cache import items_products_joined, items_products_key, join_cache
+from partitioned_join import fits_in_memory, items_products_by_order, loaded_dataset
 
-def build_feature(items_layer_df: Dataset("items_dataset"),products_layer_df: Dataset("products_dataset"),category_name_translation_layer_df: Dataset("category_name_translation_dataset")) -> Any:
-    # Convert Layer Dataset into pandas data frame
-    items_df = items_layer_df.to_pandas()
-    products_df = products_layer_df.to_pandas()
-    category_translation_df = category_name_translation_layer_df.to_pandas()
-
-    # Join items and products pandas dataframes : items_products_joined
-    items_products_joined = items_df.merge(products_df, left_on='PRODUCT_ID', right_on='PRODUCT_ID', how='left')
 
-    # Join items_products_joined with category_translation pandas dataframe (translate category names from portuguese to english)
-    all_joined_df = items_products_joined.merge(category_translation_df, left_on='PRODUCT_CATEGORY_NAME', right_on='PRODUCT_CATEGORY_NAME' ,how='left')
+def main_categories(all_joined_df):
+    # Main category of every order in all_joined_df, which holds all items of its orders in their original order
+    # Prices are summed in float64 (see money.py)
+    all_joined_df['PRICE'] = money_values(all_joined_df['PRICE'])
 
     # CATEGORY_TOTAL_PAYMENT: Total payment for each category. (In case of having multiple categories in an order)
-    all_joined_df['CATEGORY_TOTAL_PRICE'] = all_joined_df.groupby(['ORDER_ID', 'PRODUCT_CATEGORY_NAME_ENGLISH'])['PRICE'].transform('sum')
+    all_joined_df['CATEGORY_TOTAL_PRICE'] = all_joined_df.groupby(['ORDER_ID', 'PRODUCT_CATEGORY_NAME_ENGLISH'], observed=True)['PRICE'].transform('sum')
 
     # CATEGORY_TOTAL_MAX: Total maximum price among categories of the order
-    all_joined_df['CATEGORY_TOTAL_MAX'] = all_joined_df.groupby(['ORDER_ID'])['CATEGORY_TOTAL_PRICE'].transform('max')
+    all_joined_df['CATEGORY_TOTAL_MAX'] = all_joined_df.groupby(['ORDER_ID'], observed=True)['CATEGORY_TOTAL_PRICE'].transform('max')
 
     # Pick the category with highest total price as the main category of the order ('first' in aggregation returns first non-null value)
     all_joined_df['MAIN_PRODUCT_CATEGORY'] = np.where(all_joined_df['CATEGORY_TOTAL_PRICE'] == all_joined_df['CATEGORY_TOTAL_MAX'],all_joined_df.PRODUCT_CATEGORY_NAME_ENGLISH, np.NaN)
-    main_product_category = all_joined_df\
-        .groupby('ORDER_ID', as_index=False)\
+    return all_joined_df\
+        .groupby('ORDER_ID', as_index=False, observed=True)\
         .agg(MAIN_PRODUCT_CATEGORY=("MAIN_PRODUCT_CATEGORY", "first"))
 
+
+def build_feature(items_layer_df: Dataset("items_dataset"),products_layer_df: Dataset("products_dataset"),category_name_translation_layer_df: Dataset("category_name_translation_dataset")) -> Any:
+    # Convert Layer Dataset into pandas data frame
+    category_translation_df = category_name_translation_layer_df.to_pandas()
+
+    # The translation table is small: translate category names from portuguese to english with a dictionary lookup
+    translations = dict(zip(category_translation_df['PRODUCT_CATEGORY_NAME'], category_translation_df['PRODUCT_CATEGORY_NAME_ENGLISH']))
+
+    # Layer Datasets are converted to pandas once to know their size (see partitioned_join.py), unless their join shared
+    # with the other product features of this featureset is already cached
+    joined = items_products_key(items_layer_df, products_layer_df) in join_cache
+    if not joined:
+        items_layer_df, products_layer_df = loaded_dataset(items_layer_df), loaded_dataset(products_layer_df)
+
+    if joined or fits_in_memory(items_layer_df, products_layer_df):
+        # Join items and products pandas dataframes (shared with the other product features of this featureset)
+        items_products_df = items_products_joined(items_layer_df, products_layer_df)
+        all_joined_df = pd.DataFrame({'ORDER_ID': items_products_df['ORDER_ID'], 'PRICE': items_products_df['PRICE'],
+                                      'PRODUCT_CATEGORY_NAME_ENGLISH': items_products_df['PRODUCT_CATEGORY_NAME'].map(translations)})
+        main_product_category = main_categories(all_joined_df)
+    else:
+        # Join items and products batch by batch, spilling to disk when they exceed the memory budget, and compute the
+        # main categories of one partition of the orders at a time (see partitioned_join.py)
+        main_product_categories = []
+        for items_products_df in items_products_by_order(items_layer_df, products_layer_df, ['ORDER_ID', 'PRICE', 'PRODUCT_CATEGORY_NAME']):
+            all_joined_df = pd.DataFrame({'ORDER_ID': items_products_df['ORDER_ID'], 'PRICE': items_products_df['PRICE'],
+                                          'PRODUCT_CATEGORY_NAME_ENGLISH': items_products_df['PRODUCT_CATEGORY_NAME'].map(translations)})
+            main_product_categories.append(main_categories(all_joined_df))
+
+        if not main_product_categories:
+            return pd.DataFrame({'ORDER_ID': [], 'MAIN_PRODUCT_CATEGORY': []})
+        main_product_category = pd.concat(main_product_categories).sort_values('ORDER_ID', ignore_index=True)
+
     # Main Product Category is a nominal variable not an ordinal variable. Therefore, it is better to convert this column using OneHotEncoding in the model stage.
     # However since there are many categories in this column, it's not good practice to encode a nominal variable with too many levels into one-hot version. Article:[https://towardsdatascience.com/one-hot-encoding-is-making-your-tree-based-ensembles-worse-heres-why-d64b282b5769]
     # Therefore, after checking on the distribution of the categories in the data, we decided to use the top 10 categories here and call the rest of the categories as "other"
     top_10_categories = ["bed_bath_table", "sports_leisure", "health_beauty","computers_accessories","furniture_decor","housewares","watches_gifts","telephony","auto","toys"]
-    main_product_category['MAIN_PRODUCT_CATEGORY'] = main_product_category['MAIN_PRODUCT_CATEGORY'].apply(lambda category: category if category in top_10_categories else 'other')
+    # (a lookup table gather on the factorized categories, see bucketing.py; bucket_top_values(..., n=10) would derive the top 10 from the data instead)
+    main_product_category['MAIN_PRODUCT_CATEGORY'] = bucket_top_values(main_product_category['MAIN_PRODUCT_CATEGORY'], top_10_categories)
 
     return main_product_category
@@ -0,0 +1,15 @@
+# Money columns (PRICE, FREIGHT_VALUE, PAYMENT_VALUE) for sums and other aggregates.
+# The compact mode of layer_local downcasts money columns to float32 when every value rounds back to itself at 2 decimals.
+# Summing float32 values adds their representation error to the totals (99.9000015258789 instead of 99.9), so money
+# columns are always aggregated in float64: float32 values are rounded back to their original 2 decimal values first, which
+# makes the aggregates of a compact build identical to the ones of a normal build.
+
+import numpy as np
+
+
+def money_values(values):
+    # Money values as a float64 numpy array, with the exact values of a normal build for downcast columns
+    values = np.asarray(values)
+    if values.dtype == np.float32:
+        return np.round(values.astype(np.float64), 2)
+    return values.astype(np.float64, copy=False)
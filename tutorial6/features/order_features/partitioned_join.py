@@ -0,0 +1,242 @@
+# An out-of-core hash join for features that join the items with the products.
+# The items table grows with the number of orders: joining it with the products in one merge needs memory proportional
+# to the whole items table. `left_join_batches` streams the left table one batch at a time instead. The right (build)
+# side of the join is held in memory while it fits in a memory budget; beyond it, both sides are split into hash
+# partitions of the join key, spilled to local disk, and joined one partition at a time.
+# `SpilledPartitions` is also used to regroup the joined rows by order, so that per-order aggregates only ever hold one
+# partition of the orders in memory. The number of partitions is derived from the size of the input datasets.
+
+import math
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from join_cache import left_join
+
+# Memory held by the in-memory partitions of one `SpilledPartitions` before they are spilled to disk
+DEFAULT_MEMORY_BUDGET = 256 * 1024 ** 2
+# Bounds of the number of hash partitions (see partition_count)
+MIN_PARTITIONS = 1
+MAX_PARTITIONS = 4096
+BATCH_ROWS = 64 * 1024
+
+
+class LoadedDataset:
+    """
+    A Layer Dataset converted to pandas once, with the `nbytes` and `to_pandas_batches` of a local dataset.
+
+    The Layer SDK only reads a dataset as a whole, so its size in memory is only known once it is converted. The
+    converted dataframe is kept to measure the dataset and to slice it in batches, so it is converted only once.
+    """
+
+    def __init__(self, layer_dataset):
+        self.name = getattr(layer_dataset, 'name', None)
+        self.version = getattr(layer_dataset, 'version', None)
+        self._df = layer_dataset.to_pandas()
+
+    @property
+    def nbytes(self):
+        return _frame_bytes(self._df)
+
+    def to_pandas(self):
+        return self._df
+
+    def to_pandas_batches(self, batch_rows=BATCH_ROWS):
+        for start in range(0, len(self._df), batch_rows):
+            yield self._df.iloc[start:start + batch_rows]
+
+
+def loaded_dataset(layer_dataset):
+    # Datasets that know their size (local datasets, see layer_local) are streamed from their files and returned as is
+    if hasattr(layer_dataset, 'nbytes'):
+        return layer_dataset
+    return LoadedDataset(layer_dataset)
+
+
+def iter_dataframes(layer_dataset, batch_rows=BATCH_ROWS, position_column=None):
+    # Stream a dataset as pandas dataframes. Local datasets (see layer_local) are read one batch at a time, a
+    # LoadedDataset is sliced and a Layer Dataset is converted to pandas as a whole and sliced. With a `position_column`,
+    # the position of every row in the dataset is added to the dataframes, so the original row order can be restored
+    # after the rows were partitioned.
+    to_pandas_batches = getattr(layer_dataset, 'to_pandas_batches', None)
+    if to_pandas_batches is not None:
+        batches = to_pandas_batches(batch_rows)
+    else:
+        df = layer_dataset.to_pandas()
+        batches = (df.iloc[start:start + batch_rows] for start in range(0, len(df), batch_rows))
+
+    position = 0
+    for df in batches:
+        if position_column is not None:
+            df = df.assign(**{position_column: np.arange(position, position + len(df), dtype=np.int64)})
+        position += len(df)
+        yield df
+    # An empty dataset is one empty dataframe with the columns of the dataset
+    if position == 0:
+        df = layer_dataset.to_pandas()
+        yield df.assign(**{position_column: np.arange(0, dtype=np.int64)}) if position_column is not None else df
+
+
+def fits_in_memory(*layer_datasets, memory_budget=DEFAULT_MEMORY_BUDGET):
+    # Whether the datasets fit in the memory budget together. Datasets must know their size in memory: local datasets
+    # (see layer_local) read it from their files, Layer Datasets are measured once converted (see loaded_dataset).
+    return sum(layer_dataset.nbytes for layer_dataset in layer_datasets) <= memory_budget
+
+
+def partition_count(*layer_datasets, memory_budget=DEFAULT_MEMORY_BUDGET):
+    # Number of hash partitions for joining the datasets, so that one partition of them takes about a quarter of the
+    # memory budget: joining a partition holds its rows of both sides and the joined rows at the same time.
+    size = sum(layer_dataset.nbytes for layer_dataset in layer_datasets)
+    return min(max(math.ceil(4 * size / memory_budget), MIN_PARTITIONS), MAX_PARTITIONS)
+
+
+def partition_numbers(keys, num_partitions):
+    # Hash partition of every key. The hash of a categorical is the hash of its values, so a key column partitions
+    # the same way whether it is read as strings or as categoricals.
+    hashes = pd.util.hash_pandas_object(keys, index=False).to_numpy()
+    return (hashes % np.uint64(num_partitions)).astype(np.int64)
+
+
+def _frame_bytes(df):
+    # Size of the rows of a dataframe. The categories of a categorical column are shared between the dataframes (the
+    # ID dictionary of layer_local), so only its codes count.
+    size = 0
+    for _, values in df.items():
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            size += values.cat.codes.nbytes
+        else:
+            size += int(values.memory_usage(index=False, deep=True))
+    return size
+
+
+class SpilledPartitions:
+    """
+    Dataframes split into hash partitions of a `key` column.
+
+    Partitions are held in memory until their total size exceeds `memory_budget`; then they are written to pickle files
+    in a temporary directory (under `spill_dir`, the system temporary directory by default) and memory starts over.
+    The rows of a partition keep the order in which they were added. Use as a context manager to remove the spilled
+    files.
+    """
+
+    def __init__(self, key, num_partitions, memory_budget=DEFAULT_MEMORY_BUDGET, spill_dir=None):
+        self.key = key
+        self.num_partitions = num_partitions
+        self.memory_budget = memory_budget
+        self.spill_dir = spill_dir
+        self.size_bytes = 0
+        self._frames = [[] for _ in range(num_partitions)]
+        self._spilled_files = [[] for _ in range(num_partitions)]
+        self._categorical_dtypes = {}
+        self._empty = None
+        self._directory = None
+
+    @property
+    def spilled(self):
+        return self._directory is not None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add(self, df):
+        if self._empty is None:
+            self._empty = df.iloc[:0]
+        partitions = partition_numbers(df[self.key], self.num_partitions)
+        for i, partition_df in df.groupby(partitions, sort=False):
+            self._frames[i].append(partition_df)
+            self.size_bytes += _frame_bytes(partition_df)
+        if self.size_bytes > self.memory_budget:
+            self._spill()
+
+    def _spill(self):
+        if self._directory is None:
+            self._directory = tempfile.mkdtemp(prefix='spilled_partitions_', dir=self.spill_dir)
+        for i, frames in enumerate(self._frames):
+            if not frames:
+                continue
+            df = pd.concat(frames)
+            # Categoricals are spilled as their codes: their categories (the whole ID dictionary) are kept in memory once
+            for column, dtype in df.dtypes.items():
+                if isinstance(dtype, pd.CategoricalDtype):
+                    self._categorical_dtypes[column] = dtype
+                    df[column] = df[column].cat.codes
+            path = os.path.join(self._directory, '{}-{}.pkl'.format(i, len(self._spilled_files[i])))
+            df.to_pickle(path)
+            self._spilled_files[i].append(path)
+            self._frames[i] = []
+        self.size_bytes = 0
+
+    def _read_spilled(self, path):
+        df = pd.read_pickle(path)
+        for column, dtype in self._categorical_dtypes.items():
+            df[column] = pd.Categorical.from_codes(df[column], dtype=dtype)
+        return df
+
+    def partition(self, i):
+        """The rows of partition `i` (an empty dataframe when no rows were added to it)."""
+        frames = [self._read_spilled(path) for path in self._spilled_files[i]] + self._frames[i]
+        if not frames:
+            # Without any dataframe added, only the key column is known
+            return self._empty if self._empty is not None else pd.DataFrame({self.key: []})
+        return pd.concat(frames, ignore_index=True)
+
+    def close(self):
+        if self._directory is not None:
+            shutil.rmtree(self._directory, ignore_errors=True)
+            self._directory = None
+        self._frames = [[] for _ in range(self.num_partitions)]
+        self._spilled_files = [[] for _ in range(self.num_partitions)]
+        self.size_bytes = 0
+
+
+def left_join_batches(left_frames, right_frames, key, num_partitions, memory_budget=DEFAULT_MEMORY_BUDGET,
+                      spill_dir=None):
+    # Left join of a stream of left dataframes with the right dataframes on `key`, like merge(on=key, how='left').
+    # Yields the joined dataframes. `num_partitions` is the number of hash partitions if they are spilled (see
+    # partition_count).
+    # When the right table fits in `memory_budget`, it is joined with every left dataframe as it arrives, and rows
+    # come out in the order of the left dataframes. Otherwise both sides are hash partitioned on `key` and spilled,
+    # then joined one partition at a time: rows come out grouped by partition.
+    with SpilledPartitions(key, num_partitions, memory_budget, spill_dir) as right:
+        for df in right_frames:
+            right.add(df)
+
+        if not right.spilled:
+            right_df = pd.concat([right.partition(i) for i in range(num_partitions)], ignore_index=True)
+            right.close()
+            for left_df in left_frames:
+                yield left_join(left_df, right_df, key)
+            return
+
+        with SpilledPartitions(key, num_partitions, memory_budget, spill_dir) as left:
+            for df in left_frames:
+                left.add(df)
+            for i in range(num_partitions):
+                left_df = left.partition(i)
+                if len(left_df):
+                    yield left_join(left_df, right.partition(i), key)
+
+
+def items_products_by_order(items_layer_df, products_layer_df, columns, memory_budget=DEFAULT_MEMORY_BUDGET,
+                            spill_dir=None):
+    # The items left joined with their products, like merge(on='PRODUCT_ID', how='left'), restricted to `columns`.
+    # Yields the joined rows of one hash partition of the orders at a time: every order is in one dataframe, which holds
+    # the rows of its orders in the original order of the items (ties between the rows of an order depend on it).
+    num_partitions = partition_count(items_layer_df, products_layer_df, memory_budget=memory_budget)
+    items_frames = iter_dataframes(items_layer_df, position_column='ITEM_POSITION')
+    joined_frames = left_join_batches(items_frames, iter_dataframes(products_layer_df), 'PRODUCT_ID', num_partitions,
+                                      memory_budget=memory_budget, spill_dir=spill_dir)
+    with SpilledPartitions('ORDER_ID', num_partitions, memory_budget, spill_dir) as orders_items:
+        for df in joined_frames:
+            orders_items.add(df[['ITEM_POSITION'] + [column for column in columns if column != 'ITEM_POSITION']])
+        # Only one partition of the orders is in memory at a time
+        for i in range(num_partitions):
+            df = orders_items.partition(i)
+            if len(df):
+                yield df.sort_values('ITEM_POSITION', ignore_index=True)[columns]
@@ -1,11 +1,10 @@
 from typing import Any
 from layer import Dataset
+from items_aggregates import items_aggregated
 
 def build_feature(items_layer_df: Dataset("items_dataset")) -> Any:
-    # Convert Layer Datasets into pandas dataframes
-    items_df = items_layer_df.to_pandas()
-
     # Compute a new feature: TOTAL_DISTINCT_ITEMS and return only id and relevant feature columns
-    total_distinct_items = items_df.groupby('ORDER_ID', as_index=False).agg(TOTAL_DISTINCT_ITEMS=("PRODUCT_ID", "nunique"))
+    # (all item aggregates are computed in a single pass over the items dataset, see items_aggregates.py)
+    total_distinct_items = items_aggregated(items_layer_df)[['ORDER_ID', 'TOTAL_DISTINCT_ITEMS']]
 
     return total_distinct_items
@@ -1,11 +1,10 @@
 from typing import Any
 from layer import Dataset
+from items_aggregates import items_aggregated
 
 def build_feature(items_layer_df: Dataset("items_dataset")) -> Any:
-    # Convert Layer Dataset into pandas data frame
-    items_df = items_layer_df.to_pandas()
-
     # Compute a new feature: TOTAL_ITEMS and return ORDER_ID and the relevant feature
-    total_items = items_df.groupby('ORDER_ID', as_index=False).agg(TOTAL_ITEMS=("PRODUCT_ID", "count"))
+    # (all item aggregates are computed in a single pass over the items dataset, see items_aggregates.py)
+    total_items = items_aggregated(items_layer_df)[['ORDER_ID', 'TOTAL_ITEMS']]
 
     return total_items
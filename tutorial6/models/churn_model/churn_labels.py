@@ -0,0 +1,44 @@
+# Churn label generation for the churn models.
+# <<Definition of Churn>>: A user who has not ordered again at least in the next `silence_days` days after its first
+# purchase. A customer is labeled when it ordered again (CHURNED = 0), or when it did not and its silence period ended
+# before `max_date`, the latest date in the data (CHURNED = 1). Other customers are not labeled yet.
+# The labels are computed in one vectorized pass on the timestamps as int64 day numbers, instead of comparing Python
+# date objects row by row and concatenating filtered copies of the customer features.
+
+import datetime
+
+import numpy as np
+
+NANOSECONDS_PER_DAY = 24 * 60 * 60 * 10 ** 9
+EPOCH = datetime.date(1970, 1, 1)
+
+
+def churn_label_kernel(first_order_timestamps, ordered_again, max_date, silence_days=365):
+    # Returns the mask of the labeled customers and the CHURNED label of every customer (valid where the mask is set).
+    # first_order_timestamps is a datetime64[ns] Series, ordered_again an array of 0/1 values.
+    if first_order_timestamps.dt.tz is not None:
+        # Compare the local dates of the timestamps, like .dt.date does
+        first_order_timestamps = first_order_timestamps.dt.tz_localize(None)
+    timestamps = first_order_timestamps.to_numpy(dtype='datetime64[ns]').view(np.int64)
+    # Day number of the purchase date (floor division also floors the timestamps before 1970 to their date)
+    first_order_days = timestamps // NANOSECONDS_PER_DAY
+    max_day = (max_date - EPOCH).days
+
+    ordered_again = np.asarray(ordered_again)
+    not_ordered_again = (ordered_again == 0) & first_order_timestamps.notna().to_numpy() \
+        & (first_order_days + silence_days < max_day)
+    labeled = not_ordered_again | (ordered_again == 1)
+    return labeled, not_ordered_again.astype(np.int64)
+
+
+def churn_labels(customer_features, max_date, silence_days=365, timestamp_column='FIRST_ORDER_TIMESTAMP',
+                 ordered_again_column='ORDERED_AGAIN'):
+    # The labeled customers with a CHURNED column: first the churned customers, then the ones who ordered again, each in
+    # the order of customer_features (the rows and order of the filtered copies the churn models concatenated).
+    labeled, churned = churn_label_kernel(customer_features[timestamp_column],
+                                          customer_features[ordered_again_column].to_numpy(), max_date, silence_days)
+    positions = np.flatnonzero(labeled)
+    positions = positions[np.argsort(1 - churned[positions], kind='stable')]
+    labels_df = customer_features.take(positions)
+    labels_df['CHURNED'] = churned[positions]
+    return labels_df
@@ -0,0 +1,114 @@
+# A local cache for the trained models that a model loads with layer.get_model (like order_review_model in churn_model).
+# `layer.get_model(name).trained_model_object` downloads and unpickles the whole model on every training run.
+# `load_model` keeps every version of a model on local disk as a joblib file, so a version is only downloaded once and
+# then unpickled from local disk (the trees of a model are unpickled into their own arrays either way, so the files are
+# not memory mapped). Models are also kept in memory, so training runs in the same process (hyperparameter sweeps) reuse
+# the loaded object without calling Layer. Both levels evict the least recently used models beyond their limits.
+
+import os
+from collections import OrderedDict
+
+import joblib
+import layer
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'layer_models')
+# Upper bound for the model files on disk
+DEFAULT_MAX_DISK_BYTES = 2 * 1024 ** 3
+# Number of models kept in memory
+DEFAULT_MAX_MEMORY_ENTRIES = 4
+
+
+class ModelCache:
+    """
+    LRU cache of trained models keyed on (name, version), on disk in `directory` and in memory.
+
+    Cached models are shared between callers, so callers must not modify them.
+    `hits` and `misses` count the loads served from the cache (memory or disk) and the ones that had to fetch the model.
+    `pinned_versions` holds the version `load_model` resolved for every model loaded without a version.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_disk_bytes=DEFAULT_MAX_DISK_BYTES,
+                 max_memory_entries=DEFAULT_MAX_MEMORY_ENTRIES):
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.max_memory_entries = max_memory_entries
+        self.hits = 0
+        self.misses = 0
+        self.pinned_versions = {}
+        self._memory = OrderedDict()
+
+    def _path(self, name, version):
+        return os.path.join(self.directory, name, '{}.joblib'.format(str(version).replace(os.sep, '_')))
+
+    def get_or_load(self, name, version, load):
+        key = (name, str(version))
+        if key in self._memory:
+            self.hits += 1
+            self._memory.move_to_end(key)
+            return self._memory[key]
+
+        path = self._path(name, version)
+        if os.path.exists(path):
+            self.hits += 1
+            model = joblib.load(path)
+            # Mark the file as the most recently used one
+            os.utime(path)
+        else:
+            self.misses += 1
+            model = load()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temporary file first, so that other processes never load a partially written model
+            tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+            joblib.dump(model, tmp_path)
+            os.replace(tmp_path, path)
+            self._evict_disk()
+
+        self._memory[key] = model
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+        return model
+
+    def _evict_disk(self):
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for file_name in names:
+                if file_name.endswith('.joblib'):
+                    path = os.path.join(root, file_name)
+                    stat = os.stat(path)
+                    files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+    def clear(self):
+        self._memory.clear()
+        self.pinned_versions.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+# The cache shared by all models loaded in this process
+model_cache = ModelCache()
+
+
+def load_model(name, version=None):
+    # Same as layer.get_model(name).trained_model_object (or the given version of the model), through the model cache.
+    # A cached version is loaded without calling Layer. Without a version, the first call in the process asks Layer for
+    # the latest version and pins it (see ModelCache.pinned_versions), so later calls load the same version from the
+    # cache; `model_cache.clear()` unpins it.
+    if version is None:
+        version = model_cache.pinned_versions.get(name)
+    if version is not None:
+        return model_cache.get_or_load(
+            name, version, lambda: layer.get_model('{}:{}'.format(name, version)).trained_model_object)
+
+    layer_model = layer.get_model(name)
+    version = getattr(layer_model, 'version', None)
+    if version is None:
+        # Without a version, a cached model cannot be told apart from a newer one
+        return layer_model.trained_model_object
+    model_cache.pinned_versions[name] = version
+    return model_cache.get_or_load(name, version, lambda: layer_model.trained_model_object)
@@ -4,14 +4,19 @@ This file demonstrates how we can develop and train our model by using the
 should have a model file like this one which implements train_model function.
 """
 from typing import Any
+import numpy as np
 from layer import Featureset, Train
-from sklearn.ensemble import GradientBoostingRegressor
+from sklearn.ensemble import GradientBoostingRegressor, HistGradientBoostingRegressor
 from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import OneHotEncoder
+from sklearn.preprocessing import OneHotEncoder, OrdinalEncoder
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
 from sklearn.metrics import r2_score
 
+# Training engine: 'gradient_boosting' (exact splits, categorical variables are one-hot encoded) or
+# 'hist_gradient_boosting' (features are binned into histograms, categorical variables are split natively, trees are built on all cores)
+ENGINE = 'gradient_boosting'
+
 def train_model(
         train: Train,
         order_features_base: Featureset("order_features_tutorial6"),
@@ -72,15 +77,29 @@ def train_model(
     # DEFINE PIPELINE STEPS
     # Pre-processing: One-hot encoding on categorical variables
     categorical_cols = ['MAIN_PRODUCT_CATEGORY', 'MAIN_PAYMENT_TYPE', 'ORDER_STATUS']
-    transformer = ColumnTransformer(transformers=[('cat', OneHotEncoder(handle_unknown='ignore'), categorical_cols)],remainder='passthrough')
-    # Model: Define a Gradient Boosting Classifier
-    model = GradientBoostingRegressor(learning_rate=learning_rate,
-                                      max_depth=max_depth,
-                                      max_features=max_features,
-                                      min_samples_leaf=min_samples_leaf,
-                                      n_estimators=n_estimators,
-                                      subsample=subsample,
-                                      random_state=random_state)
+    if ENGINE == 'hist_gradient_boosting':
+        # Categorical variables are ordinal encoded (unknown categories become missing values) and split natively by the model
+        transformer = ColumnTransformer(transformers=[('cat', OrdinalEncoder(handle_unknown='use_encoded_value', unknown_value=np.nan), categorical_cols)],
+                                        remainder='passthrough')
+        # Model: Define a Histogram-based Gradient Boosting Regressor. The encoded categorical variables are the first columns of the transformer output.
+        # There is no max_features or subsample in this model, n_estimators is its number of iterations (max_iter)
+        model = HistGradientBoostingRegressor(learning_rate=learning_rate,
+                                              max_depth=max_depth,
+                                              min_samples_leaf=min_samples_leaf,
+                                              max_iter=n_estimators,
+                                              categorical_features=list(range(len(categorical_cols))),
+                                              early_stopping=False,
+                                              random_state=random_state)
+    else:
+        transformer = ColumnTransformer(transformers=[('cat', OneHotEncoder(handle_unknown='ignore'), categorical_cols)],remainder='passthrough')
+        # Model: Define a Gradient Boosting Classifier
+        model = GradientBoostingRegressor(learning_rate=learning_rate,
+                                          max_depth=max_depth,
+                                          max_features=max_features,
+                                          min_samples_leaf=min_samples_leaf,
+                                          n_estimators=n_estimators,
+                                          subsample=subsample,
+                                          random_state=random_state)
 
     # FIT PIPELINE
     pipeline = Pipeline(steps=[('t', transformer), ('m', model)])
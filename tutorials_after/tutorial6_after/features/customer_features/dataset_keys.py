@@ -0,0 +1,12 @@
+# Cache keys of Layer datasets, for delivered_orders.py, which caches dataframes per dataset. Featuresets only import
+# helpers from their own directory, so this is a copy of dataset_key of the order features: keep both copies identical,
+# so both featuresets build their keys the same way.
+
+
+def dataset_key(layer_dataset):
+    # Identify a Layer dataset by its name and version, so that a new version of the dataset is never served from cache.
+    # Local datasets (see layer_local) can also be read through a column projection or filters, which are part of the key.
+    columns = getattr(layer_dataset, 'columns', None)
+    filters = getattr(layer_dataset, 'filters', None)
+    return (getattr(layer_dataset, 'name', None), getattr(layer_dataset, 'version', None),
+            tuple(columns) if columns is not None else None, repr(filters) if filters else None)
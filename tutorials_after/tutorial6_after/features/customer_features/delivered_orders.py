@@ -0,0 +1,98 @@
+# Delivered orders of every unique customer, shared by all features of this featureset.
+# first_order_id, first_order_timestamp and ordered_again all need the delivered orders of each unique customer.
+# This module summarizes them once per build (keyed on the names and versions of the input datasets) into one row
+# per CUSTOMER_UNIQUE_ID with the first order id, the first order timestamp and the number of delivered orders.
+#
+# The summary is computed on integer arrays instead of a merged orders + customers dataframe: orders are mapped to
+# factorized CUSTOMER_UNIQUE_ID codes, sorted by (customer code, purchase time) with a stable lexsort, and the
+# features are read from the boundaries of each customer's run of orders.
+#
+# Summaries of disjoint sets of orders can be merged, so the summary can also be maintained incrementally from the newly
+# delivered orders only (see layer_local/customer_state.py).
+
+import numpy as np
+import pandas as pd
+from dataset_keys import dataset_key
+
+# Only the summary of the latest build is kept in memory
+_cache = {}
+
+
+def summarize_delivered_orders(orders_df, customers_df):
+    # We will only take "delivered" orders into consideration during our analysis
+    delivered_positions = np.flatnonzero((orders_df['ORDER_STATUS'] == "delivered").to_numpy())
+
+    # Map every delivered order to the integer code of its unique customer (CUSTOMER_ID is the key of the customers dataset).
+    # Orders of unknown customers are dropped. A customer listed more than once (e.g. appended again after an update) is
+    # only counted once, with its latest row, so that each order belongs to one customer.
+    customers_df = customers_df.drop_duplicates(subset=['CUSTOMER_ID'], keep='last')
+    unique_customer_codes, unique_customer_ids = pd.factorize(customers_df['CUSTOMER_UNIQUE_ID'], sort=True)
+    customer_rows = pd.Index(customers_df['CUSTOMER_ID']).get_indexer(orders_df['CUSTOMER_ID'].values[delivered_positions])
+    order_customer_codes = np.append(unique_customer_codes, -1)[customer_rows]
+    order_positions = delivered_positions[order_customer_codes >= 0]
+    order_customer_codes = order_customer_codes[order_customer_codes >= 0]
+
+    # Purchase times as int64 nanoseconds. Orders without a purchase time are never a first order, so they are sorted last.
+    purchase_times = orders_df['ORDER_PURCHASE_TIMESTAMP'].to_numpy(dtype='datetime64[ns]')[order_positions].view(np.int64)
+    has_purchase_time = purchase_times != np.iinfo(np.int64).min
+    purchase_times = np.where(has_purchase_time, purchase_times, np.iinfo(np.int64).max)
+
+    # Sort by customer and purchase time. The sort is stable, so orders with the same purchase time keep their dataset order
+    # (like rank(method='first')).
+    by_customer_and_time = np.lexsort((purchase_times, order_customer_codes))
+    sorted_customer_codes = order_customer_codes[by_customer_and_time]
+
+    # Every customer's orders form one run: its first row is the first order and its length the number of orders
+    is_run_start = np.ones(len(sorted_customer_codes), dtype=bool)
+    is_run_start[1:] = sorted_customer_codes[1:] != sorted_customer_codes[:-1]
+    run_starts = np.flatnonzero(is_run_start)
+    first_order_rows = by_customer_and_time[run_starts]
+    first_order_positions = order_positions[first_order_rows]
+
+    return pd.DataFrame({'CUSTOMER_UNIQUE_ID': np.asarray(unique_customer_ids)[sorted_customer_codes[run_starts]],
+                         'FIRST_ORDER_ID': orders_df['ORDER_ID'].to_numpy()[first_order_positions],
+                         'FIRST_ORDER_TIMESTAMP': orders_df['ORDER_PURCHASE_TIMESTAMP'].iloc[first_order_positions].to_numpy(),
+                         'TOTAL_ORDERS': np.diff(np.append(run_starts, len(sorted_customer_codes)))})
+
+
+def merge_delivered_orders_summaries(earlier_summary_df, later_summary_df):
+    # Summary of the delivered orders of two disjoint sets of orders, from the summary of each set.
+    # The orders of later_summary_df come after the ones of earlier_summary_df in the orders dataset (orders are appended),
+    # so on equal purchase times the first order of earlier_summary_df is kept, like in summarize_delivered_orders.
+    summaries_df = pd.concat([earlier_summary_df, later_summary_df], ignore_index=True)
+    unique_customer_codes, unique_customer_ids = pd.factorize(summaries_df['CUSTOMER_UNIQUE_ID'], sort=True)
+
+    first_order_times = summaries_df['FIRST_ORDER_TIMESTAMP'].to_numpy(dtype='datetime64[ns]').view(np.int64)
+    first_order_times = np.where(first_order_times != np.iinfo(np.int64).min, first_order_times, np.iinfo(np.int64).max)
+
+    by_customer_and_time = np.lexsort((first_order_times, unique_customer_codes))
+    sorted_customer_codes = unique_customer_codes[by_customer_and_time]
+    is_run_start = np.ones(len(sorted_customer_codes), dtype=bool)
+    is_run_start[1:] = sorted_customer_codes[1:] != sorted_customer_codes[:-1]
+    first_order_rows = by_customer_and_time[is_run_start]
+
+    return pd.DataFrame({'CUSTOMER_UNIQUE_ID': np.asarray(unique_customer_ids),
+                         'FIRST_ORDER_ID': summaries_df['FIRST_ORDER_ID'].to_numpy()[first_order_rows],
+                         'FIRST_ORDER_TIMESTAMP': summaries_df['FIRST_ORDER_TIMESTAMP'].iloc[first_order_rows].to_numpy(),
+                         'TOTAL_ORDERS': np.bincount(unique_customer_codes, weights=summaries_df['TOTAL_ORDERS'].to_numpy(),
+                                                     minlength=len(unique_customer_ids)).astype(np.int64)})
+
+
+def use_delivered_orders_summary(orders_dataset_layer, customers_dataset_layer, customers_summary_df):
+    # Serve a summary maintained outside of this featureset (e.g. updated incrementally by layer_local) to the features,
+    # instead of summarizing the datasets again
+    _cache.clear()
+    _cache[(dataset_key(orders_dataset_layer), dataset_key(customers_dataset_layer))] = customers_summary_df
+
+
+def delivered_orders_per_customer(orders_dataset_layer, customers_dataset_layer):
+    key = (dataset_key(orders_dataset_layer), dataset_key(customers_dataset_layer))
+    if key not in _cache:
+        _cache.clear()
+        _cache[key] = summarize_delivered_orders(orders_dataset_layer.to_pandas(), customers_dataset_layer.to_pandas())
+    return _cache[key]
+
+
+def first_orders(customers_summary_df):
+    # Customers with at least one delivered order that has a purchase time
+    return customers_summary_df[customers_summary_df.FIRST_ORDER_TIMESTAMP.notna()]
@@ -5,6 +5,7 @@ Layer joins your singular features using that ID column.
 """
 from typing import Any
 from layer import Dataset
+from delivered_orders import delivered_orders_per_customer
 import numpy as np
 
 def build_feature(
@@ -12,23 +13,10 @@ def build_feature(
         customers_dataset_layer: Dataset("customers_dataset")
 ) -> Any:
 
-    # Convert Layer datasets into pandas data frames
-    orders_df = orders_dataset_layer.to_pandas()
-    customers_df = customers_dataset_layer.to_pandas()
-
-    # We will only take "delivered" orders into consideration during our analysis
-    orders_df = orders_df[orders_df.ORDER_STATUS == "delivered"]
-
-    # Join 2 pandas data frames
-    users_df = orders_df.merge(customers_df, left_on='CUSTOMER_ID', right_on='CUSTOMER_ID', how='left')
-
-    # # Add a new column total_orders: For each user, compute total number of orders
-    users_df["TOTAL_ORDERS"] = users_df.groupby('CUSTOMER_UNIQUE_ID')['CUSTOMER_ID'].transform('count')
+    # Delivered orders summarized per unique customer, including the total number of orders of each user (shared by all features of this featureset)
+    users_df = delivered_orders_per_customer(orders_dataset_layer, customers_dataset_layer)
 
     # Add a new binary column ordered_again: If a customer orders again after its first purchase
-    users_df['ORDERED_AGAIN'] = np.where(users_df['TOTAL_ORDERS'] > 1, 1, 0)
-
-    # Select only the columns to be returned
-    ordered_again = users_df[['CUSTOMER_UNIQUE_ID', 'ORDERED_AGAIN']]
+    ordered_again = users_df[['CUSTOMER_UNIQUE_ID']].assign(ORDERED_AGAIN=np.where(users_df['TOTAL_ORDERS'] > 1, 1, 0))
 
     return ordered_again
@@ -0,0 +1,66 @@
+# Per order aggregates of the items dataset, computed for all item features of this featureset in a single pass.
+# total_items, total_distinct_items, total_different_sellers, total_freight_price and total_product_price
+# all group the items dataset by ORDER_ID. Instead of running one groupby per feature, ORDER_ID is factorized once
+# and every aggregation below is computed from the same integer group codes. Each feature then selects its own column.
+
+import numpy as np
+import pandas as pd
+from dataset_keys import dataset_key
+from join_cache import join_cache
+from money import money_values
+
+# Named aggregations declared by the item features: FEATURE_COLUMN -> (ITEMS_DATASET_COLUMN, AGGREGATION)
+ITEM_AGGREGATIONS = {
+    'TOTAL_ITEMS': ('PRODUCT_ID', 'count'),
+    'TOTAL_DISTINCT_ITEMS': ('PRODUCT_ID', 'nunique'),
+    'TOTAL_DIFFERENT_SELLERS': ('SELLER_ID', 'nunique'),
+    'TOTAL_FREIGHT_PRICE': ('FREIGHT_VALUE', 'sum'),
+    'TOTAL_PRODUCT_PRICE': ('PRICE', 'sum'),
+}
+
+
+def _count(order_codes, n_orders, values):
+    # Number of non-null values per order (same as pandas 'count')
+    valid = pd.notna(values)
+    return np.bincount(order_codes[valid], minlength=n_orders)
+
+
+def _nunique(order_codes, n_orders, values):
+    # Number of distinct non-null values per order (same as pandas 'nunique')
+    value_codes, uniques = pd.factorize(values)
+    valid = value_codes >= 0
+    pairs = np.unique(order_codes[valid].astype(np.int64) * len(uniques) + value_codes[valid])
+    return np.bincount(pairs // max(len(uniques), 1), minlength=n_orders)
+
+
+def _sum(order_codes, n_orders, values):
+    # Sum of non-null values per order (all null groups sum up to 0), in float64 (see money.py).
+    # The sum is done by pandas groupby on the order codes: it adds the values of each order in dataset order with the
+    # same compensated summation as groupby('ORDER_ID').agg('sum'), so the totals are equal to the last bit.
+    # np.bincount(weights=...) adds them without compensation and differs in the last bit for some orders.
+    sums = pd.Series(money_values(values)).groupby(order_codes).sum()
+    return sums.reindex(range(n_orders), fill_value=0.0).to_numpy()
+
+
+AGGREGATION_KERNELS = {'count': _count, 'nunique': _nunique, 'sum': _sum}
+
+
+def aggregate_items(items_df, aggregations=ITEM_AGGREGATIONS):
+    # Factorize ORDER_ID once: ORDER_IDs are sorted like in groupby('ORDER_ID') and rows without ORDER_ID are dropped
+    order_codes, order_ids = pd.factorize(items_df['ORDER_ID'], sort=True)
+    has_order = order_codes >= 0
+    order_codes = order_codes[has_order]
+    n_orders = len(order_ids)
+
+    columns = {'ORDER_ID': order_ids}
+    for feature_name, (column, aggregation) in aggregations.items():
+        values = items_df[column].values[has_order]
+        columns[feature_name] = AGGREGATION_KERNELS[aggregation](order_codes, n_orders, values)
+
+    return pd.DataFrame(columns)
+
+
+def items_aggregated(items_layer_df):
+    # Compute all item aggregates once per items dataset version and share them between the item features
+    key = ('items_aggregates', dataset_key(items_layer_df))
+    return join_cache.get_or_build(key, lambda: aggregate_items(items_layer_df.to_pandas()))
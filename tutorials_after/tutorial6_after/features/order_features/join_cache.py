@@ -0,0 +1,123 @@
+# A process-wide cache for dataframes shared by several features of this featureset.
+# Several features (avg_product_* and main_product_category) need the same items + products join.
+# Instead of converting both datasets to pandas and joining them again in every build_feature call,
+# the joined dataframe is built once, keyed on the names and versions of its input datasets, and reused.
+
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from dataset_keys import dataset_key
+
+# Upper bound for the total memory held by the cache. Least recently used entries are evicted first.
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+
+class JoinCache:
+    """
+    LRU cache for dataframes with a memory cap.
+
+    Entries are looked up by a hashable key (typically built from `dataset_key` of the input datasets).
+    Cached dataframes are shared between features, so callers must not modify them in place.
+    `hits` and `misses` count the lookups served from the cache and the ones that had to build the dataframe.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._sizes = {}
+
+    @property
+    def size_bytes(self):
+        return sum(self._sizes.values())
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get_or_build(self, key, build):
+        # Serve from cache and mark the entry as the most recently used one
+        if key in self._entries:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+        self.misses += 1
+        df = build()
+        self.put(key, df)
+        return df
+
+    def put(self, key, df):
+        size = int(df.memory_usage(deep=True).sum())
+        self.discard(key)
+        # Dataframes larger than the whole cache are returned to the caller but never cached
+        if size > self.max_bytes:
+            return
+        self._entries[key] = df
+        self._sizes[key] = size
+        self._evict()
+
+    def discard(self, key):
+        self._entries.pop(key, None)
+        self._sizes.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+        self._sizes.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self), 'size_bytes': self.size_bytes,
+                'max_bytes': self.max_bytes}
+
+    def _evict(self):
+        while self.size_bytes > self.max_bytes:
+            oldest_key, _ = self._entries.popitem(last=False)
+            self._sizes.pop(oldest_key)
+
+
+# The cache shared by all features running in this process
+join_cache = JoinCache()
+
+
+def left_join(left_df, right_df, key):
+    # Same as left_df.merge(right_df, on=key, how='left').
+    # When both key columns are categoricals with the same categories (the compact mode of layer_local encodes the IDs of
+    # all datasets with one shared dictionary) and the key is unique in right_df, the join is an array gather on the
+    # category codes instead of a hash join.
+    left_keys, right_keys = left_df[key], right_df[key]
+    if not (isinstance(left_keys.dtype, pd.CategoricalDtype) and left_keys.dtype == right_keys.dtype
+            and right_keys.is_unique):
+        return left_df.merge(right_df, on=key, how='left')
+
+    # Position of the right row of every category code. Null keys have the code -1 and use the extra last position,
+    # so they match each other like in merge.
+    positions = np.full(len(right_keys.cat.categories) + 1, -1, dtype=np.int64)
+    positions[right_keys.cat.codes.to_numpy()] = np.arange(len(right_df))
+    right_rows = positions[left_keys.cat.codes.to_numpy()]
+
+    # Rows without a match (-1) are reindexed to nulls, with the same dtype changes as in merge.
+    # Other columns present in both dataframes get the same suffixes as in merge.
+    right_columns = right_df.drop(columns=[key]).reset_index(drop=True).reindex(right_rows).reset_index(drop=True)
+    return left_df.reset_index(drop=True).join(right_columns, lsuffix='_x', rsuffix='_y')
+
+
+def items_products_key(items_layer_df, products_layer_df):
+    # Cache key of the items + products join of the dataset versions
+    return 'items_products', dataset_key(items_layer_df), dataset_key(products_layer_df)
+
+
+def items_products_joined(items_layer_df, products_layer_df):
+    # Join items and products pandas dataframes once per (items, products) dataset versions
+    def build():
+        items_df = items_layer_df.to_pandas()
+        products_df = products_layer_df.to_pandas()
+        return left_join(items_df, products_df, 'PRODUCT_ID')
+
+    return join_cache.get_or_build(items_products_key(items_layer_df, products_layer_df), build)
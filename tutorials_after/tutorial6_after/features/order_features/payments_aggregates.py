@@ -0,0 +1,78 @@
+# Per order aggregates of the payments dataset, computed for all payment features of this featureset in a single pass.
+# total_payment, number_of_distinct_payment_types, number_of_total_installments, use_voucher and main_payment_type
+# all group the payments dataset by ORDER_ID. ORDER_ID and PAYMENT_TYPE are factorized once here and every feature
+# is computed from the shared integer codes with numpy reductions. Each feature then selects its own column.
+
+import numpy as np
+import pandas as pd
+from dataset_keys import dataset_key
+from join_cache import join_cache
+from money import money_values
+
+
+def _group_sums(codes, n_groups, values):
+    # Sum of non-null values per group code (all null groups sum up to 0). pandas groupby adds the values of each group
+    # in dataset order with the same compensated summation as the groupby sums of the original features, so the totals
+    # are equal to the last bit (np.bincount(weights=...) adds them without compensation).
+    return pd.Series(values).groupby(codes).sum().reindex(range(n_groups), fill_value=0.0).to_numpy()
+
+
+def aggregate_payments(payments_df):
+    # Factorize ORDER_ID once: ORDER_IDs are sorted like in groupby('ORDER_ID') and rows without ORDER_ID are dropped
+    order_codes, order_ids = pd.factorize(payments_df['ORDER_ID'], sort=True)
+    has_order = order_codes >= 0
+    order_codes = order_codes[has_order].astype(np.int64)
+    n_orders = len(order_ids)
+
+    # Factorize PAYMENT_TYPE once (payments without a type get the code -1)
+    type_codes, payment_types = pd.factorize(payments_df['PAYMENT_TYPE'])
+    type_codes = type_codes[has_order]
+    has_type = type_codes >= 0
+    # Lookup table from type codes to voucher flags (the extra last entry is used by payments without a type)
+    is_voucher = np.append(np.asarray(payment_types == 'voucher'), False)[type_codes]
+
+    # Missing payment values are skipped in sums like in pandas. Payment values are summed in float64 (see money.py)
+    payment_values = money_values(payments_df['PAYMENT_VALUE'].to_numpy())[has_order]
+
+    # TOTAL_PAYMENT: Sum of payment values of the order
+    total_payment = _group_sums(order_codes, n_orders, payment_values)
+
+    # TOTAL_NON_VOUCHER_INSTALLMENTS: Number of non-voucher payments of the order, 1 for orders paid only by vouchers
+    total_non_voucher_installments = np.bincount(order_codes[~is_voucher], minlength=n_orders)
+    total_non_voucher_installments = np.where(total_non_voucher_installments == 0, 1, total_non_voucher_installments)
+
+    # USE_VOUCHER: 1 if any payment of the order is done by a voucher
+    use_voucher = (np.bincount(order_codes[is_voucher], minlength=n_orders) > 0).astype(np.int64)
+
+    # (ORDER_ID, PAYMENT_TYPE) pairs, numbered in the order of their first appearance in the payments dataset
+    pair_codes, pairs = pd.factorize(order_codes[has_type] * len(payment_types) + type_codes[has_type])
+    pair_orders = pairs // len(payment_types)
+    pair_types = pairs % len(payment_types)
+    pair_totals = _group_sums(pair_codes, len(pairs), payment_values[has_type])
+
+    # NO_DISTINCT_PAYMENT_TYPES: Number of different payment types used in the order
+    no_distinct_payment_types = np.bincount(pair_orders, minlength=n_orders)
+
+    # MAIN_PAYMENT_TYPE: The payment type with the biggest total payment in the order.
+    # On ties, the payment type that appears first in the dataset wins (same as 'first' after the max transform).
+    # The pair totals are the ones of the transform('sum') of the original feature, so ties are found on the same values.
+    by_order_and_total = np.lexsort((np.arange(len(pairs)), -pair_totals, pair_orders))
+    sorted_orders = pair_orders[by_order_and_total]
+    is_first_of_order = np.ones(len(sorted_orders), dtype=bool)
+    is_first_of_order[1:] = sorted_orders[1:] != sorted_orders[:-1]
+    main_pairs = by_order_and_total[is_first_of_order]
+    main_payment_type = np.full(n_orders, np.nan, dtype=object)
+    main_payment_type[pair_orders[main_pairs]] = np.asarray(payment_types, dtype=object)[pair_types[main_pairs]]
+
+    return pd.DataFrame({'ORDER_ID': order_ids,
+                         'TOTAL_PAYMENT': total_payment,
+                         'NO_DISTINCT_PAYMENT_TYPES': no_distinct_payment_types,
+                         'TOTAL_NON_VOUCHER_INSTALLMENTS': total_non_voucher_installments,
+                         'USE_VOUCHER': use_voucher,
+                         'MAIN_PAYMENT_TYPE': main_payment_type})
+
+
+def payments_aggregated(payment_layer_df):
+    # Compute all payment aggregates once per payments dataset version and share them between the payment features
+    key = ('payments_aggregates', dataset_key(payment_layer_df))
+    return join_cache.get_or_build(key, lambda: aggregate_payments(payment_layer_df.to_pandas()))
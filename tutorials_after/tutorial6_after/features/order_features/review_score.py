@@ -7,11 +7,14 @@ def build_feature(reviews_layer_df: Dataset("reviews_dataset")) -> Any:
 
     # For some reason, there might be multiple reviews for a single order in the data - Only take into account the latest review record
     # Compute a new feature: LATEST_REVIEW_TIMES
-    reviews_df['LATEST_REVIEW_TIMES'] = reviews_df.groupby(['ORDER_ID'])['REVIEW_ANSWER_TIMESTAMP'].transform('max')
+    reviews_df['LATEST_REVIEW_TIMES'] = reviews_df.groupby(['ORDER_ID'], observed=True)['REVIEW_ANSWER_TIMESTAMP'].transform('max')
 
     # Fetch only latest review
     reviews_df = reviews_df[reviews_df['LATEST_REVIEW_TIMES'] == reviews_df['REVIEW_ANSWER_TIMESTAMP']]
 
+    # Several reviews of an order can be answered at the same time: keep the last one in the dataset, so that every order has one review score
+    reviews_df = reviews_df.drop_duplicates(subset=['ORDER_ID'], keep='last')
+
     # Return only ORDER_ID and REVIEW_SCORE columns
     review_score = reviews_df[['ORDER_ID', 'REVIEW_SCORE']]
 
@@ -1,11 +1,10 @@
 from typing import Any
 from layer import Dataset
+from items_aggregates import items_aggregated
 
 def build_feature(items_layer_df: Dataset("items_dataset")) -> Any:
-    # Convert Layer Dataset into pandas data frame
-    items_df = items_layer_df.to_pandas()
-
     # Compute a new feature: TOTAL_FREIGHT_PRICE
-    total_freight_price = items_df.groupby('ORDER_ID', as_index=False).agg(TOTAL_FREIGHT_PRICE=("FREIGHT_VALUE", "sum"))
+    # (all item aggregates are computed in a single pass over the items dataset, see items_aggregates.py)
+    total_freight_price = items_aggregated(items_layer_df)[['ORDER_ID', 'TOTAL_FREIGHT_PRICE']]
 
     return total_freight_price
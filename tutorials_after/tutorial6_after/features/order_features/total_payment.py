@@ -1,13 +1,10 @@
 from typing import Any
 from layer import Dataset
+from payments_aggregates import payments_aggregated
 
 def build_feature(payment_layer_df: Dataset("payments_dataset")) -> Any:
-    # Convert Layer Dataset into pandas data frame
-    payments_df = payment_layer_df.to_pandas()
-
     # Compute a new feature: TOTAL_PAYMENT
-    total_payment = payments_df[["ORDER_ID","PAYMENT_VALUE"]]\
-        .groupby(['ORDER_ID'], as_index=False)\
-        .agg(TOTAL_PAYMENT=("PAYMENT_VALUE", "sum"))
+    # (all payment aggregates are computed in a single pass over the payments dataset, see payments_aggregates.py)
+    total_payment = payments_aggregated(payment_layer_df)[['ORDER_ID', 'TOTAL_PAYMENT']]
 
     return total_payment
@@ -1,11 +1,10 @@
 from typing import Any
 from layer import Dataset
+from items_aggregates import items_aggregated
 
 def build_feature(items_layer_df: Dataset("items_dataset")) -> Any:
-    # Convert Layer Dataset into pandas data frame
-    items_df = items_layer_df.to_pandas()
-
     # Compute a new feature: TOTAL_PRODUCT_PRICE and return id and relevant feature column
-    total_product_price = items_df.groupby('ORDER_ID', as_index=False).agg(TOTAL_PRODUCT_PRICE=("PRICE", "sum"))
+    # (all item aggregates are computed in a single pass over the items dataset, see items_aggregates.py)
+    total_product_price = items_aggregated(items_layer_df)[['ORDER_ID', 'TOTAL_PRODUCT_PRICE']]
 
     return total_product_price
@@ -7,16 +7,23 @@ from typing import Any
 
 import numpy as np
 from layer import Featureset, Train, Model
-from sklearn.ensemble import GradientBoostingClassifier
+from sklearn.ensemble import GradientBoostingClassifier, HistGradientBoostingClassifier
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import average_precision_score, roc_auc_score, precision_score, recall_score, f1_score
 import pandas as pd
-from sklearn.preprocessing import OneHotEncoder
+from sklearn.preprocessing import OneHotEncoder, OrdinalEncoder
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
 import datetime
+from training_data import assemble_training_data
+from churn_labels import churn_labels
+from model_cache import load_model
 import layer
 
+# Training engine: 'gradient_boosting' (exact splits, categorical variables are one-hot encoded) or
+# 'hist_gradient_boosting' (features are binned into histograms, categorical variables are split natively, trees are built on all cores)
+ENGINE = 'gradient_boosting'
+
 def train_model(
         train: Train,
         order_features_base: Featureset("order_features_tutorial6"),
@@ -24,32 +31,22 @@ def train_model(
         customer_features: Featureset("customer_features_tutorial6"),
 ) -> Any:
 
-    # FEATURES GENERATION
-    # Convert the Layer featuresets to pandas dataframes
-    order_features_base = order_features_base.to_pandas().dropna()
-    order_high_level_features = order_high_level_features.to_pandas().dropna()
-    # Merge 2 featuresets
-    order_features = order_features_base.merge(order_high_level_features, left_on='ORDER_ID', right_on='ORDER_ID',how='left')
-
     # LABEL GENERATION: <<Definition of Churn>>: A user who has not ordered again at least in the next 365 days after its first purchase.
     # Convert the Layer featureset to pandas dataframe
     customer_features = customer_features.to_pandas()
     # Filter the users who did not order again in next 365 days after their first purchases ("2018-10-17" is the latest date in the data)
     order_silence_period = 365
     dataset_max_date = datetime.date(2018, 10, 17)
-    customer_not_ordered_again = customer_features[(customer_features.ORDERED_AGAIN == 0) & (customer_features.FIRST_ORDER_TIMESTAMP.dt.date + datetime.timedelta(days=order_silence_period) < dataset_max_date)]
-    # Use all the users who ordered again
-    customer_ordered_again = customer_features.loc[(customer_features.ORDERED_AGAIN == 1)]
-    # Concat 2 data frames and add a new label column: CHURNED
-    customers_features_filtered = pd.concat([customer_not_ordered_again, customer_ordered_again])
-    customers_features_filtered['CHURNED'] = 1  # Create a label column 'churned' with all 1s.
-    customers_features_filtered.loc[customers_features_filtered['ORDERED_AGAIN'] == 1, 'CHURNED'] = 0  # Change the label to 0 if the customer has ordered again
+    # Label the users who did not order again in the silence period (CHURNED = 1) and the users who ordered again (CHURNED = 0), see churn_labels.py
+    customers_features_filtered = churn_labels(customer_features, dataset_max_date, order_silence_period)
     customers_labels_df = customers_features_filtered[['CUSTOMER_UNIQUE_ID', 'FIRST_ORDER_ID', 'CHURNED']]
 
     # FINAL TRAINING DATA GENERATION
     # Fetch only the first order features of users and drop excluded and na columns from the final dataframe
+    # The 2 order featuresets are merged on ORDER_ID and then with the labels on FIRST_ORDER_ID, but only the rows of the first orders are fetched (see training_data.py)
+    # Every order has one row in the order featuresets, so a plain merge on FIRST_ORDER_ID is point in time correct: a label only gets the features of its first order
     excluded_cols = ['CUSTOMER_UNIQUE_ID', 'FIRST_ORDER_ID', 'ORDER_ID', 'ORDER_PURCHASE_TIMESTAMP']
-    training_data_df = customers_labels_df.merge(order_features, left_on='FIRST_ORDER_ID', right_on='ORDER_ID', how='left') \
+    training_data_df = assemble_training_data(customers_labels_df, 'FIRST_ORDER_ID', [order_features_base, order_high_level_features]) \
         .drop(columns=excluded_cols) \
         .dropna()
 
@@ -61,8 +58,8 @@ def train_model(
                              'IS_MULTI_ITEMS', 'SHIPPING_PAYMENT_PERC', 'TOTAL_WAITING']
 
     training_data_for_review_score_model = training_data_df[feature_columns_names]
-    # Fetch the order_review_score model
-    order_review_model = layer.get_model("order_review_model").trained_model_object
+    # Fetch the order_review_score model (cached locally by name and version, see model_cache.py)
+    order_review_model = load_model("order_review_model")
     # Make inferences by using the model
     predicted_order_review_scores = order_review_model.predict(training_data_for_review_score_model)
     # Append the predicted column back to the training dataframe
@@ -105,16 +102,30 @@ def train_model(
     # DEFINE PIPELINE STEPS
     # Pre-processing: One-hot encoding on a categorical variable: MAIN_PRODUCT_CATEGORY
     categorical_cols = ['MAIN_PRODUCT_CATEGORY', 'MAIN_PAYMENT_TYPE', 'ORDER_CUSTOMER_CITY', 'ORDER_CUSTOMER_STATE','ORDER_STATUS']
-    transformer = ColumnTransformer(transformers=[('cat', OneHotEncoder(handle_unknown='ignore'), categorical_cols)],
-                                    remainder='passthrough')
-    # Model: Define a Gradient Boosting Classifier
-    model = GradientBoostingClassifier(learning_rate=learning_rate,
-                                       max_depth=max_depth,
-                                       max_features=max_features,
-                                       min_samples_leaf=min_samples_leaf,
-                                       n_estimators=n_estimators,
-                                       subsample=subsample,
-                                       random_state=random_state)
+    if ENGINE == 'hist_gradient_boosting':
+        # Categorical variables are ordinal encoded (unknown categories become missing values) and split natively by the model
+        transformer = ColumnTransformer(transformers=[('cat', OrdinalEncoder(handle_unknown='use_encoded_value', unknown_value=np.nan), categorical_cols)],
+                                        remainder='passthrough')
+        # Model: Define a Histogram-based Gradient Boosting Classifier. The encoded categorical variables are the first columns of the transformer output.
+        # There is no max_features or subsample in this model, n_estimators is its number of iterations (max_iter)
+        model = HistGradientBoostingClassifier(learning_rate=learning_rate,
+                                               max_depth=max_depth,
+                                               min_samples_leaf=min_samples_leaf,
+                                               max_iter=n_estimators,
+                                               categorical_features=list(range(len(categorical_cols))),
+                                               early_stopping=False,
+                                               random_state=random_state)
+    else:
+        transformer = ColumnTransformer(transformers=[('cat', OneHotEncoder(handle_unknown='ignore'), categorical_cols)],
+                                        remainder='passthrough')
+        # Model: Define a Gradient Boosting Classifier
+        model = GradientBoostingClassifier(learning_rate=learning_rate,
+                                           max_depth=max_depth,
+                                           max_features=max_features,
+                                           min_samples_leaf=min_samples_leaf,
+                                           n_estimators=n_estimators,
+                                           subsample=subsample,
+                                           random_state=random_state)
 
     # FIT THE PIPELINE
     pipeline = Pipeline(steps=[('t', transformer), ('m', model)])
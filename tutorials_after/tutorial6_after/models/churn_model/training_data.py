@@ -0,0 +1,45 @@
+# Training data assembly with a semi-join on the label keys.
+# The churn labels only need the features of the first order of every customer, but `to_pandas()` on an order
+# featureset loads the features of all orders. `assemble_training_data` only fetches the featureset rows whose key is one
+# of the label keys, and joins them to the labels.
+# Featuresets that can read a key set (the columnar featuresets of layer_local, whose `to_pandas` takes `keys`) only load
+# the row groups whose min/max key range holds one of the keys. Any other featureset is converted to pandas and probed
+# for the keys before it is merged, so the merges only handle the matching rows.
+# The order featuresets have one row per order, so merging them on FIRST_ORDER_ID only gives every label the features of
+# its first order. Feature rows must be unique on the key: a ValueError is raised otherwise, instead of duplicating
+# labels in the merge.
+
+import inspect
+
+import numpy as np
+
+
+def fetch_rows(featureset, keys, key='ORDER_ID'):
+    # Rows of a featureset whose `key` column is one of `keys`
+    if 'keys' in inspect.signature(featureset.to_pandas).parameters:
+        return featureset.to_pandas(keys=keys)
+    df = featureset.to_pandas()
+    return df[df[key].isin(keys)]
+
+
+def check_unique(df, columns, name):
+    # Raise a ValueError when df has several rows with the same values of `columns`
+    duplicated = df.duplicated(subset=columns)
+    if duplicated.any():
+        raise ValueError("{} is not unique on {} ({} duplicate rows)".format(name, ", ".join(columns), int(duplicated.sum())))
+
+
+def assemble_training_data(labels_df, label_key, featuresets, key='ORDER_ID', dropna=True):
+    # Same as merging the featuresets with each other on `key` (dropping their rows with nulls when `dropna` is set),
+    # then labels_df with the result on labels_df[label_key] == key (left joins, in the order of labels_df rows),
+    # without reading the featureset rows of other keys.
+    # Raises a ValueError when a featureset has several rows per key.
+    keys = np.asarray(labels_df[label_key].dropna().unique(), dtype=object)
+    features_df = None
+    for featureset in featuresets:
+        featureset_df = fetch_rows(featureset, keys, key)
+        if dropna:
+            featureset_df = featureset_df.dropna()
+        check_unique(featureset_df, [key], "Featureset '{}'".format(getattr(featureset, 'name', None)))
+        features_df = featureset_df if features_df is None else features_df.merge(featureset_df, on=key, how='left')
+    return labels_df.merge(features_df, left_on=label_key, right_on=key, how='left')